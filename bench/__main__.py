@@ -0,0 +1,95 @@
+"""Микробенчмарки репозиториев на синтетическом наборе данных.
+
+    python -m bench                                   # SQLite в памяти
+    python -m bench --url postgresql+asyncpg://... --reset --scale 10
+    python -m bench --save bench/baselines/main.json
+    python -m bench --compare bench/baselines/main.json --only task.
+
+Для Postgres нужна отдельная база: --reset удаляет и заново создаёт все таблицы.
+Код возврата 1, если при --compare найдены регрессии p50/p99 больше --tolerance.
+"""
+import argparse
+import asyncio
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+import sqlalchemy
+
+from bench.cases import repository_cases
+from bench.data import DatasetSize, generate
+from bench.runner import compare, format_table, load_baseline, measure, save_baseline
+from engene import DatabaseSessionManager
+from models import init
+
+DEFAULT_URL = "sqlite+aiosqlite:///:memory:"
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args: argparse.Namespace) -> int:
+    manager = DatabaseSessionManager.get(database_url=args.url)
+    try:
+        async with manager.engine.begin() as connection:
+            if args.reset:
+                await connection.run_sync(init.ModelBase.metadata.drop_all)
+            await connection.run_sync(init.ModelBase.metadata.create_all)
+        size = DatasetSize().scaled(args.scale)
+        dataset = await generate(manager.async_session_factory, size, seed=args.seed)
+        cases = [case for case in repository_cases(manager.async_session_factory, dataset, seed=args.seed)
+                 if not args.only or any(pattern in case.name for pattern in args.only)]
+
+        results = []
+        for case in cases:
+            if case.setup is not None:
+                await case.setup(args.warmup + args.iterations)
+            results.append(await measure(case.name, case.operation, args.iterations, warmup=args.warmup))
+            print(f"  {case.name}: p50 {results[-1].p50_ms:.3f} ms", file=sys.stderr)
+    finally:
+        await DatabaseSessionManager.shutdown_all()
+
+    baseline = load_baseline(args.compare) if args.compare else None
+    print(format_table(results, baseline))
+    if args.save:
+        save_baseline(args.save, results, {
+            "commit": _commit(),
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "backend": sqlalchemy.engine.make_url(args.url).get_backend_name(),
+            "size": vars(size),
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+        })
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression.name} {regression.metric}: {regression.baseline:.3f} -> "
+                  f"{regression.current:.3f} ms ({regression.change:+.0%})")
+        return 1 if regressions else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки репозиториев")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"DSN базы (по умолчанию {DEFAULT_URL})")
+    parser.add_argument("--reset", action="store_true", help="удалить и создать таблицы заново перед прогоном")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель размера набора данных")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--only", action="append", help="запускать только бенчмарки, имя которых содержит строку")
+    parser.add_argument("--save", help="сохранить результаты в JSON (базовый прогон)")
+    parser.add_argument("--compare", help="сравнить с сохранённым JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимый рост p50/p99 (0.2 = 20%%)")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
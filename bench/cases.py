@@ -0,0 +1,268 @@
+import itertools
+import random
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+from bench.data import ACCESS_LEVEL_NAMES, EPOCH, PERMISSIONS, PRIORITY_NAMES, STATUS_NAMES, Dataset, skewed_choices
+from repo.access import AccessLevelRepository, AccessLevelSettingRepository, AccessSettingRepository
+from repo.assigned import ProjectAssignedRepository, TaskAssignedRepository
+from repo.chat import ChatRepository
+from repo.comment import CommentRepository
+from repo.counters import ProjectCounterRepository
+from repo.message import MessageRepository
+from repo.notification import NotificationRepository
+from repo.pagination import MAX_PAGE_LIMIT
+from repo.permissions import PermissionMatrix
+from repo.priorety import PriorityRepository
+from repo.project import ProjectRepository
+from repo.read_state import ReadStateRepository
+from repo.reference_cache import ReferenceDataCache
+from repo.report import ReportRepository
+from repo.search import SearchRepository
+from repo.stats import ProjectStatsRepository
+from repo.status import StatusRepository
+from repo.task import TaskRepository
+from repo.user import UserRepository
+
+# Сколько id передаём в get_*_by_ids и сколько строк запрашиваем у get_*_page
+BATCH_SIZE = 50
+PAGE_SIZE = 50
+# Длина заранее сгенерированной (скошенной) последовательности ключей для чтений
+KEY_SEQUENCE_LENGTH = 10_000
+# Колонки задачи для сравнения проекции с ORM-объектами (4 колонки из модели Task)
+PROJECTION_FIELDS = ("task_id", "title", "status_id", "deadline")
+
+
+@dataclass
+class BenchCase:
+    """Один бенчмарк: operation(i) замеряется; setup(n) готовит данные для n вызовов вне замера."""
+    name: str
+    operation: Callable[[int], Awaitable]
+    setup: Optional[Callable[[int], Awaitable]] = None
+
+
+@dataclass
+class CrudSpec:
+    """Описание стандартных методов репозитория: get_<singular>_by_id, create_many_<plural> и т.д."""
+    repository: object
+    singular: str
+    plural: str
+    # Ключи существующих строк (аргументы get_*_by_id), в порядке убывания «популярности»
+    keys: Sequence[tuple]
+    # Значения для create_* / create_many_* (i — номер вызова)
+    new_values: Callable[[int], dict]
+    # Значения для update_* (i — номер вызова, key — ключ обновляемой строки)
+    update_values: Callable[[int, tuple], dict]
+    # Подготовка родительских строк перед созданием n новых (например, свободных пар для связующих таблиц)
+    prepare: Optional[Callable[[int], Awaitable]] = None
+
+
+def _key(created) -> tuple:
+    return created if isinstance(created, tuple) else (created,)
+
+
+def crud_cases(spec: CrudSpec, seed: int = 0) -> List[BenchCase]:
+    """Бенчмарки чтения по id, со связями, списков, создания, обновления и удаления."""
+    repo, singular, plural = spec.repository, spec.singular, spec.plural
+    rng = random.Random(seed)
+    # Чтения обращаются к «горячим» строкам чаще, как в живой нагрузке
+    hot = skewed_choices(rng, list(spec.keys), KEY_SEQUENCE_LENGTH)
+    cases = [BenchCase(f"{singular}.get_by_id",
+                       lambda i: getattr(repo, f"get_{singular}_by_id")(*hot[i % len(hot)]))]
+
+    def batch(i: int) -> list:
+        start = i * BATCH_SIZE % len(hot)
+        keys = list(dict.fromkeys(hot[start:start + BATCH_SIZE]))
+        return [key[0] if len(key) == 1 else key for key in keys]
+    cases.append(BenchCase(f"{singular}.get_by_ids", lambda i: getattr(repo, f"get_{plural}_by_ids")(batch(i))))
+
+    if hasattr(repo, f"get_{singular}_with_relations"):
+        cases.append(BenchCase(f"{singular}.get_with_relations",
+                               lambda i: getattr(repo, f"get_{singular}_with_relations")(*hot[i % len(hot)])))
+    cases.append(BenchCase(f"{singular}.get_page", lambda i: getattr(repo, f"get_{plural}_page")(limit=PAGE_SIZE)))
+    if hasattr(repo, f"get_all_{plural}"):
+        cases.append(BenchCase(f"{singular}.get_all", lambda i: getattr(repo, f"get_all_{plural}")()))
+
+    async def prepare_create(n: int):
+        if spec.prepare is not None:
+            await spec.prepare(n)
+    cases.append(BenchCase(f"{singular}.create",
+                           lambda i: getattr(repo, f"create_{singular}")(spec.new_values(i)), setup=prepare_create))
+
+    cases.append(BenchCase(f"{singular}.update",
+                           lambda i: getattr(repo, f"update_{singular}")(*hot[i % len(hot)],
+                                                                         spec.update_values(i, hot[i % len(hot)]))))
+
+    pool: List[tuple] = []
+
+    async def prepare_delete(n: int):
+        # Удаляем только что созданные строки, на которые никто не ссылается
+        await prepare_create(n)
+        created = await getattr(repo, f"create_many_{plural}")([spec.new_values(n + i) for i in range(n)],
+                                                               return_ids=True)
+        pool[:] = [_key(item) for item in created]
+    cases.append(BenchCase(f"{singular}.delete",
+                           lambda i: getattr(repo, f"delete_{singular}")(*pool[i]), setup=prepare_delete))
+    return cases
+
+
+def _fresh_ids(create_many: Callable[[int], Awaitable[List[int]]], what: str):
+    """Очередь id строк, созданных заранее вне замера: prepare(n) создаёт n штук, take() забирает следующий."""
+    queue = deque()
+
+    async def prepare(n: int):
+        queue.extend(await create_many(n))
+
+    def take() -> int:
+        if not queue:
+            raise RuntimeError(f"No prepared {what} left: setup(n) must create one per call")
+        return queue.popleft()
+    return prepare, take
+
+
+def repository_cases(async_session_factory, dataset: Dataset, seed: int = 0) -> List[BenchCase]:
+    """Бенчмарки всех репозиториев repo/ на наборе dataset."""
+    factory = async_session_factory
+    now = EPOCH + timedelta(days=90)
+    cases: List[BenchCase] = []
+
+    def add(spec: CrudSpec):
+        cases.extend(crud_cases(spec, seed))
+
+    add(CrudSpec(UserRepository(factory), "user", "users", [(user_id,) for user_id in dataset.user_ids],
+                 new_values=lambda i: {"name": f"Bench User {i}", "email": f"bench{i}@example.com",
+                                       "role_id": dataset.access_level_ids[-1]},
+                 update_values=lambda i, key: {"avatar": f"avatar{i}.png"}))
+    add(CrudSpec(ProjectRepository(factory), "project", "projects", [(project_id,) for project_id in dataset.project_ids],
+                 new_values=lambda i: {"title": f"Bench project {i}", "start_date": now,
+                                       "status_id": dataset.status_ids["project"][0], "owner_id": dataset.user_ids[0],
+                                       "priority_id": dataset.priority_ids[0]},
+                 update_values=lambda i, key: {"description": f"updated {i}"}))
+    add(CrudSpec(TaskRepository(factory), "task", "tasks", [(task_id,) for task_id in dataset.task_ids],
+                 new_values=lambda i: {"title": f"Bench task {i}", "priority_id": dataset.priority_ids[0],
+                                       "status_id": dataset.status_ids["task"][0], "executor_id": dataset.user_ids[0],
+                                       "project_id": dataset.project_ids[0], "deadline": now + timedelta(days=i % 30)},
+                 update_values=lambda i, key: {"description": f"updated {i}"}))
+    chat_projects = dict(dataset.chats)
+    add(CrudSpec(ChatRepository(factory), "chat", "chats", [(chat_id,) for chat_id, _ in dataset.chats],
+                 new_values=lambda i: {"project_id": dataset.project_ids[i % len(dataset.project_ids)]},
+                 update_values=lambda i, key: {"project_id": chat_projects[key[0]]}))
+    add(CrudSpec(MessageRepository(factory), "message", "messages", [(message_id,) for message_id in dataset.message_ids],
+                 new_values=lambda i: {"content": f"bench message {i}", "user_id": dataset.user_ids[0],
+                                       "chat_id": dataset.chats[0][0], "sent_at": now + timedelta(seconds=i)},
+                 update_values=lambda i, key: {"content": f"edited {i}"}))
+    add(CrudSpec(CommentRepository(factory), "comment", "comments", [(comment_id,) for comment_id in dataset.comment_ids],
+                 new_values=lambda i: {"content": f"bench comment {i}", "user_id": dataset.user_ids[0],
+                                       "task_id": dataset.task_ids[0]},
+                 update_values=lambda i, key: {"content": f"edited {i}"}))
+    add(CrudSpec(NotificationRepository(factory), "notification", "notifications",
+                 [(notification_id,) for notification_id in dataset.notification_ids],
+                 new_values=lambda i: {"content": f"bench notification {i}", "user_id": dataset.user_ids[0],
+                                       "sent_at": now},
+                 update_values=lambda i, key: {"content": f"edited {i}"}))
+    add(CrudSpec(ReportRepository(factory), "report", "reports", [(report_id,) for report_id in dataset.report_ids],
+                 new_values=lambda i: {"title": f"Bench report {i}", "content": "bench",
+                                       "project_id": dataset.project_ids[0]},
+                 update_values=lambda i, key: {"title": f"Report {i}"}))
+    # Справочники обновляем тем же значением, чтобы не портить набор для следующих бенчмарков
+    names = {status_id: name for ids in dataset.status_ids.values()
+             for status_id, name in zip(ids, STATUS_NAMES)}
+    names.update(zip(dataset.priority_ids, PRIORITY_NAMES))
+    names.update(zip(dataset.access_level_ids, ACCESS_LEVEL_NAMES))
+    names.update(zip(dataset.access_setting_ids, PERMISSIONS))
+    add(CrudSpec(StatusRepository(factory), "status", "statuses",
+                 [(status_id,) for ids in dataset.status_ids.values() for status_id in ids],
+                 new_values=lambda i: {"name": f"Bench status {i}", "type": "task"},
+                 update_values=lambda i, key: {"name": names[key[0]]}))
+    add(CrudSpec(PriorityRepository(factory), "priority", "priorities",
+                 [(priority_id,) for priority_id in dataset.priority_ids],
+                 new_values=lambda i: {"name": f"Bench priority {i}"},
+                 update_values=lambda i, key: {"name": names[key[0]]}))
+    add(CrudSpec(AccessLevelRepository(factory), "access_level", "access_levels",
+                 [(level_id,) for level_id in dataset.access_level_ids],
+                 new_values=lambda i: {"name": f"Bench level {i}"},
+                 update_values=lambda i, key: {"name": names[key[0]]}))
+    add(CrudSpec(AccessSettingRepository(factory), "access_setting", "access_settings",
+                 [(setting_id,) for setting_id in dataset.access_setting_ids],
+                 new_values=lambda i: {"permission": f"bench_permission_{i}"},
+                 update_values=lambda i, key: {"permission": names[key[0]]}))
+
+    # Связующие таблицы: подготовка создаёт n новых пользователей (или прав), и каждое новое
+    # значение берёт следующего из них — пара гарантированно свободна при любых scale и iterations
+    user_numbers = itertools.count()
+
+    async def create_users(n: int) -> List[int]:
+        return await UserRepository(factory).create_many_users(
+            [{"name": f"Bench member {number}", "email": f"bench_member{number}@example.com",
+              "role_id": dataset.access_level_ids[-1]} for number in itertools.islice(user_numbers, n)],
+            return_ids=True)
+
+    prepare_project_members, take_project_member = _fresh_ids(create_users, "users")
+    add(CrudSpec(ProjectAssignedRepository(factory), "project_assigned", "project_assigned", dataset.project_assigned,
+                 new_values=lambda i: {"user_id": take_project_member(),
+                                       "project_id": dataset.project_ids[i % len(dataset.project_ids)]},
+                 update_values=lambda i, key: {"created_at": now},
+                 prepare=prepare_project_members))
+    prepare_task_members, take_task_member = _fresh_ids(create_users, "users")
+    add(CrudSpec(TaskAssignedRepository(factory), "task_assigned", "task_assigned", dataset.task_assigned,
+                 new_values=lambda i: {"user_id": take_task_member(),
+                                       "task_id": dataset.task_ids[i % len(dataset.task_ids)]},
+                 update_values=lambda i, key: {"created_at": now},
+                 prepare=prepare_task_members))
+    setting_numbers = itertools.count()
+
+    async def create_settings(n: int) -> List[int]:
+        return await AccessSettingRepository(factory).create_many_access_settings(
+            [{"permission": f"bench_pair_{number}"} for number in itertools.islice(setting_numbers, n)],
+            return_ids=True)
+
+    prepare_settings, take_setting = _fresh_ids(create_settings, "access settings")
+    add(CrudSpec(AccessLevelSettingRepository(factory), "access_level_setting", "access_level_settings",
+                 dataset.access_level_settings,
+                 new_values=lambda i: {"access_level_id": dataset.access_level_ids[0],
+                                       "access_setting_id": take_setting(), "allowed": True},
+                 update_values=lambda i, key: {"allowed": key[0] == dataset.access_level_ids[0]},
+                 prepare=prepare_settings))
+
+    cases.extend(extra_cases(factory, dataset, now, seed))
+    return cases
+
+
+def extra_cases(async_session_factory, dataset: Dataset, now: datetime, seed: int = 0) -> List[BenchCase]:
+    """Бенчмарки специализированных методов: инбокс, история чата, поиск, сводки, кэши, проекции."""
+    factory = async_session_factory
+    rng = random.Random(seed)
+    users = skewed_choices(rng, dataset.user_ids, KEY_SEQUENCE_LENGTH)
+    projects = skewed_choices(rng, dataset.project_ids, KEY_SEQUENCE_LENGTH)
+    chats = skewed_choices(rng, [chat_id for chat_id, _ in dataset.chats], KEY_SEQUENCE_LENGTH)
+    chat_repo = ChatRepository(factory)
+    message_repo = MessageRepository(factory)
+    user_repo = UserRepository(factory)
+    stats_repo = ProjectStatsRepository(factory)
+    counter_repo = ProjectCounterRepository(factory)
+    read_state_repo = ReadStateRepository(factory)
+    search_repo = SearchRepository(factory)
+    task_repo = TaskRepository(factory)
+    reference_cache = ReferenceDataCache(factory)
+    permissions = PermissionMatrix(factory)
+    prefixes = ["an", "bo", "ka", "ma", "sa", "user1"]
+    queries = ["bug fix", "release", "search api", "deploy"]
+    return [
+        BenchCase("chat.list_chats_for_user", lambda i: chat_repo.list_chats_for_user(users[i % len(users)])),
+        BenchCase("message.get_chat_history", lambda i: message_repo.get_chat_history(chats[i % len(chats)])),
+        BenchCase("user.autocomplete", lambda i: user_repo.autocomplete(prefixes[i % len(prefixes)])),
+        BenchCase("stats.get_project_stats", lambda i: stats_repo.get_project_stats(projects[i % len(projects)], now)),
+        BenchCase("counters.get_project_counters",
+                  lambda i: counter_repo.get_project_counters(projects[i % len(projects)])),
+        BenchCase("read_state.unread_counts", lambda i: read_state_repo.unread_counts(users[i % len(users)])),
+        BenchCase("search.search", lambda i: search_repo.search(queries[i % len(queries)])),
+        BenchCase("reference_cache.get_status",
+                  lambda i: reference_cache.get_status(dataset.status_ids["task"][i % 3])),
+        BenchCase("permissions.can", lambda i: permissions.can(users[i % len(users)], "create_task")),
+        # Страница из MAX_PAGE_LIMIT задач: ORM-объекты против projection_select + read_model
+        BenchCase("projection.task_page_orm", lambda i: task_repo.get_tasks_page(limit=MAX_PAGE_LIMIT)),
+        BenchCase("projection.task_page_read_model",
+                  lambda i: task_repo.get_tasks_page(limit=MAX_PAGE_LIMIT, fields=PROJECTION_FIELDS)),
+    ]
@@ -0,0 +1,193 @@
+import itertools
+import random
+from dataclasses import dataclass, field, fields, replace
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+from repo.access import AccessLevelRepository, AccessLevelSettingRepository, AccessSettingRepository
+from repo.assigned import ProjectAssignedRepository, TaskAssignedRepository
+from repo.chat import ChatRepository
+from repo.comment import CommentRepository
+from repo.message import MessageRepository
+from repo.notification import NotificationRepository
+from repo.priorety import PriorityRepository
+from repo.project import ProjectRepository
+from repo.report import ReportRepository
+from repo.status import StatusRepository
+from repo.task import TaskRepository
+from repo.user import UserRepository
+
+# Показатель Ципфа: элемент с рангом r выбирается с весом 1 / r**DEFAULT_SKEW
+DEFAULT_SKEW = 1.1
+# Все даты набора отсчитываются от этого момента, чтобы прогоны были воспроизводимы
+EPOCH = datetime(2024, 1, 1)
+
+ACCESS_LEVEL_NAMES = ("Manager", "User")
+STATUS_NAMES = ("Open", "In Progress", "Done")
+PRIORITY_NAMES = ("Low", "Normal", "High")
+PERMISSIONS = ("create_project", "update_project", "delete_project", "create_task", "update_task",
+               "delete_task", "comment", "manage_users")
+SYLLABLES = ("an", "bo", "ka", "li", "mar", "na", "ol", "pe", "ri", "sa", "ta", "vi", "ya", "zo")
+WORDS = ("api", "backend", "bug", "deploy", "design", "docs", "fix", "login", "migration", "release",
+         "report", "review", "search", "test", "ui", "update")
+
+
+@dataclass(frozen=True)
+class DatasetSize:
+    """Размер синтетического набора; scaled() умножает все количества на коэффициент."""
+    users: int = 200
+    projects: int = 20
+    tasks: int = 2000
+    comments: int = 2000
+    messages: int = 5000
+    notifications: int = 2000
+
+    def scaled(self, factor: float) -> "DatasetSize":
+        return replace(self, **{item.name: max(1, int(getattr(self, item.name) * factor)) for item in fields(self)})
+
+
+@dataclass
+class Dataset:
+    """id созданных строк по таблицам — из них бенчмарки берут аргументы."""
+    size: DatasetSize
+    access_level_ids: List[int] = field(default_factory=list)
+    access_setting_ids: List[int] = field(default_factory=list)
+    access_level_settings: List[Tuple[int, int]] = field(default_factory=list)
+    status_ids: Dict[str, List[int]] = field(default_factory=dict)
+    priority_ids: List[int] = field(default_factory=list)
+    user_ids: List[int] = field(default_factory=list)
+    project_ids: List[int] = field(default_factory=list)
+    project_members: Dict[int, List[int]] = field(default_factory=dict)
+    task_ids: List[int] = field(default_factory=list)
+    task_assigned: List[Tuple[int, int]] = field(default_factory=list)
+    chats: List[Tuple[int, int]] = field(default_factory=list)  # (chat_id, project_id)
+    message_ids: List[int] = field(default_factory=list)
+    comment_ids: List[int] = field(default_factory=list)
+    notification_ids: List[int] = field(default_factory=list)
+    report_ids: List[int] = field(default_factory=list)
+
+    @property
+    def project_assigned(self) -> List[Tuple[int, int]]:
+        return [(user_id, project_id) for project_id, members in self.project_members.items() for user_id in members]
+
+
+def skewed_choices(rng: random.Random, population: Sequence, k: int, skew: float = DEFAULT_SKEW) -> list:
+    """Выбираем k элементов с распределением Ципфа: первые элементы популяции встречаются намного чаще."""
+    weights = itertools.accumulate(1 / rank ** skew for rank in range(1, len(population) + 1))
+    return rng.choices(population, cum_weights=list(weights), k=k)
+
+
+def _name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title()
+
+
+def _phrase(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def generate(async_session_factory, size: DatasetSize = DatasetSize(), seed: int = 0) -> Dataset:
+    """Заполняем пустую базу синтетическими данными пачками через create_many_* репозиториев.
+
+    Распределения скошены, как в живой базе: немногие проекты содержат большую часть задач,
+    немногие пользователи пишут большую часть сообщений и получают большую часть уведомлений.
+    """
+    rng = random.Random(seed)
+    dataset = Dataset(size)
+
+    dataset.access_level_ids = await AccessLevelRepository(async_session_factory).create_many_access_levels(
+        [{"name": name} for name in ACCESS_LEVEL_NAMES], return_ids=True)
+    dataset.access_setting_ids = await AccessSettingRepository(async_session_factory).create_many_access_settings(
+        [{"permission": permission} for permission in PERMISSIONS], return_ids=True)
+    dataset.access_level_settings = await AccessLevelSettingRepository(
+        async_session_factory).create_many_access_level_settings(
+        [{"access_level_id": level_id, "access_setting_id": setting_id, "allowed": level_id == dataset.access_level_ids[0]}
+         for level_id in dataset.access_level_ids for setting_id in dataset.access_setting_ids], return_ids=True)
+
+    statuses = StatusRepository(async_session_factory)
+    for status_type in ("project", "task"):
+        dataset.status_ids[status_type] = await statuses.create_many_statuses(
+            [{"name": name, "type": status_type} for name in STATUS_NAMES], return_ids=True)
+    dataset.priority_ids = await PriorityRepository(async_session_factory).create_many_priorities(
+        [{"name": name} for name in PRIORITY_NAMES], return_ids=True)
+
+    dataset.user_ids = await UserRepository(async_session_factory).create_many_users([{
+        "name": f"{_name(rng)} {_name(rng)}",
+        "email": f"user{index}@example.com",
+        "role_id": rng.choice(dataset.access_level_ids),
+        "registration_date": EPOCH + timedelta(minutes=index),
+    } for index in range(size.users)], return_ids=True)
+
+    owners = skewed_choices(rng, dataset.user_ids, size.projects)
+    dataset.project_ids = await ProjectRepository(async_session_factory).create_many_projects([{
+        "title": f"Project {index} {_phrase(rng, 2)}",
+        "description": _phrase(rng, 8),
+        "start_date": EPOCH + timedelta(days=rng.randint(0, 60)),
+        "status_id": rng.choice(dataset.status_ids["project"]),
+        "owner_id": owner_id,
+        "priority_id": rng.choice(dataset.priority_ids),
+    } for index, owner_id in enumerate(owners)], return_ids=True)
+
+    # Состав проектов: от пары человек до десятков (распределение Парето)
+    for project_id, owner_id in zip(dataset.project_ids, owners):
+        team = min(len(dataset.user_ids), max(2, int(rng.paretovariate(1.2) * 3)))
+        members = set(rng.sample(dataset.user_ids, team))
+        members.add(owner_id)
+        dataset.project_members[project_id] = sorted(members)
+    await ProjectAssignedRepository(async_session_factory).create_many_project_assigned(
+        [{"user_id": user_id, "project_id": project_id} for user_id, project_id in dataset.project_assigned])
+
+    task_projects = skewed_choices(rng, dataset.project_ids, size.tasks)
+    dataset.task_ids = await TaskRepository(async_session_factory).create_many_tasks([{
+        "title": f"{_phrase(rng, 3)} #{index}",
+        "description": _phrase(rng, 20),
+        "priority_id": rng.choice(dataset.priority_ids),
+        "status_id": rng.choice(dataset.status_ids["task"]),
+        "executor_id": rng.choice(dataset.project_members[project_id]),
+        "project_id": project_id,
+        "deadline": EPOCH + timedelta(days=rng.randint(0, 180), hours=rng.randint(0, 23)) if rng.random() < 0.8 else None,
+    } for index, project_id in enumerate(task_projects)], return_ids=True)
+
+    task_assigned = set()
+    for task_id, project_id in zip(dataset.task_ids, task_projects):
+        if rng.random() < 0.3:
+            members = dataset.project_members[project_id]
+            task_assigned.update((user_id, task_id) for user_id in rng.sample(members, min(len(members), 2)))
+    dataset.task_assigned = sorted(task_assigned)
+    await TaskAssignedRepository(async_session_factory).create_many_task_assigned(
+        [{"user_id": user_id, "task_id": task_id} for user_id, task_id in dataset.task_assigned])
+
+    # Чат у каждого проекта и у каждой десятой задачи
+    chat_values = [{"project_id": project_id} for project_id in dataset.project_ids]
+    chat_values += [{"project_id": project_id, "task_id": task_id}
+                    for task_id, project_id in zip(dataset.task_ids, task_projects) if rng.random() < 0.1]
+    chat_ids = await ChatRepository(async_session_factory).create_many_chats(chat_values, return_ids=True)
+    dataset.chats = [(chat_id, values["project_id"]) for chat_id, values in zip(chat_ids, chat_values)]
+
+    message_chats = skewed_choices(rng, dataset.chats, size.messages)
+    dataset.message_ids = await MessageRepository(async_session_factory).create_many_messages([{
+        "content": _phrase(rng, rng.randint(3, 30)),
+        "user_id": rng.choice(dataset.project_members[project_id]),
+        "chat_id": chat_id,
+        "sent_at": EPOCH + timedelta(seconds=index * 30),
+    } for index, (chat_id, project_id) in enumerate(message_chats)], return_ids=True)
+
+    comment_tasks = skewed_choices(rng, list(zip(dataset.task_ids, task_projects)), size.comments)
+    dataset.comment_ids = await CommentRepository(async_session_factory).create_many_comments([{
+        "content": _phrase(rng, rng.randint(5, 40)),
+        "user_id": rng.choice(dataset.project_members[project_id]),
+        "project_id": project_id,
+        "task_id": task_id,
+    } for task_id, project_id in comment_tasks], return_ids=True)
+
+    dataset.notification_ids = await NotificationRepository(async_session_factory).create_many_notifications([{
+        "content": _phrase(rng, 6),
+        "user_id": user_id,
+        "sent_at": EPOCH + timedelta(minutes=index),
+    } for index, user_id in enumerate(skewed_choices(rng, dataset.user_ids, size.notifications))], return_ids=True)
+
+    dataset.report_ids = await ReportRepository(async_session_factory).create_many_reports([{
+        "title": f"Report {project_id}",
+        "content": _phrase(rng, 200),
+        "project_id": project_id,
+    } for project_id in dataset.project_ids], return_ids=True)
+    return dataset
@@ -0,0 +1,96 @@
+"""Проекция против ORM-гидратации на полном чтении задач: задержка и пик памяти.
+
+    python -m bench.projection                          # 100 000 задач, SQLite в памяти
+    python -m bench.projection --url postgresql+asyncpg://... --reset --rows 100000
+
+Задержка — медиана --runs прогонов без трассировки; пик памяти — tracemalloc за отдельный
+прогон (трассировка сама замедляет выполнение, поэтому в задержку не входит).
+Для Postgres нужна отдельная база: --reset удаляет и заново создаёт все таблицы.
+"""
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+import tracemalloc
+from dataclasses import replace
+from typing import Awaitable, Callable, List, Tuple
+
+from sqlalchemy import select
+
+from bench.__main__ import DEFAULT_URL
+from bench.cases import PROJECTION_FIELDS
+from bench.data import DatasetSize, generate
+from engene import DatabaseSessionManager, session_scope
+from models import init
+from models.task import Task
+from repo.projection import projection_select, to_read_models
+
+DEFAULT_ROWS = 100_000
+
+
+def read_modes(async_session_factory) -> List[Tuple[str, Callable[[], Awaitable[list]]]]:
+    """Способы прочитать все задачи: (имя, корутина, возвращающая список строк)."""
+    async def orm() -> list:
+        async with session_scope(async_session_factory, read_only=True) as session:
+            return (await session.execute(select(Task))).scalars().all()
+
+    async def read_model() -> list:
+        async with session_scope(async_session_factory, read_only=True) as session:
+            result = await session.execute(projection_select(Task, PROJECTION_FIELDS))
+            return to_read_models(Task, result.all())
+
+    return [("select(Task)", orm), (f"projection_select + read_model, {len(PROJECTION_FIELDS)} колонки", read_model)]
+
+
+async def _timed(operation: Callable[[], Awaitable[list]]) -> Tuple[float, int]:
+    gc.collect()
+    started = time.perf_counter()
+    rows = await operation()
+    return time.perf_counter() - started, len(rows)
+
+
+async def _peak_memory(operation: Callable[[], Awaitable[list]]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        rows = await operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del rows
+    return peak
+
+
+async def run(args: argparse.Namespace):
+    manager = DatabaseSessionManager.get(database_url=args.url)
+    try:
+        async with manager.engine.begin() as connection:
+            if args.reset:
+                await connection.run_sync(init.ModelBase.metadata.drop_all)
+            await connection.run_sync(init.ModelBase.metadata.create_all)
+        await generate(manager.async_session_factory, replace(DatasetSize(), tasks=args.rows), seed=args.seed)
+
+        print(f"{'режим':<48} {'строк':>8} {'p50, с':>8} {'пик памяти, МБ':>15}")
+        for name, operation in read_modes(manager.async_session_factory):
+            await operation()  # прогрев: кэш компиляции запросов и классов read-моделей
+            timings = [await _timed(operation) for _ in range(args.runs)]
+            peak = await _peak_memory(operation)
+            print(f"{name:<48} {timings[0][1]:>8} {statistics.median(t for t, _ in timings):>8.2f} "
+                  f"{peak / 2 ** 20:>15.1f}")
+    finally:
+        await DatabaseSessionManager.shutdown_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проекция против ORM-гидратации: задержка и память")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"DSN базы (по умолчанию {DEFAULT_URL})")
+    parser.add_argument("--reset", action="store_true", help="удалить и создать таблицы заново перед прогоном")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="число задач в наборе данных")
+    parser.add_argument("--runs", type=int, default=5, help="прогонов на режим для медианы задержки")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import json
+import math
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+
+@dataclass
+class BenchResult:
+    """Результат одного бенчмарка: пропускная способность и задержки одной операции."""
+    name: str
+    iterations: int
+    total_seconds: float
+    ops_per_sec: float
+    p50_ms: float
+    p99_ms: float
+
+
+@dataclass
+class Regression:
+    """Бенчмарк, ставший медленнее базового прогона больше чем на tolerance."""
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        return self.current / self.baseline - 1 if self.baseline else math.inf
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга по отсортированным значениям."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def measure(name: str, operation: Callable[[int], Awaitable], iterations: int,
+                  warmup: int = 0) -> BenchResult:
+    """Выполняем operation(i) warmup раз без замера и iterations раз с замером каждого вызова."""
+    for index in range(warmup):
+        await operation(index)
+    latencies = []
+    started = time.perf_counter()
+    for index in range(warmup, warmup + iterations):
+        begin = time.perf_counter()
+        await operation(index)
+        latencies.append(time.perf_counter() - begin)
+    total = time.perf_counter() - started
+    latencies.sort()
+    return BenchResult(
+        name=name,
+        iterations=iterations,
+        total_seconds=total,
+        ops_per_sec=iterations / total if total else math.inf,
+        p50_ms=percentile(latencies, 50) * 1000,
+        p99_ms=percentile(latencies, 99) * 1000,
+    )
+
+
+def save_baseline(path: str, results: Iterable[BenchResult], metadata: Optional[dict] = None):
+    """Сохраняем результаты прогона в JSON для сравнения с последующими коммитами."""
+    payload = {"metadata": metadata or {}, "results": {result.name: asdict(result) for result in results}}
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(payload, file, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> Dict[str, BenchResult]:
+    """Читаем результаты базового прогона: {имя бенчмарка: результат}."""
+    with open(path, encoding="utf-8") as file:
+        payload = json.load(file)
+    return {name: BenchResult(**values) for name, values in payload["results"].items()}
+
+
+def compare(results: Iterable[BenchResult], baseline: Dict[str, BenchResult],
+            tolerance: float = 0.2) -> List[Regression]:
+    """Находим бенчмарки, у которых p50 или p99 выросли больше чем на tolerance относительно baseline."""
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            before, after = getattr(previous, metric), getattr(result, metric)
+            if before and after > before * (1 + tolerance):
+                regressions.append(Regression(result.name, metric, before, after))
+    return regressions
+
+
+def format_table(results: Iterable[BenchResult], baseline: Optional[Dict[str, BenchResult]] = None) -> str:
+    """Таблица результатов; с baseline — с изменением p50 в процентах."""
+    lines = [f"{'benchmark':<48} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9}" + ("  p50 vs base" if baseline else "")]
+    for result in results:
+        line = f"{result.name:<48} {result.ops_per_sec:>10.1f} {result.p50_ms:>9.3f} {result.p99_ms:>9.3f}"
+        previous = (baseline or {}).get(result.name)
+        if previous is not None and previous.p50_ms:
+            line += f"  {(result.p50_ms / previous.p50_ms - 1) * 100:+.1f}%"
+        lines.append(line)
+    return "\n".join(lines)
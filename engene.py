@@ -1,21 +1,250 @@
+import itertools
+import time
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
+import instrumentation
+from config import DatabaseSettings
+
+
+# Момент последней записи в текущем контексте asyncio (для read-your-writes)
+_last_write_at: ContextVar[Optional[float]] = ContextVar("last_write_at", default=None)
+
+
+class RoutingSessionFactory(async_sessionmaker):
+    """Фабрика сессий primary, которая умеет выдавать сессии для чтения с реплик.
+
+    Вызов factory() по-прежнему открывает сессию на primary; for_read() выбирает реплику
+    через DatabaseSessionManager (или primary, если реплик нет либо действует read-your-writes).
+    """
+
+    manager: Optional["DatabaseSessionManager"] = None
+
+    def for_read(self) -> AsyncSession:
+        if self.manager is None:
+            return self()
+        return self.manager.read_session()
+
+    def note_write(self):
+        """Отмечаем запись в текущем контексте: следующие чтения какое-то время пойдут на primary."""
+        _last_write_at.set(time.monotonic())
+
 
 class DatabaseSessionManager:
-    def __init__(self, database_url: str):
+    """Движок, пул соединений и фабрика сессий для одной базы.
+
+    На каждый DSN в процессе существует ровно один менеджер (и один пул): повторное
+    создание для того же DSN запрещено, общий экземпляр выдаёт DatabaseSessionManager.get().
+    Если в настройках заданы replica_urls, методы чтения репозиториев уходят на реплики,
+    а запись — на primary.
+    """
+
+    _registry: Dict[str, "DatabaseSessionManager"] = {}
+
+    def __init__(self, database_url: Optional[str] = None, settings: Optional[DatabaseSettings] = None):
+        settings = settings or DatabaseSettings.from_env()
+        if database_url is not None:
+            settings = replace(settings, url=database_url)
+        key = self._registry_key(settings.url)
+        if key in self._registry:
+            raise RuntimeError(f"DatabaseSessionManager for {make_url(settings.url)!r} already exists, "
+                               f"use DatabaseSessionManager.get()")
+        self.settings = settings
+        self.engine: Optional[AsyncEngine] = None
+        self.replica_engines: List[AsyncEngine] = []
+        self._replica_session_factories: List[async_sessionmaker] = []
+        self._replica_counter = itertools.count()
+        self.async_session_factory = RoutingSessionFactory(expire_on_commit=False, class_=AsyncSession)
+        self.async_session_factory.manager = self
+        self.startup()
+
+    @staticmethod
+    def _registry_key(database_url: str) -> str:
+        return make_url(database_url).render_as_string(hide_password=False)
+
+    @classmethod
+    def get(cls, database_url: Optional[str] = None,
+            settings: Optional[DatabaseSettings] = None) -> "DatabaseSessionManager":
+        """Возвращаем менеджер для DSN, создавая его при первом обращении."""
+        settings = settings or DatabaseSettings.from_env()
+        url = database_url or settings.url
+        manager = cls._registry.get(cls._registry_key(url))
+        if manager is None:
+            manager = cls(database_url=url, settings=settings)
+        return manager
+
+    def _create_engine(self, database_url: str) -> AsyncEngine:
         # Настройка асинхронного движка SQLAlchemy с параметрами пула соединений
-        self.engine = create_async_engine(
-            database_url,
-            echo=True,
-            pool_size=5,
-            max_overflow=10,
-            pool_timeout=30,
-            pool_recycle=1800,
-        )
-
-        # Создание фабрики для асинхронных сессий
-        self.async_session_factory = async_sessionmaker(bind=self.engine, expire_on_commit=False, class_=AsyncSession)
+        engine_options = {"echo": self.settings.echo}
+        if make_url(database_url).get_backend_name() != "sqlite":
+            engine_options.update(
+                pool_size=self.settings.pool_size,
+                max_overflow=self.settings.max_overflow,
+                pool_timeout=self.settings.pool_timeout,
+                pool_recycle=self.settings.pool_recycle,
+            )
+        return create_async_engine(database_url, **engine_options)
+
+    def startup(self):
+        """Создаём движки primary и реплик с пулами соединений (повторный вызов ничего не делает).
+
+        После shutdown() менеджер можно запустить снова, только если для его DSN за это время
+        не зарегистрировали другой менеджер: иначе в процессе оказалось бы два пула на одну базу.
+        """
+        if self.engine is not None:
+            return
+        registered = self._registry.get(self._registry_key(self.settings.url))
+        if registered is not None and registered is not self:
+            raise RuntimeError(f"Another DatabaseSessionManager for {make_url(self.settings.url)!r} is running, "
+                               f"use DatabaseSessionManager.get()")
+        if self.settings.instrument and not instrumentation.is_enabled():
+            instrumentation.enable()
+        self.engine = self._create_engine(self.settings.url)
+        # Фабрика сессий остаётся тем же объектом, чтобы репозитории переживали перезапуск движка
+        self.async_session_factory.configure(bind=self.engine)
+        self.replica_engines = [self._create_engine(url) for url in self.settings.replica_urls]
+        self._replica_session_factories = [
+            async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+            for engine in self.replica_engines
+        ]
+        self._registry[self._registry_key(self.settings.url)] = self
+
+    async def shutdown(self):
+        """Закрываем все соединения пулов и снимаем менеджер с регистрации."""
+        key = self._registry_key(self.settings.url)
+        # Повторный shutdown старого менеджера не должен снимать с регистрации новый для того же DSN
+        if self._registry.get(key) is self:
+            del self._registry[key]
+        for engine in self.replica_engines:
+            await engine.dispose()
+        self.replica_engines = []
+        self._replica_session_factories = []
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+
+    def _pinned_to_primary(self) -> bool:
+        window = self.settings.read_your_writes_window
+        last_write_at = _last_write_at.get()
+        return window > 0 and last_write_at is not None and time.monotonic() - last_write_at < window
+
+    def _choose_replica(self) -> async_sessionmaker:
+        factories = self._replica_session_factories
+        start = next(self._replica_counter) % len(factories)
+        if self.settings.replica_strategy == "least_loaded":
+            # Реплика с наименьшим числом выданных соединений; при равенстве — по кругу
+            order = factories[start:] + factories[:start]
+            return min(order, key=lambda factory: getattr(factory.kw["bind"].sync_engine.pool, "checkedout",
+                                                          lambda: 0)())
+        return factories[start]
+
+    def read_session(self) -> AsyncSession:
+        """Сессия для чтения: на реплике, либо на primary, если реплик нет или действует read-your-writes."""
+        if not self._replica_session_factories or self._pinned_to_primary():
+            return self.async_session_factory()
+        return self._choose_replica()()
+
+    @classmethod
+    async def shutdown_all(cls):
+        """Закрываем все зарегистрированные менеджеры (при остановке приложения)."""
+        for manager in list(cls._registry.values()):
+            await manager.shutdown()
+
+
+# Активная единица работы текущей задачи asyncio (или None)
+_current_unit_of_work: ContextVar[Optional["UnitOfWork"]] = ContextVar("current_unit_of_work", default=None)
+
+_AFTER_COMMIT_KEY = "after_commit_callbacks"
+
+
+def after_commit(session: AsyncSession, callback: Callable, *args):
+    """Откладываем callback до фиксации транзакции, в которой работает session.
+
+    Используется для сброса in-process кэшей: внутри UnitOfWork они должны сбрасываться
+    только после общего commit, а не после отдельного вызова репозитория.
+    """
+    session.info.setdefault(_AFTER_COMMIT_KEY, []).append((callback, args))
+
+
+def _run_after_commit(session: AsyncSession):
+    for callback, args in session.info.pop(_AFTER_COMMIT_KEY, []):
+        callback(*args)
+
+
+class UnitOfWork:
+    """Единица работы: одна сессия, одно соединение и одна транзакция на несколько вызовов репозиториев.
+
+    Репозитории, созданные с той же фабрикой сессий, внутри блока `async with` автоматически
+    присоединяются к общей транзакции. При выходе без исключения транзакция фиксируется,
+    при исключении — откатывается. Вызовы внутри блока должны выполняться последовательно:
+    AsyncSession нельзя использовать из нескольких корутин одновременно.
+    """
+
+    def __init__(self, async_session_factory):
+        self.async_session_factory = async_session_factory
+        self.session: Optional[AsyncSession] = None
+        self._outer: Optional["UnitOfWork"] = None
+        self._token = None
+
+    async def __aenter__(self) -> "UnitOfWork":
+        current = _current_unit_of_work.get()
+        if current is not None and current.async_session_factory is self.async_session_factory:
+            # Вложенная единица работы присоединяется к внешней
+            self._outer = current
+            self.session = current.session
+            return self
+        self.session = self.async_session_factory()
+        await self.session.begin()
+        self._token = _current_unit_of_work.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._outer is not None:
+            return
+        _current_unit_of_work.reset(self._token)
+        try:
+            if exc_type is None:
+                await self.session.commit()
+                _run_after_commit(self.session)
+                if hasattr(self.async_session_factory, "note_write"):
+                    self.async_session_factory.note_write()
+            else:
+                self.session.info.pop(_AFTER_COMMIT_KEY, None)
+                await self.session.rollback()
+        finally:
+            await self.session.close()
+
+
+def uow(session_manager) -> UnitOfWork:
+    """Создаём UnitOfWork по DatabaseSessionManager или напрямую по фабрике сессий."""
+    return UnitOfWork(getattr(session_manager, "async_session_factory", session_manager))
+
+
+@asynccontextmanager
+async def session_scope(async_session_factory, read_only: bool = False):
+    """Сессия для метода репозитория.
 
+    Внутри активной UnitOfWork с той же фабрикой возвращаем её общую сессию (commit сделает
+    UnitOfWork). Иначе открываем новую сессию со своей транзакцией: при read_only=True —
+    на реплике, если фабрика это поддерживает, иначе на primary.
+    """
+    current = _current_unit_of_work.get()
+    if current is not None and current.async_session_factory is async_session_factory:
+        yield current.session
+        return
+    if read_only and hasattr(async_session_factory, "for_read"):
+        session = async_session_factory.for_read()
+    else:
+        session = async_session_factory()
+    async with session:
+        async with session.begin():
+            yield session
+        _run_after_commit(session)
+    if not read_only and hasattr(async_session_factory, "note_write"):
+        async_session_factory.note_write()
@@ -0,0 +1,293 @@
+import functools
+import inspect
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import aclosing
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+
+# Верхние границы корзин гистограммы задержек, секунды
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_NAMESPACE = "repository"
+
+
+@dataclass
+class CallStats:
+    """Замер одного вызова метода репозитория.
+
+    statements и pool_wait включают вложенные вызовы других репозиториев, rows — только
+    строки, которые вернул сам метод (длина списка, страницы, словаря; 1 для одного объекта).
+    """
+    method: str
+    seconds: float = 0.0
+    statements: int = 0
+    rows: int = 0
+    pool_wait: float = 0.0
+    error: bool = False
+    # Момент запроса соединения у сессии: от него до checkout из пула считаем ожидание
+    _requested_at: Optional[float] = field(default=None, repr=False)
+
+
+class MetricsSink(ABC):
+    """Приёмник замеров; record() вызывается синхронно после каждого вызова метода."""
+
+    @abstractmethod
+    def record(self, stats: CallStats):
+        """Сохраняем замер одного вызова."""
+
+
+@dataclass
+class MethodMetrics:
+    """Накопленные метрики одного метода: гистограмма задержек и суммы счётчиков."""
+    buckets: Sequence[float]
+    bucket_counts: List[int]
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    statements: int = 0
+    rows: int = 0
+    pool_wait: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.calls if self.calls else 0.0
+
+    @property
+    def statements_per_call(self) -> float:
+        return self.statements / self.calls if self.calls else 0.0
+
+
+class InMemoryRegistry(MetricsSink):
+    """Метрики в памяти процесса по имени метода ("UserRepository.get_user_by_id")."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.metrics: Dict[str, MethodMetrics] = {}
+
+    def record(self, stats: CallStats):
+        metrics = self.metrics.get(stats.method)
+        if metrics is None:
+            metrics = self.metrics[stats.method] = MethodMetrics(self.buckets, [0] * (len(self.buckets) + 1))
+        # Последняя корзина — всё, что дольше верхней границы (+Inf)
+        metrics.bucket_counts[bisect_left(self.buckets, stats.seconds)] += 1
+        metrics.calls += 1
+        metrics.errors += stats.error
+        metrics.seconds += stats.seconds
+        metrics.statements += stats.statements
+        metrics.rows += stats.rows
+        metrics.pool_wait += stats.pool_wait
+
+    def snapshot(self) -> Dict[str, MethodMetrics]:
+        """Копия текущих метрик, отсортированная по имени метода."""
+        return {method: MethodMetrics(metrics.buckets, list(metrics.bucket_counts), metrics.calls, metrics.errors,
+                                      metrics.seconds, metrics.statements, metrics.rows, metrics.pool_wait)
+                for method, metrics in sorted(self.metrics.items())}
+
+    def reset(self):
+        self.metrics.clear()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(registry: InMemoryRegistry, namespace: str = DEFAULT_NAMESPACE) -> str:
+    """Метрики реестра в текстовом формате Prometheus (для эндпоинта /metrics)."""
+    snapshot = registry.snapshot()
+    lines = [f"# HELP {namespace}_call_duration_seconds Repository method latency.",
+             f"# TYPE {namespace}_call_duration_seconds histogram"]
+    for method, metrics in snapshot.items():
+        label = f'method="{_escape_label(method)}"'
+        cumulative = 0
+        for bound, count in zip(metrics.buckets, metrics.bucket_counts):
+            cumulative += count
+            lines.append(f'{namespace}_call_duration_seconds_bucket{{{label},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{namespace}_call_duration_seconds_bucket{{{label},le="+Inf"}} {metrics.calls}')
+        lines.append(f"{namespace}_call_duration_seconds_sum{{{label}}} {metrics.seconds!r}")
+        lines.append(f"{namespace}_call_duration_seconds_count{{{label}}} {metrics.calls}")
+
+    counters = (
+        ("call_errors_total", "Repository method calls that raised.", "errors"),
+        ("statements_total", "SQL statements issued by repository methods.", "statements"),
+        ("rows_total", "Rows returned by repository methods.", "rows"),
+        ("pool_wait_seconds_total", "Time repository methods waited for a pooled connection.", "pool_wait"),
+    )
+    for name, description, attribute in counters:
+        lines.append(f"# HELP {namespace}_{name} {description}")
+        lines.append(f"# TYPE {namespace}_{name} counter")
+        for method, metrics in snapshot.items():
+            lines.append(f'{namespace}_{name}{{method="{_escape_label(method)}"}} {getattr(metrics, attribute)!r}')
+    return "\n".join(lines) + "\n"
+
+
+# Приёмники включённой инструментации; пустой кортеж — выключена
+_sinks: Tuple[MetricsSink, ...] = ()
+# Замер метода репозитория, выполняющегося в текущем контексте asyncio
+_current_call: ContextVar[Optional[CallStats]] = ContextVar("current_repository_call", default=None)
+
+default_registry = InMemoryRegistry()
+
+
+def _on_orm_execute(orm_execute_state):
+    stats = _current_call.get()
+    if stats is not None:
+        stats._requested_at = time.perf_counter()
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    stats = _current_call.get()
+    if stats is not None and stats._requested_at is not None:
+        stats.pool_wait += time.perf_counter() - stats._requested_at
+        stats._requested_at = None
+
+
+def _on_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_call.get()
+    if stats is not None:
+        stats.statements += 1
+        # Соединение уже было у сессии — ожидания пула не было
+        stats._requested_at = None
+
+
+_LISTENERS = (
+    (Session, "do_orm_execute", _on_orm_execute),
+    (Pool, "checkout", _on_checkout),
+    (Engine, "before_cursor_execute", _on_cursor_execute),
+)
+
+
+def enable(*sinks: MetricsSink):
+    """Включаем сбор метрик во всех движках процесса; без аргументов пишем в default_registry."""
+    global _sinks
+    if not _sinks:
+        for target, name, listener in _LISTENERS:
+            event.listen(target, name, listener)
+    _sinks = sinks or (default_registry,)
+
+
+def disable():
+    """Выключаем сбор метрик: слушатели событий снимаются, декорированные методы вызываются напрямую."""
+    global _sinks
+    if _sinks:
+        for target, name, listener in _LISTENERS:
+            event.remove(target, name, listener)
+    _sinks = ()
+
+
+def is_enabled() -> bool:
+    return bool(_sinks)
+
+
+def _count_rows(result) -> int:
+    if result is None or isinstance(result, (bool, int, float, str, bytes)):
+        return 0
+    if isinstance(result, (list, tuple, dict, set, frozenset)):
+        return len(result)
+    items = getattr(result, "items", None)
+    if isinstance(items, list):
+        # Page
+        return len(items)
+    return 1
+
+
+def _start(method: str):
+    stats = CallStats(method)
+    token = _current_call.set(stats)
+    return stats, token, time.perf_counter()
+
+
+def _finish(stats: CallStats, token, started: float):
+    stats.seconds = time.perf_counter() - started
+    try:
+        _current_call.reset(token)
+    except ValueError:
+        # Генератор закрыли из другого контекста (например, при сборке мусора)
+        pass
+    parent = _current_call.get()
+    if parent is not None:
+        parent.statements += stats.statements
+        parent.pool_wait += stats.pool_wait
+    for sink in _sinks:
+        sink.record(stats)
+
+
+def _wrap_coroutine(method: str, func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not _sinks:
+            return await func(*args, **kwargs)
+        stats, token, started = _start(method)
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException:
+            stats.error = True
+            raise
+        else:
+            stats.rows = _count_rows(result)
+            return result
+        finally:
+            _finish(stats, token, started)
+    return wrapper
+
+
+def _wrap_async_generator(method: str, func):
+    # Замер охватывает весь обход: от первого элемента до исчерпания или закрытия генератора;
+    # время потребителя между элементами тоже входит в задержку
+    async def measured(*args, **kwargs):
+        stats, token, started = _start(method)
+        try:
+            async with aclosing(func(*args, **kwargs)) as items:
+                async for item in items:
+                    stats.rows += 1
+                    _current_call.reset(token)
+                    try:
+                        yield item
+                    finally:
+                        token = _current_call.set(stats)
+        except GeneratorExit:
+            # Потребитель прервал обход — это не ошибка метода
+            raise
+        except BaseException:
+            stats.error = True
+            raise
+        finally:
+            _finish(stats, token, started)
+
+    # Обычная функция, а не async-генератор: при выключенной инструментации возвращаем
+    # генератор метода как есть, без промежуточного слоя на каждый элемент
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _sinks:
+            return func(*args, **kwargs)
+        return measured(*args, **kwargs)
+    return wrapper
+
+
+def instrumented(cls=None, *, exclude: Iterable[str] = ()):
+    """Декоратор класса репозитория: замеряем все публичные async-методы и async-генераторы.
+
+    Метрики пишутся под именем "<Класс>.<метод>". Пока инструментация выключена, обёртка
+    только проверяет флаг и вызывает метод.
+    """
+    def decorate(cls):
+        excluded = set(exclude)
+        for name, func in list(vars(cls).items()):
+            if name.startswith("_") or name in excluded:
+                continue
+            if isinstance(func, (staticmethod, classmethod)):
+                continue
+            method = f"{cls.__name__}.{name}"
+            if inspect.iscoroutinefunction(func):
+                setattr(cls, name, _wrap_coroutine(method, func))
+            elif inspect.isasyncgenfunction(func):
+                setattr(cls, name, _wrap_async_generator(method, func))
+        return cls
+
+    return decorate if cls is None else decorate(cls)
@@ -1,13 +1,37 @@
 import datetime
 from typing import Annotated
 from sqlalchemy import text, Integer, DateTime, String
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase, mapped_column
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class utcnow(FunctionElement):
+    """Текущее время в UTC без часового пояса; SQL зависит от диалекта."""
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', now())"
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite (локальные запуски и реплики-заглушки в тестах) хранит CURRENT_TIMESTAMP в UTC
+    return "CURRENT_TIMESTAMP"
+
+
+def utcnow_naive() -> datetime.datetime:
+    """Текущее время в UTC без часового пояса — то же значение, что utcnow() на стороне базы."""
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
 
 
 intpk = Annotated[int, mapped_column(primary_key=True, autoincrement=True)]
-created_at = Annotated[datetime.datetime, mapped_column(index=True,server_default=text("TIMEZONE('utc', now())"))]
-updated_at = Annotated[datetime.datetime, mapped_column(server_default=text("TIMEZONE('utc', now())"),
-                                                        onupdate=datetime.datetime.now(datetime.UTC))]
+created_at = Annotated[datetime.datetime, mapped_column(index=True,server_default=utcnow())]
+updated_at = Annotated[datetime.datetime, mapped_column(server_default=utcnow(),
+                                                        onupdate=utcnow_naive)]
 str_2048 = Annotated[str, 2048]
 str_1024 = Annotated[str, 1024]
 str_10 = Annotated[str, 10]
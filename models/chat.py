@@ -15,9 +15,17 @@ class Chat(ModelBase):
     chat_id: Mapped[intpk] = mapped_column(index=True)  # Добавляем индекс на поле chat_id
     project_id: Mapped[Optional[int]] = mapped_column(ForeignKey("projects.project_id"), index=True)  # Добавляем индекс на поле project_id
     task_id: Mapped[Optional[int]] = mapped_column(ForeignKey("tasks.task_id"), index=True)  # Добавляем индекс на поле task_id
+    # Денормализованное последнее сообщение чата; обновляется в MessageRepository.create_message(s).
+    # Без внешнего ключа, чтобы не создавать цикл зависимостей chats <-> messages
+    last_message_id: Mapped[Optional[int]]
+    last_message_at: Mapped[Optional[datetime]]
     project: Mapped[Optional["Project"]] = relationship(back_populates="chat")
     task: Mapped[Optional["Task"]] = relationship(back_populates="chat")
     messages: Mapped[List["Message"]] = relationship(back_populates="chat")
 
     # Создаем составной индекс для полей project_id и task_id
-    __table_args__ = (Index('ix_chat_project_task', 'project_id', 'task_id'), )
\ No newline at end of file
+    # и индекс для списка чатов по последней активности
+    __table_args__ = (
+        Index('ix_chat_project_task', 'project_id', 'task_id'),
+        Index('ix_chats_last_message_at', 'last_message_at', 'chat_id'),
+    )
\ No newline at end of file
@@ -3,11 +3,15 @@ from . access import AccessLevel, AccessSetting, AccessLevelSetting
 from . assigned import ProjectAssigned, TaskAssigned
 from . chat import Chat
 from . comment import Comment
+from . job_state import JobState
 from . message import Message
 from . notification import Notification
 from . project import Project
+from . project_counters import ProjectCounter, ProjectStatusCounter
 from . priorety import Priority
-from . report import Report
+from . read_state import ChatReadState, NotificationReadState
+from . report import Report, ReportChunk
 from . status import Status
 from . task import Task
 from . user import User
+from . search import SEARCH_SCOPES, install_search
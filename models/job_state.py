@@ -0,0 +1,16 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Mapped, mapped_column
+
+from models.base import ModelBase
+
+
+class JobState(ModelBase):
+    __tablename__ = 'job_state'
+    name: Mapped[str] = mapped_column(primary_key=True)  # Имя фоновой задачи, например 'deadline_sweep:overdue'
+    # Граница уже обработанного окна: (watermark, watermark_id) последней обработанной строки
+    # или только watermark, если окно обработано целиком
+    watermark: Mapped[Optional[datetime]]
+    watermark_id: Mapped[Optional[int]]
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -15,6 +15,10 @@ class Message(ModelBase):
     user: Mapped["User"] = relationship(back_populates="messages")
 
     # Создаем составной индекс для полей user_id и chat_id
+    # и индекс для постраничной истории чата (keyset по sent_at, message_id)
+    # и индекс для подсчёта непрочитанных (message_id > last_read_message_id)
     __table_args__ = (
         Index('ix_messages_user_chat', 'user_id', 'chat_id'),
+        Index('ix_messages_chat_sent_at_id', 'chat_id', 'sent_at', 'message_id'),
+        Index('ix_messages_chat_message_id', 'chat_id', 'message_id'),
     )
\ No newline at end of file
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
 
-from sqlalchemy import  Text, TIMESTAMP, Integer, Boolean, ForeignKey, DateTime, BigInteger, Index, Enum
+from sqlalchemy import  text, Text, TIMESTAMP, Integer, Boolean, ForeignKey, DateTime, BigInteger, Index, Enum
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from models.base import ModelBase, intpk, created_at
@@ -15,9 +15,15 @@ class Notification(ModelBase):
     content: Mapped[str]
     user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"), index=True)  # Добавляем индекс на поле user_id
     sent_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, index=True)  # Добавляем индекс на поле sent_at
+    read_at: Mapped[Optional[datetime]]  # NULL — уведомление ещё не прочитано
+    # Ключ идемпотентности для уведомлений, создаваемых фоновыми задачами (NULL — без дедупликации)
+    dedup_key: Mapped[Optional[str]] = mapped_column(unique=True)
     user: Mapped["User"] = relationship(back_populates="notifications")
 
     # Создаем составной индекс для полей user_id и sent_at
+    # и частичный индекс только по непрочитанным уведомлениям
     __table_args__ = (
         Index('ix_notifications_user_sent_at', 'user_id', 'sent_at'),
+        Index('ix_notifications_user_unread', 'user_id',
+              postgresql_where=text('read_at IS NULL'), sqlite_where=text('read_at IS NULL')),
     )
\ No newline at end of file
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Optional, List
+
+from sqlalchemy import Text, TIMESTAMP, Integer, Boolean, ForeignKey, DateTime, BigInteger, Index, Enum
+from sqlalchemy.orm import relationship, Mapped, mapped_column
+
+from models.base import ModelBase, intpk, created_at
+
+
+class ProjectCounter(ModelBase):
+    __tablename__ = 'project_counters'
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey('projects.project_id', ondelete="CASCADE"),
+        primary_key=True
+    )
+    total_tasks: Mapped[int] = mapped_column(default=0, server_default='0')
+    # Просроченные на момент последнего пересчёта (ProjectCounterRepository.reconcile); запись задач их не меняет
+    overdue_tasks: Mapped[int] = mapped_column(default=0, server_default='0')
+    assignees: Mapped[int] = mapped_column(default=0, server_default='0')  # Участники из project_assigned
+
+
+class ProjectStatusCounter(ModelBase):
+    __tablename__ = 'project_status_counters'
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey('projects.project_id', ondelete="CASCADE"),
+        primary_key=True
+    )
+    status_id: Mapped[int] = mapped_column(
+        ForeignKey('statuses.id', ondelete="CASCADE"),
+        primary_key=True
+    )
+    task_count: Mapped[int] = mapped_column(default=0, server_default='0')
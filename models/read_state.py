@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Optional, List
+
+from sqlalchemy import Text, TIMESTAMP, Integer, Boolean, ForeignKey, DateTime, BigInteger, Index, Enum
+from sqlalchemy.orm import relationship, Mapped, mapped_column
+
+from models.base import ModelBase, intpk, created_at
+
+
+class ChatReadState(ModelBase):
+    __tablename__ = 'chat_read_state'
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.user_id', ondelete="CASCADE"),
+        primary_key=True
+    )
+    chat_id: Mapped[int] = mapped_column(
+        ForeignKey('chats.chat_id', ondelete="CASCADE"),
+        primary_key=True,
+        index=True  # Добавляем индекс на поле chat_id
+    )
+    # Последнее прочитанное сообщение; NULL — пользователь ещё не открывал чат
+    last_read_message_id: Mapped[Optional[int]]
+    # Счётчик непрочитанных, поддерживается при записи (MessageRepository(unread_counters=True))
+    unread_count: Mapped[int] = mapped_column(default=0, server_default='0')
+
+
+class NotificationReadState(ModelBase):
+    __tablename__ = 'notification_read_state'
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.user_id', ondelete="CASCADE"),
+        primary_key=True
+    )
+    # Счётчик непрочитанных уведомлений, поддерживается при записи
+    # (NotificationRepository(unread_counters=True))
+    unread_count: Mapped[int] = mapped_column(default=0, server_default='0')
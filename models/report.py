@@ -25,4 +25,12 @@ class Report(ModelBase):
     __table_args__ = (
         Index('ix_reports_title', 'title'),
 
-    )
\ No newline at end of file
+    )
+
+
+class ReportChunk(ModelBase):
+    # Кусок текста отчёта, пока ProjectReportBuilder его строит; после сборки Report.content удаляется
+    __tablename__ = 'report_chunks'
+    report_id: Mapped[int] = mapped_column(ForeignKey("reports.report_id", ondelete="CASCADE"), primary_key=True)
+    seq: Mapped[int] = mapped_column(primary_key=True)  # Порядковый номер куска внутри отчёта
+    content: Mapped[str] = mapped_column(Text)
@@ -0,0 +1,80 @@
+from sqlalchemy import DDL, event
+
+from models.comment import Comment
+from models.message import Message
+from models.task import Task
+
+# Конфигурация полнотекстового поиска Postgres: 'simple' не зависит от языка текста
+SEARCH_CONFIG = 'simple'
+
+# Область поиска -> (модель, индексируемые колонки в порядке убывания веса)
+SEARCH_SCOPES = {
+    'tasks': (Task, ('title', 'description')),
+    'comments': (Comment, ('content',)),
+    'messages': (Message, ('content',)),
+}
+
+_WEIGHTS = 'ABCD'
+
+
+def _postgresql_ddl(model, columns) -> list:
+    """Генерируемая колонка search_vector и GIN-индекс по ней."""
+    table = model.__tablename__
+    vector = ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({column}, '')), '{_WEIGHTS[index]}')"
+        for index, column in enumerate(columns)
+    )
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)",
+    ]
+
+
+def _sqlite_ddl(model, columns) -> list:
+    """FTS5-таблица с внешним содержимым и триггеры, поддерживающие её в актуальном состоянии."""
+    table = model.__tablename__
+    fts = f"{table}_fts"
+    pk = model.__table__.primary_key.columns.keys()[0]
+    names = ', '.join(columns)
+    new_values = ', '.join(f"new.{column}" for column in columns)
+    old_values = ', '.join(f"old.{column}" for column in columns)
+    delete_old = (f"INSERT INTO {fts}({fts}, rowid, {names}) "
+                  f"VALUES ('delete', old.{pk}, {old_values});")
+    insert_new = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.{pk}, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+        f"content_rowid='{pk}', tokenize='unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN {delete_old} {insert_new} END",
+        # Индексируем строки, которые уже были в таблице
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def search_ddl(dialect_name: str) -> list:
+    """DDL поисковой подсистемы для диалекта (пустой список, если диалект не поддерживается)."""
+    statements = []
+    for model, columns in SEARCH_SCOPES.values():
+        if dialect_name == 'postgresql':
+            statements += _postgresql_ddl(model, columns)
+        elif dialect_name == 'sqlite':
+            statements += _sqlite_ddl(model, columns)
+    return statements
+
+
+def install_search(connection):
+    """Идемпотентно создаём поисковые колонки/индексы в уже существующей базе (через run_sync)."""
+    for statement in search_ddl(connection.dialect.name):
+        connection.exec_driver_sql(statement)
+
+
+# При create_all поиск создаётся вместе с таблицами
+for _model, _columns in SEARCH_SCOPES.values():
+    for _statement in _postgresql_ddl(_model, _columns):
+        event.listen(_model.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+    for _statement in _sqlite_ddl(_model, _columns):
+        event.listen(_model.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+    event.listen(_model.__table__, 'before_drop',
+                 DDL(f"DROP TABLE IF EXISTS {_model.__tablename__}_fts").execute_if(dialect='sqlite'))
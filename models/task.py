@@ -4,7 +4,7 @@ from typing import Optional, List
 from sqlalchemy import Text, TIMESTAMP, Integer, Boolean, ForeignKey, DateTime, BigInteger, Index, Enum
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
-from models.base import ModelBase, intpk, created_at
+from models.base import ModelBase, intpk, created_at, updated_at
 
 
 class Task(ModelBase):
@@ -17,6 +17,7 @@ class Task(ModelBase):
     executor_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"), index=True)  # Добавляем индекс на поле executor_id
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.project_id"), index=True)  # Добавляем индекс на поле project_id
     deadline: Mapped[Optional[datetime]] = mapped_column(index=True)  # Добавляем индекс на поле deadline
+    updated_at: Mapped[updated_at]  # Время последнего изменения (для инкрементальных отчётов)
 
     priority: Mapped["Priority"] = relationship(back_populates="tasks")
     chat: Mapped[Optional["Chat"]] = relationship(back_populates="task", uselist=False)
@@ -29,6 +30,8 @@ class Task(ModelBase):
     )
 
     # Создаем индексы для полей title и deadline
+    # и составной индекс для выборки изменённых задач проекта
     __table_args__ = (
         Index('ix_tasks_title', 'title'),
+        Index('ix_tasks_project_updated_at', 'project_id', 'updated_at'),
     )
\ No newline at end of file
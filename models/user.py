@@ -1,11 +1,64 @@
 from datetime import datetime
 from typing import Optional, List
 
-from sqlalchemy import  Text, TIMESTAMP, Integer, Boolean, ForeignKey, DateTime, BigInteger, Index, Enum
+from sqlalchemy import  Text, TIMESTAMP, Integer, Boolean, ForeignKey, DateTime, BigInteger, Index, Enum, String
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from models.base import ModelBase, intpk, created_at
 
+# Колонки пользователя для автодополнения (UserRepository.autocomplete); у каждой есть копия <column>_lower
+AUTOCOMPLETE_COLUMNS = ('name', 'email')
+
+# Побайтовое сравнение на Postgres: совпадения по префиксу читаются из индекса диапазоном и уже по порядку
+_LOWER_STRING = String().with_variant(String(collation="C"), "postgresql")
+
+
+def _lowered_default(column: str):
+    """Значение <column>_lower при вставке: str.lower() в Python.
+
+    lower() в SQLite приводит к нижнему регистру только ASCII, а в Postgres зависит от LC_CTYPE
+    базы, поэтому нижний регистр для автодополнения считаем в Python и храним в колонке.
+    """
+    def default(context):
+        value = context.get_current_parameters().get(column)
+        return value.lower() if value is not None else None
+    return default
+
+
+def with_lowered_columns(values: dict) -> dict:
+    """Дополняем значения UPDATE колонками <column>_lower для изменяемых колонок автодополнения."""
+    lowered = {f"{column}_lower": values[column].lower() for column in AUTOCOMPLETE_COLUMNS
+               if values.get(column) is not None}
+    return {**values, **lowered} if lowered else values
+
+
+def autocomplete_trigram_ddl() -> list:
+    """Расширение pg_trgm и GIN-индексы для нечёткого добора автодополнения (только Postgres)."""
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for column in AUTOCOMPLETE_COLUMNS:
+        statements.append(f"CREATE INDEX IF NOT EXISTS ix_users_{column}_trgm "
+                          f"ON users USING GIN ({column}_lower gin_trgm_ops)")
+    return statements
+
+
+def install_autocomplete_trigram(connection):
+    """Отдельный шаг миграции: включаем нечёткий добор автодополнения на Postgres (через run_sync).
+
+    CREATE EXTENSION требует прав владельца базы или суперпользователя, которых у роли
+    приложения обычно нет, поэтому при create_all он не выполняется. Запускайте один раз
+    ролью с нужными правами:
+
+        async with engine.begin() as connection:
+            await connection.run_sync(install_autocomplete_trigram)
+
+    после чего создавайте UserRepository(..., fuzzy_autocomplete=True). Повторный запуск безопасен.
+    """
+    if connection.dialect.name != 'postgresql':
+        raise NotImplementedError("Trigram autocomplete requires PostgreSQL")
+    for statement in autocomplete_trigram_ddl():
+        connection.exec_driver_sql(statement)
+
+
 class User(ModelBase):
     __tablename__ = 'users'
     user_id: Mapped[intpk] = mapped_column(index=True)  # Добавляем индекс на поле user_id
@@ -15,6 +68,9 @@ class User(ModelBase):
     registration_date: Mapped[datetime] = mapped_column(default=datetime.utcnow, index=True)  # Индексируем поле registration_date
     avatar: Mapped[Optional[str]]
     created_at: Mapped[created_at]  # Индексируем поле created_at
+    # name и email в нижнем регистре для автодополнения по префиксу
+    name_lower: Mapped[str] = mapped_column(_LOWER_STRING, default=_lowered_default('name'))
+    email_lower: Mapped[str] = mapped_column(_LOWER_STRING, default=_lowered_default('email'))
 
     projects_owned: Mapped[List["Project"]] = relationship(back_populates="owner")
     role: Mapped["AccessLevel"] = relationship(back_populates="users")
@@ -30,5 +86,9 @@ class User(ModelBase):
     )
 
     # Создаем индексы для полей name и registration_date
+    # и индексы для автодополнения по префиксу имени и email
     __table_args__ = (
-        Index('ix_users_name', 'name'),)
\ No newline at end of file
+        Index('ix_users_name', 'name'),
+        Index('ix_users_name_lower', 'name_lower'),
+        Index('ix_users_email_lower', 'email_lower'),
+    )
\ No newline at end of file
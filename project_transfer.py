@@ -0,0 +1,46 @@
+"""Экспорт и импорт проекта целиком между базами (PostgreSQL, COPY в CSV).
+
+    python project_transfer.py export <project_id> <directory>
+    python project_transfer.py import <directory> [--title TITLE]
+
+Подключение берётся из переменных окружения DB_* (см. config.DatabaseSettings).
+"""
+import argparse
+import asyncio
+
+from engene import DatabaseSessionManager
+from models import init  # noqa: F401  регистрируем все модели
+from repo.transfer import ProjectTransferRepository
+
+
+async def run(args: argparse.Namespace):
+    manager = DatabaseSessionManager.get()
+    try:
+        repo = ProjectTransferRepository(manager.async_session_factory, project_counters=args.project_counters)
+        if args.command == "export":
+            result = await repo.export_project(args.project_id, args.directory)
+        else:
+            result = await repo.import_project(args.directory, title=args.title)
+        print(f"{args.command}: project {result.project_id}")
+        for table, rows in result.rows.items():
+            print(f"  {table}: {rows}")
+    finally:
+        await DatabaseSessionManager.shutdown_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос проекта между базами через COPY")
+    parser.add_argument("--project-counters", action="store_true",
+                        help="после импорта посчитать счётчики проекта (project_counters)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="выгрузить проект в каталог")
+    export.add_argument("project_id", type=int)
+    export.add_argument("directory")
+    load = commands.add_parser("import", help="загрузить проект из каталога как новый")
+    load.add_argument("directory")
+    load.add_argument("--title", help="новое название проекта")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
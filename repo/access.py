@@ -1,167 +1,304 @@
 from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload, selectinload
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple, Union
 
+from engene import after_commit, session_scope
+from instrumentation import instrumented
 from models.access import AccessLevel, AccessSetting, AccessLevelSetting
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
+from repo.reference_cache import ACCESS_LEVELS, ReferenceDataCache
+from repo.permissions import PermissionMatrix
 
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "users",  # Подгружаем пользователей с этим уровнем доступа
+    ),
+}
 
+
+@instrumented
 class AccessLevelRepository:
     """Класс для работы с сущностью AccessLevel."""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, reference_cache: Optional[ReferenceDataCache] = None,
+                 permission_matrix: Optional[PermissionMatrix] = None):
         self.async_session_factory = async_session_factory
+        # Кэш справочников, который нужно сбрасывать при изменении таблицы
+        self.reference_cache = reference_cache
+        # Матрица прав, которую нужно сбрасывать при изменении уровней доступа
+        self.permission_matrix = permission_matrix
+
+    def _invalidate_reference_cache(self):
+        """Сбрасываем снимок уровней доступа в ReferenceDataCache после изменения таблицы."""
+        if self.reference_cache is not None:
+            self.reference_cache.invalidate(ACCESS_LEVELS)
+
+    def _invalidate_permission_matrix(self):
+        """Сбрасываем PermissionMatrix после изменения таблицы."""
+        if self.permission_matrix is not None:
+            self.permission_matrix.invalidate()
 
     async def create_access_level(self, values: dict) -> AccessLevel:
         """Создаём новый AccessLevel."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(AccessLevel).values(**values).returning(AccessLevel)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(AccessLevel).values(**values).returning(AccessLevel)
+            result = await session.execute(stmt)
+            after_commit(session, self._invalidate_reference_cache)
+            after_commit(session, self._invalidate_permission_matrix)
+            return result.scalar_one()
+
+    async def create_many_access_levels(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                        return_ids: bool = False) -> List:
+        """Создаём AccessLevel пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, AccessLevel, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            after_commit(session, self._invalidate_reference_cache)
+            after_commit(session, self._invalidate_permission_matrix)
+            return created
 
     async def get_access_level_by_id(self, access_level_id: int) -> Optional[AccessLevel]:
         """Получаем AccessLevel по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(AccessLevel).filter(AccessLevel.id == access_level_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(AccessLevel).filter(AccessLevel.id == access_level_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_access_levels_by_ids(self, ids: List[int], with_relations: bool = False,
+                                       chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем AccessLevel по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, AccessLevel, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_access_level(self, access_level_id: int, values: dict):
         """Обновляем AccessLevel по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(AccessLevel).where(AccessLevel.id == access_level_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(AccessLevel).where(AccessLevel.id == access_level_id).values(**values)
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_reference_cache)
+            after_commit(session, self._invalidate_permission_matrix)
 
     async def delete_access_level(self, access_level_id: int):
         """Удаляем AccessLevel по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(AccessLevel).where(AccessLevel.id == access_level_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(AccessLevel).where(AccessLevel.id == access_level_id)
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_reference_cache)
+            after_commit(session, self._invalidate_permission_matrix)
 
     async def get_all_access_levels(self) -> List[AccessLevel]:
         """Получаем список всех AccessLevel без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(AccessLevel)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_access_level_with_relations(self, access_level_id: int) -> Optional[AccessLevel]:
-        """Получаем AccessLevel со всеми связями (например, пользователи)."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(AccessLevel)
-                         .filter(AccessLevel.id == access_level_id)
-                         .options(joinedload(AccessLevel.users)))
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(AccessLevel)
+            result = await session.execute(query)
+            return result.scalars().all()
 
+    async def get_access_levels_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                     filters: Optional[dict] = None) -> Page[AccessLevel]:
+        """Получаем страницу AccessLevel с keyset-пагинацией по (id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(AccessLevel), AccessLevel, filters)
+            return await paginate(session, query, (AccessLevel.id,), after=after, limit=limit)
 
+    async def get_access_level_with_relations(self, access_level_id: int,
+                                              include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                              collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[AccessLevel]:
+        """Получаем AccessLevel со всеми связями (например, пользователи).
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(AccessLevel)
+                     .filter(AccessLevel.id == access_level_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            access_level = result.scalars().first()
+            await plan.load_collections(session, [access_level])
+            return access_level
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(AccessLevel, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
+
+
+@instrumented
 class AccessSettingRepository:
     """Класс для работы с сущностью AccessSetting."""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, permission_matrix: Optional[PermissionMatrix] = None):
         self.async_session_factory = async_session_factory
+        # Матрица прав, которую нужно сбрасывать при изменении настроек доступа
+        self.permission_matrix = permission_matrix
+
+    def _invalidate_permission_matrix(self):
+        """Сбрасываем PermissionMatrix после изменения таблицы."""
+        if self.permission_matrix is not None:
+            self.permission_matrix.invalidate()
 
     async def create_access_setting(self, values: dict) -> AccessSetting:
         """Создаём новый AccessSetting."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(AccessSetting).values(**values).returning(AccessSetting)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(AccessSetting).values(**values).returning(AccessSetting)
+            result = await session.execute(stmt)
+            after_commit(session, self._invalidate_permission_matrix)
+            return result.scalar_one()
+
+    async def create_many_access_settings(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                          return_ids: bool = False) -> List:
+        """Создаём AccessSetting пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, AccessSetting, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            after_commit(session, self._invalidate_permission_matrix)
+            return created
 
     async def get_access_setting_by_id(self, access_setting_id: int) -> Optional[AccessSetting]:
         """Получаем AccessSetting по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(AccessSetting).filter(AccessSetting.id == access_setting_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(AccessSetting).filter(AccessSetting.id == access_setting_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_access_settings_by_ids(self, ids: List[int],
+                                         chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем AccessSetting по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            return await fetch_by_ids(session, AccessSetting, ids, chunk_size=chunk_size)
 
     async def update_access_setting(self, access_setting_id: int, values: dict):
         """Обновляем AccessSetting по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(AccessSetting).where(AccessSetting.id == access_setting_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(AccessSetting).where(AccessSetting.id == access_setting_id).values(**values)
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_permission_matrix)
 
     async def delete_access_setting(self, access_setting_id: int):
         """Удаляем AccessSetting по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(AccessSetting).where(AccessSetting.id == access_setting_id)
-                await session.execute(stmt)
-                await session.commit()
-
-    # Это метод в AccessSettingRepository не имеет логического смысла, так как AccessSetting
-    # не имеет прямой связи с AccessLevel. Однако оставим его с комментариями, которые поясняют это.
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(AccessSetting).where(AccessSetting.id == access_setting_id)
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_permission_matrix)
+
+    async def get_access_settings_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                       filters: Optional[dict] = None) -> Page[AccessSetting]:
+        """Получаем страницу AccessSetting с keyset-пагинацией по (id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(AccessSetting), AccessSetting, filters)
+            return await paginate(session, query, (AccessSetting.id,), after=after, limit=limit)
+
     async def get_access_settings_for_access_level(self, access_level_id: int) -> List[AccessSetting]:
-        """Этот метод не реализован, так как AccessSetting не имеет связи с AccessLevel напрямую."""
-        raise NotImplementedError("This method is not applicable for AccessSetting.")
+        """Получаем AccessSetting, разрешённые уровню доступа (через AccessLevelSetting.allowed)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = (select(AccessSetting)
+                     .join(AccessLevelSetting, AccessLevelSetting.access_setting_id == AccessSetting.id)
+                     .filter(AccessLevelSetting.access_level_id == access_level_id,
+                             AccessLevelSetting.allowed.is_(True))
+                     .order_by(AccessSetting.id))
+            result = await session.execute(query)
+            return result.scalars().all()
 
 
+@instrumented
 class AccessLevelSettingRepository:
     """Класс для работы с сущностью AccessLevelSetting."""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, permission_matrix: Optional[PermissionMatrix] = None):
         self.async_session_factory = async_session_factory
+        # Матрица прав, которую нужно сбрасывать при изменении прав уровней доступа
+        self.permission_matrix = permission_matrix
+
+    def _invalidate_permission_matrix(self):
+        """Сбрасываем PermissionMatrix после изменения таблицы."""
+        if self.permission_matrix is not None:
+            self.permission_matrix.invalidate()
 
     async def create_access_level_setting(self, values: dict) -> AccessLevelSetting:
         """Создаём новый AccessLevelSetting."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(AccessLevelSetting).values(**values).returning(AccessLevelSetting)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(AccessLevelSetting).values(**values).returning(AccessLevelSetting)
+            result = await session.execute(stmt)
+            after_commit(session, self._invalidate_permission_matrix)
+            return result.scalar_one()
+
+    async def create_many_access_level_settings(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                                return_ids: bool = False) -> List:
+        """Создаём AccessLevelSetting пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, AccessLevelSetting, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            after_commit(session, self._invalidate_permission_matrix)
+            return created
 
     async def get_access_level_setting_by_id(self, access_level_id: int, access_setting_id: int) -> Optional[
         AccessLevelSetting]:
         """Получаем AccessLevelSetting по составному ключу."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(AccessLevelSetting).filter(
-                    AccessLevelSetting.access_level_id == access_level_id,
-                    AccessLevelSetting.access_setting_id == access_setting_id
-                )
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(AccessLevelSetting).filter(
+                AccessLevelSetting.access_level_id == access_level_id,
+                AccessLevelSetting.access_setting_id == access_setting_id
+            )
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_access_level_settings_by_ids(self, keys: List[Tuple[int, int]],
+                                               chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем AccessLevelSetting по составным ключам (access_level_id, access_setting_id) одним запросом.
+
+        Возвращаем словарь {ключ: объект}; ненайденные ключи — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            return await fetch_by_ids(session, AccessLevelSetting, keys, chunk_size=chunk_size)
 
     async def update_access_level_setting(self, access_level_id: int, access_setting_id: int, values: dict):
         """Обновляем AccessLevelSetting по составному ключу."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(AccessLevelSetting).where(
-                    AccessLevelSetting.access_level_id == access_level_id,
-                    AccessLevelSetting.access_setting_id == access_setting_id
-                ).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(AccessLevelSetting).where(
+                AccessLevelSetting.access_level_id == access_level_id,
+                AccessLevelSetting.access_setting_id == access_setting_id
+            ).values(**values)
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_permission_matrix)
 
     async def delete_access_level_setting(self, access_level_id: int, access_setting_id: int):
         """Удаляем AccessLevelSetting по составному ключу."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(AccessLevelSetting).where(
-                    AccessLevelSetting.access_level_id == access_level_id,
-                    AccessLevelSetting.access_setting_id == access_setting_id
-                )
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(AccessLevelSetting).where(
+                AccessLevelSetting.access_level_id == access_level_id,
+                AccessLevelSetting.access_setting_id == access_setting_id
+            )
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_permission_matrix)
 
     async def get_all_access_level_settings(self) -> List[AccessLevelSetting]:
         """Получаем список всех AccessLevelSetting."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(AccessLevelSetting)
-                result = await session.execute(query)
-                return result.scalars().all()
\ No newline at end of file
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(AccessLevelSetting)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_access_level_settings_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                             filters: Optional[dict] = None) -> Page[AccessLevelSetting]:
+        """Получаем страницу AccessLevelSetting с keyset-пагинацией по (access_level_id, access_setting_id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(AccessLevelSetting), AccessLevelSetting, filters)
+            return await paginate(session, query,
+                                  (AccessLevelSetting.access_level_id, AccessLevelSetting.access_setting_id),
+                                  after=after, limit=limit)
@@ -1,68 +1,133 @@
 from sqlalchemy import select, insert, update, delete
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
+from engene import session_scope
+from instrumentation import instrumented
 from models.assigned import ProjectAssigned, TaskAssigned
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_ignore_many, insert_many
+from repo.counters import refresh_project_assignees
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
 
 
+@instrumented
 class ProjectAssignedRepository:
     """Класс для работы с сущностью ProjectAssigned."""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, project_counters: bool = False):
         self.async_session_factory = async_session_factory
+        # При project_counters=True число участников в project_counters обновляется при записи
+        self.project_counters = project_counters
+
+    async def _refresh_counters(self, session: AsyncSession, project_ids):
+        if self.project_counters:
+            await refresh_project_assignees(session, project_ids)
 
     async def create_project_assigned(self, values: dict) -> ProjectAssigned:
         """Создаём новую запись ProjectAssigned."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(ProjectAssigned).values(**values).returning(ProjectAssigned)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(ProjectAssigned).values(**values).returning(ProjectAssigned)
+            result = await session.execute(stmt)
+            assigned = result.scalar_one()
+            await self._refresh_counters(session, [assigned.project_id])
+            return assigned
+
+    async def create_many_project_assigned(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                           return_ids: bool = False) -> List:
+        """Создаём записи ProjectAssigned пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, ProjectAssigned, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            await self._refresh_counters(session, {values["project_id"] for values in values_list})
+            return created
+
+    async def upsert_many_project_assigned(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Идемпотентно создаём записи ProjectAssigned (ON CONFLICT DO NOTHING); возвращаем число новых строк."""
+        async with session_scope(self.async_session_factory) as session:
+            inserted = await insert_ignore_many(session, ProjectAssigned, values_list, chunk_size=chunk_size)
+            if inserted:
+                await self._refresh_counters(session, {values["project_id"] for values in values_list})
+            return inserted
+
+    async def sync_assignments(self, project_id: int, user_ids: List[int]) -> dict:
+        """Приводим состав участников проекта к user_ids: добавляем недостающих и удаляем лишних.
+
+        Выполняется двумя запросами в одной транзакции (вставка дробится, только если участников больше DEFAULT_CHUNK_SIZE).
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        async with session_scope(self.async_session_factory) as session:
+            inserted = await insert_ignore_many(
+                session, ProjectAssigned,
+                [{"user_id": user_id, "project_id": project_id} for user_id in user_ids],
+                chunk_size=DEFAULT_CHUNK_SIZE)
+            stmt = delete(ProjectAssigned).where(
+                ProjectAssigned.project_id == project_id,
+                ProjectAssigned.user_id.not_in(user_ids)
+            )
+            result = await session.execute(stmt)
+            if inserted or result.rowcount:
+                await self._refresh_counters(session, [project_id])
+            return {"inserted": inserted, "deleted": result.rowcount}
 
     async def get_project_assigned_by_id(self, user_id: int, project_id: int) -> Optional[ProjectAssigned]:
         """Получаем ProjectAssigned по составному ключу user_id и project_id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(ProjectAssigned).filter(
-                    ProjectAssigned.user_id == user_id,
-                    ProjectAssigned.project_id == project_id
-                )
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(ProjectAssigned).filter(
+                ProjectAssigned.user_id == user_id,
+                ProjectAssigned.project_id == project_id
+            )
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_project_assigned_by_ids(self, keys: List[Tuple[int, int]],
+                                          chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем ProjectAssigned по составным ключам (user_id, project_id) одним запросом.
+
+        Возвращаем словарь {ключ: объект}; ненайденные ключи — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            return await fetch_by_ids(session, ProjectAssigned, keys, chunk_size=chunk_size)
 
     async def update_project_assigned(self, user_id: int, project_id: int, values: dict):
         """Обновляем ProjectAssigned по составному ключу user_id и project_id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(ProjectAssigned).where(
-                    ProjectAssigned.user_id == user_id,
-                    ProjectAssigned.project_id == project_id
-                ).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(ProjectAssigned).where(
+                ProjectAssigned.user_id == user_id,
+                ProjectAssigned.project_id == project_id
+            ).values(**values)
+            await session.execute(stmt)
+            await self._refresh_counters(session, {project_id, values.get("project_id", project_id)})
 
     async def delete_project_assigned(self, user_id: int, project_id: int):
         """Удаляем ProjectAssigned по составному ключу user_id и project_id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(ProjectAssigned).where(
-                    ProjectAssigned.user_id == user_id,
-                    ProjectAssigned.project_id == project_id
-                )
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(ProjectAssigned).where(
+                ProjectAssigned.user_id == user_id,
+                ProjectAssigned.project_id == project_id
+            )
+            await session.execute(stmt)
+            await self._refresh_counters(session, [project_id])
 
     async def get_all_project_assigned(self) -> List[ProjectAssigned]:
         """Получаем список всех записей ProjectAssigned без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(ProjectAssigned)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(ProjectAssigned)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_project_assigned_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                        filters: Optional[dict] = None) -> Page[ProjectAssigned]:
+        """Получаем страницу записей ProjectAssigned с keyset-пагинацией по (user_id, project_id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(ProjectAssigned), ProjectAssigned, filters)
+            return await paginate(session, query,
+                                  (ProjectAssigned.user_id, ProjectAssigned.project_id),
+                                  after=after, limit=limit)
+
+
+@instrumented
 class TaskAssignedRepository:
     """Класс для работы с сущностью TaskAssigned."""
 
@@ -71,50 +136,92 @@ class TaskAssignedRepository:
 
     async def create_task_assigned(self, values: dict) -> TaskAssigned:
         """Создаём новую запись TaskAssigned."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(TaskAssigned).values(**values).returning(TaskAssigned)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(TaskAssigned).values(**values).returning(TaskAssigned)
+            result = await session.execute(stmt)
+            return result.scalar_one()
+
+    async def create_many_task_assigned(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                        return_ids: bool = False) -> List:
+        """Создаём записи TaskAssigned пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, TaskAssigned, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            return created
+
+    async def upsert_many_task_assigned(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Идемпотентно создаём записи TaskAssigned (ON CONFLICT DO NOTHING); возвращаем число новых строк."""
+        async with session_scope(self.async_session_factory) as session:
+            inserted = await insert_ignore_many(session, TaskAssigned, values_list, chunk_size=chunk_size)
+            return inserted
+
+    async def sync_assignments(self, task_id: int, user_ids: List[int]) -> dict:
+        """Приводим состав участников задачи к user_ids: добавляем недостающих и удаляем лишних.
+
+        Выполняется двумя запросами в одной транзакции (вставка дробится, только если участников больше DEFAULT_CHUNK_SIZE).
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        async with session_scope(self.async_session_factory) as session:
+            inserted = await insert_ignore_many(
+                session, TaskAssigned,
+                [{"user_id": user_id, "task_id": task_id} for user_id in user_ids],
+                chunk_size=DEFAULT_CHUNK_SIZE)
+            stmt = delete(TaskAssigned).where(
+                TaskAssigned.task_id == task_id,
+                TaskAssigned.user_id.not_in(user_ids)
+            )
+            result = await session.execute(stmt)
+            return {"inserted": inserted, "deleted": result.rowcount}
 
     async def get_task_assigned_by_id(self, user_id: int, task_id: int) -> Optional[TaskAssigned]:
         """Получаем TaskAssigned по составному ключу user_id и task_id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(TaskAssigned).filter(
-                    TaskAssigned.user_id == user_id,
-                    TaskAssigned.task_id == task_id
-                )
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(TaskAssigned).filter(
+                TaskAssigned.user_id == user_id,
+                TaskAssigned.task_id == task_id
+            )
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_task_assigned_by_ids(self, keys: List[Tuple[int, int]],
+                                       chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем TaskAssigned по составным ключам (user_id, task_id) одним запросом.
+
+        Возвращаем словарь {ключ: объект}; ненайденные ключи — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            return await fetch_by_ids(session, TaskAssigned, keys, chunk_size=chunk_size)
 
     async def update_task_assigned(self, user_id: int, task_id: int, values: dict):
         """Обновляем TaskAssigned по составному ключу user_id и task_id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(TaskAssigned).where(
-                    TaskAssigned.user_id == user_id,
-                    TaskAssigned.task_id == task_id
-                ).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(TaskAssigned).where(
+                TaskAssigned.user_id == user_id,
+                TaskAssigned.task_id == task_id
+            ).values(**values)
+            await session.execute(stmt)
 
     async def delete_task_assigned(self, user_id: int, task_id: int):
         """Удаляем TaskAssigned по составному ключу user_id и task_id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(TaskAssigned).where(
-                    TaskAssigned.user_id == user_id,
-                    TaskAssigned.task_id == task_id
-                )
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(TaskAssigned).where(
+                TaskAssigned.user_id == user_id,
+                TaskAssigned.task_id == task_id
+            )
+            await session.execute(stmt)
 
     async def get_all_task_assigned(self) -> List[TaskAssigned]:
         """Получаем список всех записей TaskAssigned без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(TaskAssigned)
-                result = await session.execute(query)
-                return result.scalars().all()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(TaskAssigned)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_task_assigned_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                     filters: Optional[dict] = None) -> Page[TaskAssigned]:
+        """Получаем страницу записей TaskAssigned с keyset-пагинацией по (user_id, task_id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(TaskAssigned), TaskAssigned, filters)
+            return await paginate(session, query,
+                                  (TaskAssigned.user_id, TaskAssigned.task_id),
+                                  after=after, limit=limit)
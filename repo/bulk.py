@@ -0,0 +1,69 @@
+from typing import Iterator, List, Sequence
+
+from sqlalchemy import inspect, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def chunked(items: Sequence, size: int) -> Iterator[Sequence]:
+    """Разбиваем последовательность на куски не длиннее size."""
+    if size < 1:
+        raise ValueError("chunk size must be positive")
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def primary_key_attributes(model) -> List:
+    """Возвращаем атрибуты модели, входящие в первичный ключ."""
+    mapper = inspect(model)
+    return [getattr(model, mapper.get_property_by_column(column).key) for column in mapper.primary_key]
+
+
+async def insert_many(session: AsyncSession, model, values_list: Sequence[dict],
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, return_ids: bool = False) -> List:
+    """Вставляем строки пачками (insertmanyvalues) в текущей транзакции сессии.
+
+    Возвращаем созданные объекты в порядке values_list, либо только их первичные ключи
+    (для составного ключа — кортежи).
+    """
+    if not values_list:
+        return []
+    pk = primary_key_attributes(model)
+    returning = pk if return_ids else [model]
+    stmt = insert(model).returning(*returning, sort_by_parameter_order=True)
+
+    created = []
+    for chunk in chunked(values_list, chunk_size):
+        result = await session.execute(stmt, list(chunk))
+        if return_ids and len(pk) > 1:
+            created.extend(tuple(row) for row in result.all())
+        else:
+            created.extend(result.scalars().all())
+    return created
+
+
+def dialect_insert(session: AsyncSession, model):
+    """Возвращаем insert() диалекта текущего подключения (нужен для ON CONFLICT)."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_specific_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_specific_insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT is not supported for dialect {dialect!r}")
+    return dialect_specific_insert(model)
+
+
+async def insert_ignore_many(session: AsyncSession, model, values_list: Sequence[dict],
+                             chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Вставляем строки многострочным INSERT ... ON CONFLICT DO NOTHING.
+
+    Строки, конфликтующие по первичному ключу, пропускаются. Возвращаем число вставленных строк.
+    """
+    inserted = 0
+    for chunk in chunked(values_list, chunk_size):
+        stmt = dialect_insert(session, model).values(list(chunk)).on_conflict_do_nothing()
+        result = await session.execute(stmt)
+        inserted += result.rowcount
+    return inserted
@@ -1,11 +1,85 @@
-from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload, selectinload
-from typing import List, Optional
+from sqlalchemy import select, insert, update, delete, or_, tuple_, union
+from sqlalchemy.orm import aliased
+from typing import Iterable, List, Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from engene import session_scope
+from instrumentation import instrumented
+from models.assigned import ProjectAssigned, TaskAssigned
 from models.chat import Chat
+from models.message import Message
+from models.project import Project
+from models.task import Task
+from repo.bulk import DEFAULT_CHUNK_SIZE, chunked, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
 
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "project",  # Подгружаем проект чата
+        "task",  # Подгружаем задачу чата
+        "messages",  # Подгружаем сообщения чата
+    ),
+}
 
+
+def user_chats_condition(user_id: int):
+    """Условие «чат доступен пользователю»: чаты его проектов и задач (владелец, исполнитель, назначенный)."""
+    return or_(
+        Chat.project_id.in_(select(Project.project_id).filter(Project.owner_id == user_id)),
+        Chat.project_id.in_(select(ProjectAssigned.project_id).filter(ProjectAssigned.user_id == user_id)),
+        Chat.task_id.in_(select(Task.task_id).filter(Task.executor_id == user_id)),
+        Chat.task_id.in_(select(TaskAssigned.task_id).filter(TaskAssigned.user_id == user_id)),
+    )
+
+
+def chat_members(chat_id: int):
+    """Запрос user_id всех участников чата — обратная сторона user_chats_condition."""
+    project_id = select(Chat.project_id).filter(Chat.chat_id == chat_id).scalar_subquery()
+    task_id = select(Chat.task_id).filter(Chat.chat_id == chat_id).scalar_subquery()
+    return union(
+        select(Project.owner_id.label("user_id")).filter(Project.project_id == project_id),
+        select(ProjectAssigned.user_id).filter(ProjectAssigned.project_id == project_id),
+        select(Task.executor_id).filter(Task.task_id == task_id),
+        select(TaskAssigned.user_id).filter(TaskAssigned.task_id == task_id),
+    )
+
+
+async def touch_chat_last_message(session: AsyncSession, message: Message):
+    """Делаем message последним сообщением его чата, если оно новее текущего последнего."""
+    stmt = (update(Chat)
+            .where(Chat.chat_id == message.chat_id,
+                   or_(Chat.last_message_at.is_(None),
+                       tuple_(Chat.last_message_at, Chat.last_message_id)
+                       < tuple_(message.sent_at, message.message_id)))
+            .values(last_message_id=message.message_id, last_message_at=message.sent_at)
+            .execution_options(synchronize_session=False))
+    await session.execute(stmt)
+
+
+async def refresh_chats_last_message(session: AsyncSession, chat_ids: Iterable[int]):
+    """Пересчитываем последнее сообщение чатов одним UPDATE на кусок chat_id.
+
+    Коррелированный подзапрос берёт одну строку из индекса ix_messages_chat_sent_at_id,
+    поэтому стоимость не зависит от числа сообщений в чате.
+    """
+    latest = (select(Message.message_id)
+              .where(Message.chat_id == Chat.chat_id)
+              .order_by(Message.sent_at.desc(), Message.message_id.desc())
+              .limit(1)
+              .correlate(Chat))
+    for chunk in chunked(sorted(set(chat_ids)), DEFAULT_LOOKUP_CHUNK_SIZE):
+        stmt = (update(Chat)
+                .where(Chat.chat_id.in_(chunk))
+                .values(last_message_id=latest.scalar_subquery(),
+                        last_message_at=latest.with_only_columns(Message.sent_at).scalar_subquery())
+                .execution_options(synchronize_session=False))
+        await session.execute(stmt)
+
+
+@instrumented
 class ChatRepository:
     """Класс для работы с сущностью Chat, включающий методы для получения данных с и без связей"""
 
@@ -14,55 +88,108 @@ class ChatRepository:
 
     async def create_chat(self, values: dict) -> Chat:
         """Создаём новый Chat."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(Chat).values(**values).returning(Chat)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(Chat).values(**values).returning(Chat)
+            result = await session.execute(stmt)
+            return result.scalar_one()
+
+    async def create_many_chats(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                return_ids: bool = False) -> List:
+        """Создаём чаты пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, Chat, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            return created
 
     async def get_chat_by_id(self, chat_id: int) -> Optional[Chat]:
         """Получаем Chat по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Chat).filter(Chat.chat_id == chat_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Chat).filter(Chat.chat_id == chat_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_chats_by_ids(self, ids: List[int], with_relations: bool = False,
+                               chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем чаты по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, Chat, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_chat(self, chat_id: int, values: dict):
         """Обновляем Chat по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(Chat).where(Chat.chat_id == chat_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(Chat).where(Chat.chat_id == chat_id).values(**values)
+            await session.execute(stmt)
 
     async def delete_chat(self, chat_id: int):
         """Удаляем Chat по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(Chat).where(Chat.chat_id == chat_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(Chat).where(Chat.chat_id == chat_id)
+            await session.execute(stmt)
 
     async def get_all_chats(self) -> List[Chat]:
         """Получаем список всех чатов без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Chat)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_chat_with_relations(self, chat_id: int) -> Optional[Chat]:
-        """Получаем Chat со всеми связями, включая проект, задачу и сообщения."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(Chat)
-                .filter(Chat.chat_id == chat_id)
-                .options(
-                    joinedload(Chat.project),  # Подгружаем проект чата
-                    joinedload(Chat.task),  # Подгружаем задачу чата
-                    selectinload(Chat.messages)  # Подгружаем сообщения чата
-                ))
-                result = await session.execute(query)
-                return result.scalars().first()
\ No newline at end of file
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Chat)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_chats_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                             filters: Optional[dict] = None) -> Page[Chat]:
+        """Получаем страницу чатов с keyset-пагинацией по (chat_id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(Chat), Chat, filters)
+            return await paginate(session, query, (Chat.chat_id,), after=after, limit=limit)
+
+    async def list_chats_for_user(self, user_id: int, cursor: Optional[str] = None,
+                                  limit: int = DEFAULT_PAGE_LIMIT) -> Page:
+        """Получаем чаты пользователя, начиная с самых активных, с превью последнего сообщения.
+
+        Пользователь видит чаты проектов, которыми владеет или в которые назначен, и чаты задач,
+        где он исполнитель или назначен. Чаты без сообщений в список не попадают.
+        Элементы страницы — строки (Chat, last_message); пагинация по (last_message_at, chat_id)
+        идёт по индексу ix_chats_last_message_at.
+        """
+        last_message = aliased(Message, name="last_message")
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = (select(Chat, last_message)
+                     .outerjoin(last_message, last_message.message_id == Chat.last_message_id)
+                     .filter(Chat.last_message_at.is_not(None), user_chats_condition(user_id)))
+            return await paginate(session, query, (Chat.last_message_at, Chat.chat_id), after=cursor,
+                                  limit=limit, descending=True, scalars=False)
+
+    async def refresh_last_messages(self, chat_ids: List[int]):
+        """Пересчитываем last_message_id/last_message_at чатов (например, для уже существующих данных)."""
+        async with session_scope(self.async_session_factory) as session:
+            await refresh_chats_last_message(session, chat_ids)
+
+    async def get_chat_with_relations(self, chat_id: int,
+                                      include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                      collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[Chat]:
+        """Получаем Chat со всеми связями, включая проект, задачу и сообщения.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(Chat)
+                     .filter(Chat.chat_id == chat_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            chat = result.scalars().first()
+            await plan.load_collections(session, [chat])
+            return chat
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(Chat, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
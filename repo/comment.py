@@ -1,12 +1,27 @@
 from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload
-from typing import List, Optional
+from typing import Iterable, List, Optional, Union
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from engene import session_scope
+from instrumentation import instrumented
 from models.comment import Comment
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
 
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "user",  # Подгружаем пользователя комментария
+        "project",  # Подгружаем проект комментария
+        "task",  # Подгружаем задачу комментария
+    ),
+}
 
+
+@instrumented
 class CommentRepository:
     """Класс для работы с сущностью Comment, включающий методы для получения данных с и без связей"""
 
@@ -15,55 +30,86 @@ class CommentRepository:
 
     async def create_comment(self, values: dict) -> Comment:
         """Создаём новый Comment."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(Comment).values(**values).returning(Comment)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(Comment).values(**values).returning(Comment)
+            result = await session.execute(stmt)
+            return result.scalar_one()
+
+    async def create_many_comments(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                   return_ids: bool = False) -> List:
+        """Создаём комментарии пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, Comment, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            return created
 
     async def get_comment_by_id(self, comment_id: int) -> Optional[Comment]:
         """Получаем Comment по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Comment).filter(Comment.comment_id == comment_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Comment).filter(Comment.comment_id == comment_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_comments_by_ids(self, ids: List[int], with_relations: bool = False,
+                                  chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем комментарии по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, Comment, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_comment(self, comment_id: int, values: dict):
         """Обновляем Comment по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(Comment).where(Comment.comment_id == comment_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(Comment).where(Comment.comment_id == comment_id).values(**values)
+            await session.execute(stmt)
 
     async def delete_comment(self, comment_id: int):
         """Удаляем Comment по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(Comment).where(Comment.comment_id == comment_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(Comment).where(Comment.comment_id == comment_id)
+            await session.execute(stmt)
 
     async def get_all_comments(self) -> List[Comment]:
         """Получаем список всех комментариев без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Comment)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_comment_with_relations(self, comment_id: int) -> Optional[Comment]:
-        """Получаем Comment со всеми связями, включая пользователя, проект и задачу."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(Comment)
-                .filter(Comment.comment_id == comment_id)
-                .options(
-                    joinedload(Comment.user),  # Подгружаем пользователя комментария
-                    joinedload(Comment.project),  # Подгружаем проект комментария
-                    joinedload(Comment.task)  # Подгружаем задачу комментария
-                ))
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Comment)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_comments_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                filters: Optional[dict] = None) -> Page[Comment]:
+        """Получаем страницу комментариев с keyset-пагинацией по (comment_id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(Comment), Comment, filters)
+            return await paginate(session, query, (Comment.comment_id,), after=after, limit=limit)
+
+    async def get_comment_with_relations(self, comment_id: int,
+                                         include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                         collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[Comment]:
+        """Получаем Comment со всеми связями, включая пользователя, проект и задачу.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(Comment)
+                     .filter(Comment.comment_id == comment_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            comment = result.scalars().first()
+            await plan.load_collections(session, [comment])
+            return comment
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(Comment, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
@@ -0,0 +1,265 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, literal, null, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from engene import session_scope
+from instrumentation import instrumented
+from models.assigned import ProjectAssigned
+from models.project import Project
+from models.project_counters import ProjectCounter, ProjectStatusCounter
+from models.task import Task
+from repo.bulk import DEFAULT_CHUNK_SIZE, chunked, dialect_insert
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE
+
+DEFAULT_RECONCILE_BATCH_SIZE = 500
+
+# Состояние задачи, влияющее на счётчики при записи: (project_id, status_id)
+TaskCounterKey = Tuple[int, int]
+
+
+@dataclass
+class ProjectCounters:
+    """Счётчики проекта для дашборда; by_status — {status_id: число задач}."""
+    project_id: int
+    total_tasks: int = 0
+    overdue_tasks: int = 0
+    assignees: int = 0
+    by_status: Dict[int, int] = field(default_factory=dict)
+
+
+def task_counter_key(task) -> TaskCounterKey:
+    """Берём из задачи (ORM-объекта или строки) поля, влияющие на счётчики."""
+    return task.project_id, task.status_id
+
+
+async def recount_project_counters(session: AsyncSession, project_ids: Iterable[int],
+                                   now: Optional[datetime] = None) -> Dict[int, ProjectCounters]:
+    """Считаем счётчики проектов с нуля одним запросом на кусок project_id."""
+    now = now or datetime.utcnow()
+    project_ids = list(dict.fromkeys(project_ids))
+    counters = {project_id: ProjectCounters(project_id) for project_id in project_ids}
+    for chunk in chunked(project_ids, DEFAULT_LOOKUP_CHUNK_SIZE):
+        query = union_all(
+            select(literal("status"), Task.project_id, Task.status_id, func.count())
+            .filter(Task.project_id.in_(chunk))
+            .group_by(Task.project_id, Task.status_id),
+            select(literal("overdue"), Task.project_id, null(), func.count())
+            .filter(Task.project_id.in_(chunk), Task.deadline < now)
+            .group_by(Task.project_id),
+            select(literal("assignees"), ProjectAssigned.project_id, null(), func.count())
+            .filter(ProjectAssigned.project_id.in_(chunk))
+            .group_by(ProjectAssigned.project_id),
+        )
+        for kind, project_id, status_id, count in (await session.execute(query)).all():
+            project_counters = counters[project_id]
+            if kind == "status":
+                project_counters.by_status[status_id] = count
+                project_counters.total_tasks += count
+            elif kind == "overdue":
+                project_counters.overdue_tasks = count
+            else:
+                project_counters.assignees = count
+    return counters
+
+
+async def store_project_counters(session: AsyncSession, counters: Iterable[ProjectCounters],
+                                 overwrite: bool = True) -> int:
+    """Перезаписываем счётчики проектов целиком (строки по статусам заменяются); возвращаем число проектов.
+
+    При overwrite=False записываем только проекты, у которых счётчиков ещё нет: строку,
+    которую успела создать параллельная транзакция, не трогаем (ON CONFLICT DO NOTHING).
+    """
+    counters = list(counters)
+    written = 0
+    for chunk in chunked(counters, DEFAULT_CHUNK_SIZE):
+        stmt = dialect_insert(session, ProjectCounter).values([{
+            "project_id": item.project_id,
+            "total_tasks": item.total_tasks,
+            "overdue_tasks": item.overdue_tasks,
+            "assignees": item.assignees,
+        } for item in chunk])
+        if overwrite:
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[ProjectCounter.project_id],
+                set_={name: stmt.excluded[name] for name in ("total_tasks", "overdue_tasks", "assignees")},
+            ))
+        else:
+            inserted = set((await session.execute(
+                stmt.on_conflict_do_nothing(index_elements=[ProjectCounter.project_id])
+                .returning(ProjectCounter.project_id)
+            )).scalars().all())
+            chunk = [item for item in chunk if item.project_id in inserted]
+            if not chunk:
+                continue
+        written += len(chunk)
+        await session.execute(delete(ProjectStatusCounter)
+                              .where(ProjectStatusCounter.project_id.in_([item.project_id for item in chunk]))
+                              .execution_options(synchronize_session=False))
+        rows = [{"project_id": item.project_id, "status_id": status_id, "task_count": count}
+                for item in chunk for status_id, count in item.by_status.items()]
+        for rows_chunk in chunked(rows, DEFAULT_CHUNK_SIZE):
+            await session.execute(dialect_insert(session, ProjectStatusCounter).values(list(rows_chunk)))
+    return written
+
+
+async def _lock_counters(session: AsyncSession, project_ids: Iterable[int], now: datetime,
+                         totals: Optional[Counter] = None, by_status: Optional[Counter] = None) -> List[int]:
+    """Создаём недостающие счётчики проектов и блокируем строки счётчиков до конца транзакции.
+
+    Пересчёт уже видит записи текущей транзакции, поэтому новая строка получает его за вычетом
+    их дельты (totals, by_status): сама дельта затем применяется ко всем проектам одинаково.
+    Строку, которую успела создать параллельная транзакция, не перезаписываем (ON CONFLICT
+    DO NOTHING) — после её коммита наша дельта ложится поверх её значения.
+    """
+    totals = totals or Counter()
+    by_status = by_status or Counter()
+    # Один порядок блокировок во всех транзакциях, чтобы не получить взаимную блокировку
+    project_ids = sorted(set(project_ids))
+    existing = set()
+    for chunk in chunked(project_ids, DEFAULT_LOOKUP_CHUNK_SIZE):
+        result = await session.execute(
+            select(ProjectCounter.project_id).filter(ProjectCounter.project_id.in_(chunk))
+        )
+        existing.update(result.scalars().all())
+    missing = [project_id for project_id in project_ids if project_id not in existing]
+    if missing:
+        baseline = await recount_project_counters(session, missing, now)
+        for (project_id, status_id), delta in by_status.items():
+            if project_id in baseline:
+                item = baseline[project_id]
+                item.by_status[status_id] = item.by_status.get(status_id, 0) - delta
+        for item in baseline.values():
+            item.total_tasks -= totals[item.project_id]
+            item.by_status = {status_id: count for status_id, count in item.by_status.items() if count}
+        await store_project_counters(session, baseline.values(), overwrite=False)
+    for chunk in chunked(project_ids, DEFAULT_LOOKUP_CHUNK_SIZE):
+        await session.execute(select(ProjectCounter.project_id)
+                              .filter(ProjectCounter.project_id.in_(chunk))
+                              .order_by(ProjectCounter.project_id)
+                              .with_for_update())
+    return project_ids
+
+
+async def apply_task_changes(session: AsyncSession, removed: Iterable[TaskCounterKey] = (),
+                             added: Iterable[TaskCounterKey] = (), now: Optional[datetime] = None):
+    """Применяем к счётчикам изменения задач в текущей транзакции (вызывается после записи).
+
+    removed — состояния задач до изменения (удалённые или старые версии), added — после.
+    overdue_tasks здесь не меняется: просрочка зависит от времени, а не от записи, и дельта
+    по сроку на момент записи расходилась бы с данными (задача, созданная с будущим сроком и
+    удалённая после него, уменьшала бы счётчик, который её никогда не учитывал).
+    """
+    now = now or datetime.utcnow()
+    totals, by_status = Counter(), Counter()
+    for sign, keys in ((-1, removed), (1, added)):
+        for project_id, status_id in keys:
+            totals[project_id] += sign
+            by_status[(project_id, status_id)] += sign
+
+    for project_id in await _lock_counters(session, totals, now, totals, by_status):
+        if totals[project_id]:
+            await session.execute(
+                update(ProjectCounter)
+                .where(ProjectCounter.project_id == project_id)
+                .values(total_tasks=ProjectCounter.total_tasks + totals[project_id])
+                .execution_options(synchronize_session=False)
+            )
+    rows = [{"project_id": project_id, "status_id": status_id, "task_count": delta}
+            for (project_id, status_id), delta in by_status.items() if delta]
+    for chunk in chunked(rows, DEFAULT_CHUNK_SIZE):
+        stmt = dialect_insert(session, ProjectStatusCounter).values(list(chunk))
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[ProjectStatusCounter.project_id, ProjectStatusCounter.status_id],
+            set_={"task_count": ProjectStatusCounter.task_count + stmt.excluded.task_count},
+        ))
+
+
+async def refresh_project_assignees(session: AsyncSession, project_ids: Iterable[int]):
+    """Пересчитываем число участников проектов после изменения project_assigned (по индексу project_id)."""
+    project_ids = await _lock_counters(session, project_ids, datetime.utcnow())
+    for chunk in chunked(project_ids, DEFAULT_LOOKUP_CHUNK_SIZE):
+        assignees = (select(func.count())
+                     .select_from(ProjectAssigned)
+                     .where(ProjectAssigned.project_id == ProjectCounter.project_id)
+                     .correlate(ProjectCounter)
+                     .scalar_subquery())
+        await session.execute(update(ProjectCounter)
+                              .where(ProjectCounter.project_id.in_(chunk))
+                              .values(assignees=assignees)
+                              .execution_options(synchronize_session=False))
+
+
+@instrumented
+class ProjectCounterRepository:
+    """Чтение и сверка счётчиков проектов (project_counters, project_status_counters).
+
+    Счётчики обновляются в транзакции записи репозиториями TaskRepository и
+    ProjectAssignedRepository, созданными с project_counters=True. Просрочка зависит от
+    времени, поэтому overdue_tasks записывает только пересчёт (сверка reconcile() или создание
+    счётчиков проекта) и значение может отставать на один интервал сверки.
+    """
+
+    def __init__(self, async_session_factory):
+        self.async_session_factory = async_session_factory
+
+    @staticmethod
+    async def _load(session: AsyncSession, project_ids: List[int],
+                    for_update: bool = False) -> Dict[int, ProjectCounters]:
+        counters = {}
+        for chunk in chunked(project_ids, DEFAULT_LOOKUP_CHUNK_SIZE):
+            query = (select(ProjectCounter, ProjectStatusCounter.status_id, ProjectStatusCounter.task_count)
+                     .outerjoin(ProjectStatusCounter, ProjectStatusCounter.project_id == ProjectCounter.project_id)
+                     .filter(ProjectCounter.project_id.in_(chunk)))
+            if for_update:
+                query = query.with_for_update(of=ProjectCounter)
+            for row, status_id, task_count in (await session.execute(query)).all():
+                item = counters.setdefault(row.project_id, ProjectCounters(
+                    row.project_id, row.total_tasks, row.overdue_tasks, row.assignees))
+                if status_id is not None and task_count:
+                    item.by_status[status_id] = task_count
+        return counters
+
+    async def get_project_counters(self, project_id: int) -> Optional[ProjectCounters]:
+        """Получаем счётчики проекта одним запросом по первичному ключу; None, если их ещё нет."""
+        return (await self.get_projects_counters([project_id])).get(project_id)
+
+    async def get_projects_counters(self, project_ids: Iterable[int]) -> Dict[int, ProjectCounters]:
+        """Получаем счётчики нескольких проектов; проекты без счётчиков в результат не попадают."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            return await self._load(session, list(dict.fromkeys(project_ids)))
+
+    async def reconcile(self, batch_size: int = DEFAULT_RECONCILE_BATCH_SIZE,
+                        now: Optional[datetime] = None) -> int:
+        """Сверяем счётчики всех проектов с данными порциями по batch_size; возвращаем число исправленных.
+
+        Каждая порция пересчитывается и записывается в своей сессии и транзакции, даже внутри
+        UnitOfWork, поэтому сверка не держит долгих блокировок и может быть прервана в любой
+        момент. Строки счётчиков порции блокируются до пересчёта: параллельная запись задач
+        применит свою дельту уже поверх исправленного значения. Отсутствующие счётчики
+        вставляются только если их не создала параллельная транзакция.
+        """
+        now = now or datetime.utcnow()
+        fixed = 0
+        last_id = None
+        while True:
+            async with self.async_session_factory() as session, session.begin():
+                query = select(Project.project_id).order_by(Project.project_id).limit(batch_size)
+                if last_id is not None:
+                    query = query.filter(Project.project_id > last_id)
+                project_ids = list((await session.execute(query)).scalars().all())
+                if not project_ids:
+                    return fixed
+                last_id = project_ids[-1]
+                stored = await self._load(session, project_ids, for_update=True)
+                fresh = await recount_project_counters(session, project_ids, now)
+                drifted = [item for project_id, item in fresh.items()
+                           if project_id in stored and stored[project_id] != item]
+                missing = [item for project_id, item in fresh.items() if project_id not in stored]
+                if drifted:
+                    fixed += await store_project_counters(session, drifted)
+                if missing:
+                    fixed += await store_project_counters(session, missing, overwrite=False)
@@ -0,0 +1,175 @@
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from engene import session_scope
+from instrumentation import instrumented
+from models.assigned import TaskAssigned
+from models.job_state import JobState
+from models.notification import Notification
+from models.task import Task
+from repo.bulk import DEFAULT_CHUNK_SIZE, chunked, dialect_insert
+from repo.read_state import bump_notification_unread
+
+DUE_SOON = "due_soon"
+OVERDUE = "overdue"
+
+DEFAULT_DUE_SOON_WINDOW = timedelta(hours=24)
+# Насколько назад смотреть при самом первом проходе overdue, когда границы окна ещё нет
+DEFAULT_INITIAL_LOOKBACK = timedelta(hours=24)
+DEFAULT_SWEEP_BATCH_SIZE = 1000
+
+MESSAGES = {
+    DUE_SOON: "Task \"{title}\" is due {deadline:%Y-%m-%d %H:%M}",
+    OVERDUE: "Task \"{title}\" is overdue since {deadline:%Y-%m-%d %H:%M}",
+}
+
+
+@dataclass
+class SweepResult:
+    """Итог прохода: сколько задач просмотрено и сколько уведомлений создано (дубликаты не считаются)."""
+    kind: str
+    tasks: int = 0
+    notifications: int = 0
+
+
+def deadline_dedup_key(kind: str, task_id: int, user_id: int, deadline: datetime) -> str:
+    """Ключ идемпотентности напоминания: при переносе срока задачи напоминание придёт снова."""
+    return f"deadline:{kind}:{task_id}:{user_id}:{deadline.isoformat()}"
+
+
+async def _get_watermark(session: AsyncSession, name: str) -> Optional[JobState]:
+    return (await session.execute(select(JobState).filter(JobState.name == name))).scalars().first()
+
+
+async def _set_watermark(session: AsyncSession, name: str, watermark: datetime, watermark_id: Optional[int]):
+    stmt = dialect_insert(session, JobState).values(name=name, watermark=watermark, watermark_id=watermark_id,
+                                                     updated_at=datetime.utcnow())
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[JobState.name],
+        set_={column: stmt.excluded[column] for column in ("watermark", "watermark_id", "updated_at")},
+    ))
+
+
+async def _recipients(session: AsyncSession, tasks: List) -> Dict[int, List[int]]:
+    """Получаем получателей напоминаний: исполнителя и назначенных пользователей каждой задачи."""
+    recipients = {task.task_id: [task.executor_id] for task in tasks}
+    query = (select(TaskAssigned.task_id, TaskAssigned.user_id)
+             .filter(TaskAssigned.task_id.in_(list(recipients))))
+    for task_id, user_id in (await session.execute(query)).all():
+        if user_id not in recipients[task_id]:
+            recipients[task_id].append(user_id)
+    return recipients
+
+
+@instrumented
+class DeadlineSweeper:
+    """Напоминания о сроках задач: «срок через 24 часа» (due_soon) и «задача просрочена» (overdue).
+
+    Окно дедлайнов читается по индексу tasks.deadline диапазоном порциями по batch_size;
+    повторная вставка напоминания отбрасывается уникальным Notification.dedup_key.
+
+    due_soon каждый раз проходит всё окно (now, now + due_soon_window]: задача, созданная или
+    перенесённая в него после прошлого прохода, тоже получит напоминание. overdue обрабатывает
+    окно от сохранённой в job_state границы до now; порция вставляется одной транзакцией вместе
+    со сдвигом границы, поэтому прерванный проход продолжается с места остановки.
+    """
+
+    def __init__(self, async_session_factory, due_soon_window: timedelta = DEFAULT_DUE_SOON_WINDOW,
+                 done_status_ids: Iterable[int] = (), batch_size: int = DEFAULT_SWEEP_BATCH_SIZE,
+                 initial_lookback: timedelta = DEFAULT_INITIAL_LOOKBACK, unread_counters: bool = False):
+        self.async_session_factory = async_session_factory
+        self.due_soon_window = due_soon_window
+        # Задачи в этих статусах считаются выполненными и напоминаний не получают
+        self.done_status_ids = list(done_status_ids)
+        self.batch_size = batch_size
+        self.initial_lookback = initial_lookback
+        # При unread_counters=True обновляем счётчики непрочитанных, как NotificationRepository
+        self.unread_counters = unread_counters
+
+    def _window_end(self, kind: str, now: datetime) -> datetime:
+        return now + self.due_soon_window if kind == DUE_SOON else now
+
+    def _batch_query(self, watermark: datetime, watermark_id: Optional[int], window_end: datetime):
+        query = (select(Task.task_id, Task.title, Task.deadline, Task.executor_id)
+                 # Условие только по deadline задаёт диапазон индекса, кортеж — точку продолжения
+                 .filter(Task.deadline >= watermark, Task.deadline <= window_end)
+                 .order_by(Task.deadline, Task.task_id)
+                 .limit(self.batch_size))
+        if watermark_id is None:
+            query = query.filter(Task.deadline > watermark)
+        else:
+            query = query.filter(tuple_(Task.deadline, Task.task_id) > tuple_(watermark, watermark_id))
+        if self.done_status_ids:
+            query = query.filter(Task.status_id.not_in(self.done_status_ids))
+        return query
+
+    async def _insert_notifications(self, session: AsyncSession, kind: str, tasks: List, now: datetime) -> int:
+        recipients = await _recipients(session, tasks)
+        values_list = [{
+            "content": MESSAGES[kind].format(title=task.title, deadline=task.deadline),
+            "user_id": user_id,
+            "sent_at": now,
+            "dedup_key": deadline_dedup_key(kind, task.task_id, user_id, task.deadline),
+        } for task in tasks for user_id in recipients[task.task_id]]
+        notified = Counter()
+        for chunk in chunked(values_list, DEFAULT_CHUNK_SIZE):
+            stmt = (dialect_insert(session, Notification).values(list(chunk))
+                    .on_conflict_do_nothing(index_elements=[Notification.dedup_key])
+                    .returning(Notification.user_id))
+            notified.update((await session.execute(stmt)).scalars().all())
+        if self.unread_counters and notified:
+            await bump_notification_unread(session, notified)
+        return sum(notified.values())
+
+    async def _sweep_window(self, kind: str, now: datetime, window_end: datetime) -> SweepResult:
+        """Проходим окно (now, window_end] целиком, без сохранённой границы."""
+        result = SweepResult(kind)
+        watermark, watermark_id = now, None
+        while True:
+            async with session_scope(self.async_session_factory) as session:
+                tasks = (await session.execute(self._batch_query(watermark, watermark_id, window_end))).all()
+                if tasks:
+                    result.tasks += len(tasks)
+                    result.notifications += await self._insert_notifications(session, kind, tasks, now)
+            if len(tasks) < self.batch_size:
+                return result
+            watermark, watermark_id = tasks[-1].deadline, tasks[-1].task_id
+
+    async def sweep(self, kind: str, now: Optional[datetime] = None) -> SweepResult:
+        """Обрабатываем окно дедлайнов одного вида (DUE_SOON или OVERDUE)."""
+        if kind not in MESSAGES:
+            raise ValueError(f"Unknown deadline sweep kind: {kind!r}")
+        now = now or datetime.utcnow()
+        name = f"deadline_sweep:{kind}"
+        window_end = self._window_end(kind, now)
+        if kind == DUE_SOON:
+            return await self._sweep_window(kind, now, window_end)
+        result = SweepResult(kind)
+        while True:
+            async with session_scope(self.async_session_factory) as session:
+                state = await _get_watermark(session, name)
+                if state is None or state.watermark is None:
+                    watermark, watermark_id = self._window_end(kind, now - self.initial_lookback), None
+                else:
+                    watermark, watermark_id = state.watermark, state.watermark_id
+                if watermark >= window_end and watermark_id is None:
+                    return result
+                tasks = (await session.execute(self._batch_query(watermark, watermark_id, window_end))).all()
+                if tasks:
+                    result.tasks += len(tasks)
+                    result.notifications += await self._insert_notifications(session, kind, tasks, now)
+                if len(tasks) < self.batch_size:
+                    # Окно обработано целиком
+                    await _set_watermark(session, name, max(window_end, watermark), None)
+                    return result
+                await _set_watermark(session, name, tasks[-1].deadline, tasks[-1].task_id)
+
+    async def run(self, now: Optional[datetime] = None) -> Tuple[SweepResult, SweepResult]:
+        """Обрабатываем оба вида напоминаний на момент now."""
+        now = now or datetime.utcnow()
+        return await self.sweep(DUE_SOON, now), await self.sweep(OVERDUE, now)
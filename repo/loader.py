@@ -0,0 +1,116 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+from repo.access import AccessLevelRepository
+from repo.bulk import chunked
+from repo.chat import ChatRepository
+from repo.comment import CommentRepository
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult
+from repo.message import MessageRepository
+from repo.notification import NotificationRepository
+from repo.priorety import PriorityRepository
+from repo.project import ProjectRepository
+from repo.report import ReportRepository
+from repo.status import StatusRepository
+from repo.task import TaskRepository
+from repo.user import UserRepository
+
+
+class BatchLoader:
+    """Объединяет запросы по id, сделанные в пределах одного тика цикла событий, в один пакетный запрос.
+
+    batch_fn получает список уникальных ключей и возвращает словарь {ключ: объект}
+    (например, UserRepository.get_users_by_ids). Для отсутствующих ключей load() возвращает None.
+    При cache=True повторные load() того же ключа не ходят в базу, поэтому загрузчик
+    создаётся на время одного запроса и не переживает его. Ожидающие получают shield() над
+    общим future: отмена одного из них не отменяет загрузку для остальных.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+                 max_batch_size: int = DEFAULT_LOOKUP_CHUNK_SIZE, cache: bool = True):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.cache = cache
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: Dict[Hashable, asyncio.Future] = {}
+        self._dispatch_scheduled = False
+        # Ссылки на запущенные пакеты, чтобы задачи не собрал сборщик мусора до завершения
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, key: Hashable) -> Awaitable[Optional[Any]]:
+        """Ставим ключ в очередь ближайшего пакета и возвращаем future с объектом."""
+        if self.cache and key in self._cache:
+            return asyncio.shield(self._cache[key])
+        if key in self._queue:
+            return asyncio.shield(self._queue[key])
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue[key] = future
+        if self.cache:
+            self._cache[key] = future
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            loop.call_soon(self._dispatch)
+        return asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        """Загружаем несколько ключей; порядок результата совпадает с порядком keys."""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def clear(self, key: Optional[Hashable] = None):
+        """Сбрасываем кэш загрузчика целиком или для одного ключа."""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def _dispatch(self):
+        queue, self._queue = self._queue, {}
+        self._dispatch_scheduled = False
+        for chunk in chunked(list(queue.items()), self.max_batch_size):
+            task = asyncio.ensure_future(self._run_batch(dict(chunk)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: Dict[Hashable, asyncio.Future]):
+        try:
+            found = await self.batch_fn(list(batch))
+        except asyncio.CancelledError:
+            # Отменили сам пакет (например, при остановке цикла) — не оставляем ожидающих висеть
+            for key, future in batch.items():
+                self._cache.pop(key, None)
+                future.cancel()
+            raise
+        except Exception as exc:
+            for key, future in batch.items():
+                self._cache.pop(key, None)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+
+class RepositoryLoaders:
+    """Набор BatchLoader поверх get_*_by_ids репозиториев; создаётся на один запрос API.
+
+    Пример: await asyncio.gather(*(loaders.users.load(task.executor_id) for task in tasks)).
+    """
+
+    def __init__(self, async_session_factory, cache: bool = True):
+        def make(lookup: Callable[[List[int]], Awaitable[LookupResult]]) -> BatchLoader:
+            return BatchLoader(lookup, cache=cache)
+
+        self.access_levels = make(AccessLevelRepository(async_session_factory).get_access_levels_by_ids)
+        self.chats = make(ChatRepository(async_session_factory).get_chats_by_ids)
+        self.comments = make(CommentRepository(async_session_factory).get_comments_by_ids)
+        self.messages = make(MessageRepository(async_session_factory).get_messages_by_ids)
+        self.notifications = make(NotificationRepository(async_session_factory).get_notifications_by_ids)
+        self.priorities = make(PriorityRepository(async_session_factory).get_priorities_by_ids)
+        self.projects = make(ProjectRepository(async_session_factory).get_projects_by_ids)
+        self.reports = make(ReportRepository(async_session_factory).get_reports_by_ids)
+        self.statuses = make(StatusRepository(async_session_factory).get_statuses_by_ids)
+        self.tasks = make(TaskRepository(async_session_factory).get_tasks_by_ids)
+        self.users = make(UserRepository(async_session_factory).get_users_by_ids)
@@ -0,0 +1,82 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from repo.bulk import chunked
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE
+
+DEFAULT_COLLECTION_LIMIT = 100
+FULL_PROFILE = "full"
+
+
+class LoadPlan:
+    """План загрузки связей для get_*_with_relations и get_*_by_ids(with_relations=True).
+
+    include — имя профиля из profiles или список имён связей модели. Скалярные связи
+    (many-to-one, one-to-one) подгружаются joinedload в основном запросе, коллекции — отдельным
+    запросом на каждую коллекцию, никогда не через JOIN, поэтому декартова произведения нет.
+    При collection_limit в коллекции попадает не больше collection_limit последних по первичному
+    ключу объектов на родителя (row_number() OVER (PARTITION BY ...)); при None — selectinload целиком.
+    """
+
+    def __init__(self, model, include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                 profiles: Optional[Dict[str, Sequence[str]]] = None,
+                 collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT):
+        self.model = model
+        self.collection_limit = collection_limit
+        if include is None:
+            include = ()
+        elif isinstance(include, str):
+            if include not in (profiles or {}):
+                raise ValueError(f"Unknown load profile {include!r} for {model.__name__}")
+            include = profiles[include]
+        relationships = inspect(model).relationships
+        unknown = [name for name in include if name not in relationships]
+        if unknown:
+            raise ValueError(f"Unknown relationships for {model.__name__}: {', '.join(unknown)}")
+        self.scalars = [relationships[name] for name in include if not relationships[name].uselist]
+        self.collections = [relationships[name] for name in include if relationships[name].uselist]
+
+    @property
+    def options(self) -> list:
+        """Опции для основного запроса."""
+        options = [joinedload(getattr(self.model, prop.key)) for prop in self.scalars]
+        if self.collection_limit is None:
+            options += [selectinload(getattr(self.model, prop.key)) for prop in self.collections]
+        return options
+
+    async def load_collections(self, session: AsyncSession, objects: Iterable):
+        """Догружаем ограниченные коллекции для уже загруженных объектов."""
+        objects = [obj for obj in objects if obj is not None]
+        if self.collection_limit is None or not objects:
+            return
+        for prop in self.collections:
+            await self._load_collection(session, prop, objects)
+
+    async def _load_collection(self, session: AsyncSession, prop, objects: List):
+        (parent_column, key_column), = prop.synchronize_pairs
+        parent_key = inspect(self.model).get_property_by_column(parent_column).key
+        target = prop.mapper.class_
+        order_by = [column.desc() for column in prop.mapper.primary_key]
+
+        grouped = defaultdict(list)
+        keys = list(dict.fromkeys(getattr(obj, parent_key) for obj in objects))
+        for chunk in chunked(keys, DEFAULT_LOOKUP_CHUNK_SIZE):
+            rank = func.row_number().over(partition_by=key_column, order_by=order_by).label("rank")
+            inner = select(target, key_column.label("parent_key"), rank)
+            if prop.secondary is not None:
+                inner = inner.join(prop.secondary, prop.secondaryjoin)
+            inner = inner.filter(key_column.in_(chunk)).subquery()
+            entity = aliased(target, inner)
+            query = (select(entity, inner.c.parent_key)
+                     .filter(inner.c.rank <= self.collection_limit)
+                     .order_by(inner.c.parent_key, inner.c.rank))
+            for item, key in (await session.execute(query)).all():
+                grouped[key].append(item)
+
+        for obj in objects:
+            set_committed_value(obj, prop.key, grouped.get(getattr(obj, parent_key), []))
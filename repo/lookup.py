@@ -0,0 +1,49 @@
+from typing import Any, Iterable, List, Sequence
+
+from sqlalchemy import any_, bindparam, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from repo.bulk import chunked, primary_key_attributes
+
+DEFAULT_LOOKUP_CHUNK_SIZE = 5000
+
+
+class LookupResult(dict):
+    """Словарь {id: объект}; id, которых нет в базе, перечислены в missing."""
+
+    def __init__(self, found=(), missing: Iterable[Any] = ()):
+        super().__init__(found)
+        self.missing: List[Any] = list(missing)
+
+
+def _pk_condition(session: AsyncSession, pk: Sequence, keys: Sequence):
+    if len(pk) > 1:
+        return tuple_(*pk).in_([tuple(key) for key in keys])
+    if session.get_bind().dialect.name == "postgresql":
+        # Один параметр-массив вместо IN (...): план запроса не зависит от числа id
+        return pk[0] == any_(bindparam("ids", list(keys), type_=ARRAY(pk[0].type)))
+    return pk[0].in_(list(keys))
+
+
+def _key_of(obj, pk: Sequence):
+    if len(pk) > 1:
+        return tuple(getattr(obj, attr.key) for attr in pk)
+    return getattr(obj, pk[0].key)
+
+
+async def fetch_by_ids(session: AsyncSession, model, ids: Iterable[Any], options: Sequence = (),
+                       chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+    """Загружаем объекты модели по списку первичных ключей, по одному запросу на кусок из chunk_size id.
+
+    Для составного первичного ключа ids — кортежи значений в порядке колонок ключа.
+    """
+    pk = primary_key_attributes(model)
+    keys = list(dict.fromkeys(tuple(key) if len(pk) > 1 else key for key in ids))
+    found = {}
+    for chunk in chunked(keys, chunk_size):
+        query = select(model).filter(_pk_condition(session, pk, chunk)).options(*options)
+        result = await session.execute(query)
+        for obj in result.unique().scalars().all():
+            found[_key_of(obj, pk)] = obj
+    return LookupResult(found, missing=[key for key in keys if key not in found])
@@ -1,68 +1,203 @@
-from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload
-from typing import List, Optional
+from collections import Counter, defaultdict
+
+from sqlalchemy import select, insert, update, delete, func, tuple_
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Union
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from engene import session_scope
+from instrumentation import instrumented
 from models.message import Message
+from models.read_state import ChatReadState
+from repo.chat import refresh_chats_last_message, touch_chat_last_message
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, clamp_limit, paginate
+from repo.projection import project_page, projection_select
+from repo.read_state import bump_chat_unread
+from repo.streaming import DEFAULT_BATCH_SIZE, stream_query, stream_select
+
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "user",  # Подгружаем пользователя сообщения
+        "chat",  # Подгружаем чат сообщения
+    ),
+}
 
 
+@instrumented
 class MessageRepository:
     """Класс для работы с сущностью Message, включающий методы для получения данных с и без связей"""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, unread_counters: bool = False):
         self.async_session_factory = async_session_factory
+        # При unread_counters=True счётчики непрочитанных (ChatReadState) обновляются при записи
+        self.unread_counters = unread_counters
 
     async def create_message(self, values: dict) -> Message:
         """Создаём новое Message."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(Message).values(**values).returning(Message)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(Message).values(**values).returning(Message)
+            result = await session.execute(stmt)
+            message = result.scalar_one()
+            await touch_chat_last_message(session, message)
+            if self.unread_counters:
+                await bump_chat_unread(session, message.chat_id, {message.user_id: 1})
+            return message
+
+    async def create_many_messages(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                   return_ids: bool = False) -> List:
+        """Создаём сообщения пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, Message, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            await refresh_chats_last_message(session, {values["chat_id"] for values in values_list})
+            if self.unread_counters:
+                senders = defaultdict(Counter)
+                for values in values_list:
+                    senders[values["chat_id"]][values["user_id"]] += 1
+                for chat_id, chat_senders in senders.items():
+                    await bump_chat_unread(session, chat_id, chat_senders)
+            return created
 
     async def get_message_by_id(self, message_id: int) -> Optional[Message]:
         """Получаем Message по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Message).filter(Message.message_id == message_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Message).filter(Message.message_id == message_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_messages_by_ids(self, ids: List[int], with_relations: bool = False,
+                                  chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем сообщения по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, Message, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_message(self, message_id: int, values: dict):
         """Обновляем Message по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(Message).where(Message.message_id == message_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(Message).where(Message.message_id == message_id).values(**values)
+            await session.execute(stmt)
 
     async def delete_message(self, message_id: int):
         """Удаляем Message по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(Message).where(Message.message_id == message_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = (delete(Message)
+                    .where(Message.message_id == message_id)
+                    .returning(Message.chat_id, Message.user_id))
+            deleted = (await session.execute(stmt)).one_or_none()
+            if deleted is None:
+                return
+            chat_id, author_id = deleted
+            # Удалённое сообщение могло быть последним в чате
+            await refresh_chats_last_message(session, [chat_id])
+            if self.unread_counters:
+                # Снимаем его со счётчиков тех, кто ещё не дочитал до него
+                await session.execute(
+                    update(ChatReadState)
+                    .where(ChatReadState.chat_id == chat_id,
+                           ChatReadState.user_id != author_id,
+                           func.coalesce(ChatReadState.last_read_message_id, 0) < message_id,
+                           ChatReadState.unread_count > 0)
+                    .values(unread_count=ChatReadState.unread_count - 1)
+                    .execution_options(synchronize_session=False)
+                )
 
     async def get_all_messages(self) -> List[Message]:
         """Получаем список всех сообщений без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Message)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_message_with_relations(self, message_id: int) -> Optional[Message]:
-        """Получаем Message со всеми связями, включая пользователя и чат."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(Message)
-                .filter(Message.message_id == message_id)
-                .options(
-                    joinedload(Message.user),  # Подгружаем пользователя сообщения
-                    joinedload(Message.chat)  # Подгружаем чат сообщения
-                ))
-                result = await session.execute(query)
-                return result.scalars().first()
\ No newline at end of file
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Message)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_messages_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                filters: Optional[dict] = None, fields: Optional[Sequence[str]] = None) -> Page:
+        """Получаем страницу сообщений с keyset-пагинацией по (sent_at, message_id).
+
+        При fields выбираются только эти колонки (плюс ключ пагинации), а элементы страницы —
+        неизменяемые read-модели без состояния сессии вместо ORM-объектов.
+        """
+        key_columns = (Message.sent_at, Message.message_id)
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Message) if fields is None else projection_select(Message, fields, key_columns)
+            query = apply_filters(query, Message, filters)
+            page = await paginate(session, query, key_columns, after=after, limit=limit, scalars=fields is None)
+            return project_page(Message, page, fields)
+
+    async def get_chat_history(self, chat_id: int, before: Optional[str] = None,
+                               limit: int = DEFAULT_PAGE_LIMIT) -> Page[Message]:
+        """Получаем историю чата от новых сообщений к старым.
+
+        before — next_cursor предыдущей страницы. Запрос идёт по индексу
+        (chat_id, sent_at, message_id), поэтому стоимость не зависит от размера чата.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Message).filter(Message.chat_id == chat_id)
+            return await paginate(session, query,
+                                  (Message.sent_at, Message.message_id),
+                                  after=before, limit=limit, descending=True)
+
+    async def get_chat_messages_since(self, chat_id: int, after_id: int,
+                                      limit: int = DEFAULT_PAGE_LIMIT) -> List[Message]:
+        """Получаем сообщения чата, пришедшие после сообщения after_id, от старых к новым.
+
+        limit ограничен MAX_PAGE_LIMIT, как у постраничных методов.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            anchor = (await session.execute(
+                select(Message.sent_at).filter(Message.message_id == after_id)
+            )).scalar_one_or_none()
+            query = select(Message).filter(Message.chat_id == chat_id)
+            if anchor is not None:
+                # Keyset по тому же индексу (chat_id, sent_at, message_id)
+                query = query.filter(tuple_(Message.sent_at, Message.message_id) > tuple_(anchor, after_id))
+            else:
+                query = query.filter(Message.message_id > after_id)
+            query = query.order_by(Message.sent_at, Message.message_id).limit(clamp_limit(limit))
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def iter_messages(self, batch_size: int = DEFAULT_BATCH_SIZE, as_rows: bool = False,
+                            batched: bool = False, filters: Optional[dict] = None) -> AsyncIterator:
+        """Потоково проходим по всем сообщениям через серверный курсор с ограниченной памятью.
+
+        as_rows=True отдаёт простые строки вместо ORM-объектов, batched=True — порции по batch_size.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(stream_select(Message, as_rows), Message, filters).order_by(Message.message_id)
+            async for item in stream_query(session, query, batch_size, as_rows=as_rows, batched=batched):
+                yield item
+
+    async def get_message_with_relations(self, message_id: int,
+                                         include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                         collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[Message]:
+        """Получаем Message со всеми связями, включая пользователя и чат.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(Message)
+                     .filter(Message.message_id == message_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            message = result.scalars().first()
+            await plan.load_collections(session, [message])
+            return message
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(Message, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
@@ -1,67 +1,151 @@
+from collections import Counter
+
 from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload
-from typing import List, Optional
+from typing import AsyncIterator, Iterable, List, Optional, Union
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from engene import session_scope
+from instrumentation import instrumented
 from models.notification import Notification
+from models.read_state import NotificationReadState
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
+from repo.read_state import bump_notification_unread
+from repo.streaming import DEFAULT_BATCH_SIZE, stream_query, stream_select
+
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "user",  # Подгружаем пользователя уведомления
+    ),
+}
 
 
+@instrumented
 class NotificationRepository:
     """Класс для работы с сущностью Notification, включающий методы для получения данных с и без связей"""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, unread_counters: bool = False):
         self.async_session_factory = async_session_factory
+        # При unread_counters=True счётчики непрочитанных (NotificationReadState) обновляются при записи
+        self.unread_counters = unread_counters
 
     async def create_notification(self, values: dict) -> Notification:
         """Создаём новую Notification."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(Notification).values(**values).returning(Notification)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(Notification).values(**values).returning(Notification)
+            result = await session.execute(stmt)
+            notification = result.scalar_one()
+            if self.unread_counters and notification.read_at is None:
+                await bump_notification_unread(session, {notification.user_id: 1})
+            return notification
+
+    async def create_many_notifications(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                        return_ids: bool = False) -> List:
+        """Создаём уведомления пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, Notification, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            if self.unread_counters:
+                await bump_notification_unread(session, Counter(
+                    values["user_id"] for values in values_list if values.get("read_at") is None
+                ))
+            return created
 
     async def get_notification_by_id(self, notification_id: int) -> Optional[Notification]:
         """Получаем Notification по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Notification).filter(Notification.id == notification_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Notification).filter(Notification.id == notification_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_notifications_by_ids(self, ids: List[int], with_relations: bool = False,
+                                       chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем уведомления по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, Notification, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_notification(self, notification_id: int, values: dict):
         """Обновляем Notification по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(Notification).where(Notification.id == notification_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(Notification).where(Notification.id == notification_id).values(**values)
+            await session.execute(stmt)
 
     async def delete_notification(self, notification_id: int):
         """Удаляем Notification по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(Notification).where(Notification.id == notification_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = (delete(Notification)
+                    .where(Notification.id == notification_id)
+                    .returning(Notification.user_id, Notification.read_at))
+            deleted = (await session.execute(stmt)).one_or_none()
+            if self.unread_counters and deleted is not None and deleted.read_at is None:
+                await session.execute(
+                    update(NotificationReadState)
+                    .where(NotificationReadState.user_id == deleted.user_id,
+                           NotificationReadState.unread_count > 0)
+                    .values(unread_count=NotificationReadState.unread_count - 1)
+                    .execution_options(synchronize_session=False)
+                )
 
     async def get_all_notifications(self) -> List[Notification]:
         """Получаем список всех уведомлений без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Notification)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_notification_with_relations(self, notification_id: int) -> Optional[Notification]:
-        """Получаем Notification со всеми связями, включая пользователя."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(Notification)
-                .filter(Notification.id == notification_id)
-                .options(
-                    joinedload(Notification.user)  # Подгружаем пользователя уведомления
-                ))
-                result = await session.execute(query)
-                return result.scalars().first()
\ No newline at end of file
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Notification)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_notifications_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                     filters: Optional[dict] = None) -> Page[Notification]:
+        """Получаем страницу уведомлений с keyset-пагинацией по (sent_at, id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(Notification), Notification, filters)
+            return await paginate(session, query,
+                                  (Notification.sent_at, Notification.id),
+                                  after=after, limit=limit)
+
+    async def iter_notifications(self, batch_size: int = DEFAULT_BATCH_SIZE, as_rows: bool = False,
+                                 batched: bool = False, filters: Optional[dict] = None) -> AsyncIterator:
+        """Потоково проходим по всем уведомлениям через серверный курсор с ограниченной памятью.
+
+        as_rows=True отдаёт простые строки вместо ORM-объектов, batched=True — порции по batch_size.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = (apply_filters(stream_select(Notification, as_rows), Notification, filters)
+                     .order_by(Notification.id))
+            async for item in stream_query(session, query, batch_size, as_rows=as_rows, batched=batched):
+                yield item
+
+    async def get_notification_with_relations(self, notification_id: int,
+                                              include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                              collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[Notification]:
+        """Получаем Notification со всеми связями, включая пользователя.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(Notification)
+                     .filter(Notification.id == notification_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            notification = result.scalars().first()
+            await plan.load_collections(session, [notification])
+            return notification
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(Notification, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
@@ -0,0 +1,99 @@
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Generic, List, Optional, Sequence, TypeVar
+
+from sqlalchemy import Row, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 1000
+
+
+@dataclass
+class Page(Generic[T]):
+    """Страница результатов keyset-пагинации."""
+    items: List[T] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Кодируем значения ключа сортировки последней строки в непрозрачный курсор."""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Раскодируем курсор обратно в значения ключа сортировки."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid pagination cursor: {cursor!r}") from exc
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid pagination cursor: {cursor!r}")
+    return [_decode_value(value) for value in values]
+
+
+def apply_filters(query, model, filters: Optional[dict]):
+    """Добавляем в запрос фильтры на равенство по именам колонок модели."""
+    for name, value in (filters or {}).items():
+        column = getattr(model, name, None)
+        if column is None or name not in model.__table__.c:
+            raise ValueError(f"Unknown filter column {name!r} for {model.__name__}")
+        query = query.filter(column.is_(None) if value is None else column == value)
+    return query
+
+
+def _key_of(item, key_columns) -> List[Any]:
+    source = item
+    if isinstance(item, Row) and not all(hasattr(item, column.key) for column in key_columns):
+        # Строка из нескольких сущностей: ключ сортировки берётся из первой
+        source = item[0]
+    return [getattr(source, column.key) for column in key_columns]
+
+
+def clamp_limit(limit: int) -> int:
+    """Ограничиваем размер страницы диапазоном [1, MAX_PAGE_LIMIT]."""
+    return max(1, min(limit, MAX_PAGE_LIMIT))
+
+
+async def paginate(session: AsyncSession, query, key_columns: Sequence, after: Optional[str] = None,
+                   limit: int = DEFAULT_PAGE_LIMIT, descending: bool = False, scalars: bool = True) -> Page:
+    """Выполняем запрос с keyset-пагинацией по key_columns (без OFFSET).
+
+    key_columns должны однозначно упорядочивать строки — последним всегда идёт первичный ключ.
+    При scalars=False элементами страницы будут строки (Row), а не первая сущность запроса.
+    """
+    limit = clamp_limit(limit)
+    key = tuple_(*key_columns)
+    if after is not None:
+        values = decode_cursor(after)
+        if len(values) != len(key_columns):
+            raise ValueError(f"Invalid pagination cursor: {after!r}")
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+    order = [column.desc() if descending else column.asc() for column in key_columns]
+    query = query.order_by(*order).limit(limit + 1)
+
+    result = await session.execute(query)
+    items = list(result.scalars().all() if scalars else result.all())
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(_key_of(items[-1], key_columns))
+    return Page(items=items, next_cursor=next_cursor)
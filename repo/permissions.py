@@ -0,0 +1,151 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+
+from engene import session_scope
+from models.access import AccessLevelSetting, AccessSetting
+from models.user import User
+from repo.bulk import chunked
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE
+
+DEFAULT_PERMISSIONS_TTL = 300.0
+DEFAULT_ROLE_CACHE_SIZE = 100_000
+# Сколько раз перечитываем матрицу, если её сбрасывают во время загрузки
+MAX_LOAD_ATTEMPTS = 3
+
+
+class PermissionMatrix:
+    """Матрица прав «уровень доступа × настройка», сжатая в битовую маску на каждый уровень.
+
+    Каждой настройке (AccessSetting) выдаётся свой бит; маска уровня — OR битов разрешённых
+    (allowed) настроек. Роль пользователя (User.role_id) кэшируется в LRU, так что повторная
+    проверка прав не обращается к базе. Репозитории уровней и настроек доступа и пользователей,
+    получившие матрицу, сбрасывают её после коммита изменений.
+    """
+
+    def __init__(self, async_session_factory, ttl: float = DEFAULT_PERMISSIONS_TTL,
+                 role_cache_size: int = DEFAULT_ROLE_CACHE_SIZE):
+        self.async_session_factory = async_session_factory
+        self.ttl = ttl
+        self.role_cache_size = role_cache_size
+        self._permission_masks: Dict[str, int] = {}
+        self._level_masks: Dict[int, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._roles: "OrderedDict[int, int]" = OrderedDict()
+        # Растёт при каждом invalidate_user: роль, прочитанная до сброса, в кэш не попадает
+        self._roles_generation = 0
+
+    def invalidate(self):
+        """Сбрасываем матрицу прав (после изменения AccessLevel/AccessSetting/AccessLevelSetting)."""
+        self._loaded_at = None
+        self._generation += 1
+
+    def invalidate_user(self, user_id: Optional[int] = None):
+        """Сбрасываем закэшированную роль одного пользователя или всех пользователей."""
+        self._roles_generation += 1
+        if user_id is None:
+            self._roles.clear()
+        else:
+            self._roles.pop(user_id, None)
+
+    async def load(self, keep_stale: bool = False) -> bool:
+        """Перечитываем матрицу из базы: все настройки и все разрешённые пары уровень×настройка.
+
+        Возвращаем False, если во время загрузки матрицу сбросили и снимок не принят. При
+        keep_stale=True такой снимок всё же подставляется, но остаётся устаревшим: следующая
+        проверка прав перечитает матрицу.
+        """
+        generation = self._generation
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            settings = (await session.execute(
+                select(AccessSetting.id, AccessSetting.permission).order_by(AccessSetting.id)
+            )).all()
+            allowed = (await session.execute(
+                select(AccessLevelSetting.access_level_id, AccessLevelSetting.access_setting_id)
+                .filter(AccessLevelSetting.allowed.is_(True))
+            )).all()
+
+        setting_bits = {setting_id: 1 << index for index, (setting_id, _) in enumerate(settings)}
+        permission_masks: Dict[str, int] = {}
+        for setting_id, permission in settings:
+            permission_masks[permission] = permission_masks.get(permission, 0) | setting_bits[setting_id]
+        level_masks: Dict[int, int] = {}
+        for access_level_id, access_setting_id in allowed:
+            level_masks[access_level_id] = level_masks.get(access_level_id, 0) | setting_bits[access_setting_id]
+
+        # Пока шла загрузка, матрицу могли сбросить — тогда снимок уже устарел
+        accepted = generation == self._generation
+        if accepted or keep_stale:
+            self._permission_masks = permission_masks
+            self._level_masks = level_masks
+        if accepted:
+            self._loaded_at = time.monotonic()
+        return accepted
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            for attempt in range(1, MAX_LOAD_ATTEMPTS + 1):
+                if self._is_fresh():
+                    return
+                # Последняя попытка подставляет прочитанное даже при сбросе: это не старее
+                # прежних масок и лучше пустой матрицы при холодном старте
+                if await self.load(keep_stale=attempt == MAX_LOAD_ATTEMPTS):
+                    return
+
+    def _remember_role(self, user_id: int, role_id: int):
+        self._roles[user_id] = role_id
+        self._roles.move_to_end(user_id)
+        while len(self._roles) > self.role_cache_size:
+            self._roles.popitem(last=False)
+
+    async def _roles_for(self, user_ids: List[int]) -> Dict[int, int]:
+        roles = {}
+        missing = []
+        for user_id in user_ids:
+            if user_id in self._roles:
+                self._roles.move_to_end(user_id)
+                roles[user_id] = self._roles[user_id]
+            else:
+                missing.append(user_id)
+        if missing:
+            generation = self._roles_generation
+            async with session_scope(self.async_session_factory, read_only=True) as session:
+                for chunk in chunked(missing, DEFAULT_LOOKUP_CHUNK_SIZE):
+                    result = await session.execute(
+                        select(User.user_id, User.role_id).filter(User.user_id.in_(chunk))
+                    )
+                    for user_id, role_id in result.all():
+                        # Пока шёл запрос, роль могли изменить — тогда прочитанное значение не кэшируем
+                        if generation == self._roles_generation:
+                            self._remember_role(user_id, role_id)
+                        roles[user_id] = role_id
+        return roles
+
+    def level_can(self, access_level_id: int, permission: str) -> bool:
+        """Проверяем право уровня доступа по уже загруженной матрице."""
+        permission_mask = self._permission_masks.get(permission, 0)
+        return bool(self._level_masks.get(access_level_id, 0) & permission_mask)
+
+    async def can(self, user_id: int, permission: str) -> bool:
+        """Проверяем, есть ли у пользователя право permission (например, "create_project")."""
+        await self._ensure_loaded()
+        role_id = (await self._roles_for([user_id])).get(user_id)
+        return role_id is not None and self.level_can(role_id, permission)
+
+    async def filter_allowed(self, user_ids: Iterable[int], permission: str) -> List[int]:
+        """Оставляем из user_ids только пользователей с правом permission (порядок сохраняется)."""
+        await self._ensure_loaded()
+        user_ids = list(dict.fromkeys(user_ids))
+        roles = await self._roles_for(user_ids)
+        return [user_id for user_id in user_ids
+                if user_id in roles and self.level_can(roles[user_id], permission)]
@@ -0,0 +1,44 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+DEFAULT_PREFIX_CACHE_SIZE = 10_000
+DEFAULT_PREFIX_CACHE_TTL = 30.0
+
+
+class PrefixCache:
+    """LRU-кэш результатов автодополнения с ограниченным сроком жизни записей.
+
+    Самые частые префиксы (первые одна-три буквы) обслуживаются из памяти процесса. Записи
+    неизменяемы (read-модели), поэтому их можно отдавать нескольким запросам одновременно.
+    UserRepository, получивший кэш, сбрасывает его после изменения пользователей; изменения
+    состава проектов видны по истечении ttl.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_PREFIX_CACHE_SIZE, ttl: float = DEFAULT_PREFIX_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, List]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[List]:
+        """Получаем закэшированный результат или None, если его нет или он устарел."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, items = entry
+        if time.monotonic() - stored_at >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return items
+
+    def put(self, key: Hashable, items: List):
+        """Сохраняем результат, вытесняя самые давно использованные записи."""
+        self._entries[key] = (time.monotonic(), items)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Сбрасываем весь кэш (после создания, изменения или удаления пользователей)."""
+        self._entries.clear()
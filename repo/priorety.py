@@ -1,67 +1,125 @@
 from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload, selectinload
-from typing import List, Optional
+from typing import Iterable, List, Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from engene import after_commit, session_scope
+from instrumentation import instrumented
 from models.priorety import Priority
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
+from repo.reference_cache import PRIORITIES, ReferenceDataCache
 
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "projects",  # Подгружаем проекты приоритета
+        "tasks",  # Подгружаем задачи приоритета
+    ),
+}
 
+
+@instrumented
 class PriorityRepository:
     """Класс для работы с сущностью Priority, включающий методы для получения данных с и без связей"""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, reference_cache: Optional[ReferenceDataCache] = None):
         self.async_session_factory = async_session_factory
+        # Кэш справочников, который нужно сбрасывать при изменении таблицы
+        self.reference_cache = reference_cache
+
+    def _invalidate_reference_cache(self):
+        """Сбрасываем снимок приоритетов в ReferenceDataCache после изменения таблицы."""
+        if self.reference_cache is not None:
+            self.reference_cache.invalidate(PRIORITIES)
 
     async def create_priority(self, values: dict) -> Priority:
         """Создаём новый Priority."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(Priority).values(**values).returning(Priority)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(Priority).values(**values).returning(Priority)
+            result = await session.execute(stmt)
+            after_commit(session, self._invalidate_reference_cache)
+            return result.scalar_one()
+
+    async def create_many_priorities(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                     return_ids: bool = False) -> List:
+        """Создаём приоритеты пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, Priority, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            after_commit(session, self._invalidate_reference_cache)
+            return created
 
     async def get_priority_by_id(self, priority_id: int) -> Optional[Priority]:
         """Получаем Priority по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Priority).filter(Priority.id == priority_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Priority).filter(Priority.id == priority_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_priorities_by_ids(self, ids: List[int], with_relations: bool = False,
+                                    chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем приоритеты по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, Priority, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_priority(self, priority_id: int, values: dict):
         """Обновляем Priority по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(Priority).where(Priority.id == priority_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(Priority).where(Priority.id == priority_id).values(**values)
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_reference_cache)
 
     async def delete_priority(self, priority_id: int):
         """Удаляем Priority по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(Priority).where(Priority.id == priority_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(Priority).where(Priority.id == priority_id)
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_reference_cache)
 
     async def get_all_priorities(self) -> List[Priority]:
         """Получаем список всех приоритетов без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Priority)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_priority_with_relations(self, priority_id: int) -> Optional[Priority]:
-        """Получаем Priority со всеми связями, включая проекты и задачи."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(Priority)
-                .filter(Priority.id == priority_id)
-                .options(
-                    selectinload(Priority.projects),  # Подгружаем проекты приоритета
-                    selectinload(Priority.tasks)  # Подгружаем задачи приоритета
-                ))
-                result = await session.execute(query)
-                return result.scalars().first()
\ No newline at end of file
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Priority)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_priorities_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                  filters: Optional[dict] = None) -> Page[Priority]:
+        """Получаем страницу приоритетов с keyset-пагинацией по (id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(Priority), Priority, filters)
+            return await paginate(session, query, (Priority.id,), after=after, limit=limit)
+
+    async def get_priority_with_relations(self, priority_id: int,
+                                          include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                          collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[Priority]:
+        """Получаем Priority со всеми связями, включая проекты и задачи.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(Priority)
+                     .filter(Priority.id == priority_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            priority = result.scalars().first()
+            await plan.load_collections(session, [priority])
+            return priority
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(Priority, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
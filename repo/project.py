@@ -1,12 +1,33 @@
 from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload, selectinload
-from typing import List, Optional
+from typing import Iterable, List, Optional, Union
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from engene import session_scope
+from instrumentation import instrumented
 from models.project import Project
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
 
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "status",  # Подгружаем статус проекта
+        "owner",  # Подгружаем владельца проекта
+        "priority",  # Подгружаем приоритет проекта
+        "tasks",  # Подгружаем задачи проекта
+        "reports",  # Подгружаем отчёты проекта
+        "chat",  # Подгружаем чат проекта
+        "assigned_users",  # Подгружаем назначенных пользователей
+    ),
+    "card": ("status", "owner", "priority"),  # Карточка проекта без коллекций
+    "board": ("status", "priority", "tasks"),  # Доска проекта: задачи без отчётов и участников
+}
 
+
+@instrumented
 class ProjectRepository:
     """Класс для работы с сущностью Project, включающий методы для получения данных с и без связей"""
 
@@ -15,59 +36,86 @@ class ProjectRepository:
 
     async def create_project(self, values: dict) -> Project:
         """Создаём новый Project."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(Project).values(**values).returning(Project)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(Project).values(**values).returning(Project)
+            result = await session.execute(stmt)
+            return result.scalar_one()
+
+    async def create_many_projects(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                   return_ids: bool = False) -> List:
+        """Создаём проекты пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, Project, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            return created
 
     async def get_project_by_id(self, project_id: int) -> Optional[Project]:
         """Получаем Project по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Project).filter(Project.project_id == project_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Project).filter(Project.project_id == project_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_projects_by_ids(self, ids: List[int], with_relations: bool = False,
+                                  chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем проекты по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, Project, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_project(self, project_id: int, values: dict):
         """Обновляем Project по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(Project).where(Project.project_id == project_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(Project).where(Project.project_id == project_id).values(**values)
+            await session.execute(stmt)
 
     async def delete_project(self, project_id: int):
         """Удаляем Project по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(Project).where(Project.project_id == project_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(Project).where(Project.project_id == project_id)
+            await session.execute(stmt)
 
     async def get_all_projects(self) -> List[Project]:
         """Получаем список всех проектов без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Project)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_project_with_relations(self, project_id: int) -> Optional[Project]:
-        """Получаем Project со всеми связями."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(Project)
-                .filter(Project.project_id == project_id)
-                .options(
-                    joinedload(Project.status),  # Подгружаем статус проекта
-                    joinedload(Project.owner),  # Подгружаем владельца проекта
-                    joinedload(Project.priority),  # Подгружаем приоритет проекта
-                    selectinload(Project.tasks),  # Подгружаем задачи проекта
-                    selectinload(Project.reports),  # Подгружаем отчёты проекта
-                    joinedload(Project.chat),  # Подгружаем чат проекта
-                    selectinload(Project.assigned_users)  # Подгружаем назначенных пользователей
-                ))
-                result = await session.execute(query)
-                return result.scalars().first()
\ No newline at end of file
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Project)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_projects_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                                filters: Optional[dict] = None) -> Page[Project]:
+        """Получаем страницу проектов с keyset-пагинацией по (project_id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(Project), Project, filters)
+            return await paginate(session, query, (Project.project_id,), after=after, limit=limit)
+
+    async def get_project_with_relations(self, project_id: int,
+                                         include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                         collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[Project]:
+        """Получаем Project со всеми связями.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(Project)
+                     .filter(Project.project_id == project_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            project = result.scalars().first()
+            await plan.load_collections(session, [project])
+            return project
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(Project, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
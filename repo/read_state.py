@@ -0,0 +1,209 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, case, exists, func, literal, null, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from engene import session_scope
+from instrumentation import instrumented
+from models.chat import Chat
+from models.message import Message
+from models.notification import Notification
+from models.read_state import ChatReadState, NotificationReadState
+from repo.bulk import DEFAULT_CHUNK_SIZE, chunked, dialect_insert
+from repo.chat import chat_members, user_chats_condition
+
+
+async def bump_chat_unread(session: AsyncSession, chat_id: int, senders: Dict[int, int]):
+    """Увеличиваем счётчики непрочитанных у участников чата на число новых сообщений.
+
+    senders — {user_id автора: число его новых сообщений}; свои сообщения автору не засчитываются.
+    Участникам без строки ChatReadState она создаётся сразу с полным числом чужих сообщений чата.
+    """
+    total = sum(senders.values())
+    own = case(senders, value=ChatReadState.user_id, else_=0)
+    await session.execute(update(ChatReadState)
+                          .where(ChatReadState.chat_id == chat_id)
+                          .values(unread_count=ChatReadState.unread_count + total - own)
+                          .execution_options(synchronize_session=False))
+
+    members = chat_members(chat_id).subquery()
+    unread = (select(func.count())
+              .select_from(Message)
+              .where(Message.chat_id == chat_id, Message.user_id != members.c.user_id)
+              .scalar_subquery())
+    missing = (select(members.c.user_id, literal(chat_id), unread)
+               .where(~exists().where(ChatReadState.chat_id == chat_id,
+                                      ChatReadState.user_id == members.c.user_id)))
+    stmt = (dialect_insert(session, ChatReadState)
+            .from_select(["user_id", "chat_id", "unread_count"], missing)
+            .on_conflict_do_nothing())
+    await session.execute(stmt)
+
+
+async def bump_notification_unread(session: AsyncSession, recipients: Dict[int, int]):
+    """Увеличиваем счётчики непрочитанных уведомлений: recipients — {user_id: число новых уведомлений}."""
+    rows = [{"user_id": user_id, "unread_count": count} for user_id, count in recipients.items()]
+    for chunk in chunked(rows, DEFAULT_CHUNK_SIZE):
+        stmt = dialect_insert(session, NotificationReadState).values(list(chunk))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[NotificationReadState.user_id],
+            set_={"unread_count": NotificationReadState.unread_count + stmt.excluded.unread_count},
+        )
+        await session.execute(stmt)
+
+
+def _chat_unread_select(user_id: int, *leading):
+    """Непрочитанные сообщения пользователя по чатам: (*leading, chat_id, число); чаты без них не попадают."""
+    last_read = func.coalesce(ChatReadState.last_read_message_id, 0)
+    return (select(*leading, Chat.chat_id, func.count(Message.message_id))
+            .select_from(Chat)
+            .outerjoin(ChatReadState, and_(ChatReadState.chat_id == Chat.chat_id,
+                                           ChatReadState.user_id == user_id))
+            .join(Message, and_(Message.chat_id == Chat.chat_id,
+                                Message.message_id > last_read,
+                                Message.user_id != user_id))
+            .filter(user_chats_condition(user_id))
+            .group_by(Chat.chat_id))
+
+
+def _notification_unread_select(user_id: int, *leading):
+    """Число непрочитанных уведомлений пользователя: (*leading, число)."""
+    return (select(*leading, func.count())
+            .select_from(Notification)
+            .filter(Notification.user_id == user_id, Notification.read_at.is_(None)))
+
+
+@instrumented
+class ReadStateRepository:
+    """Состояние прочтения чатов и уведомлений и счётчики непрочитанного для бейджей.
+
+    Счётчики ChatReadState.unread_count и NotificationReadState.unread_count поддерживаются
+    только репозиториями, созданными с unread_counters=True; unread_counts(use_counters=False)
+    считает по самим сообщениям и уведомлениям и от счётчиков не зависит.
+    """
+
+    def __init__(self, async_session_factory):
+        self.async_session_factory = async_session_factory
+
+    async def mark_chat_read(self, user_id: int, chat_id: int, message_id: Optional[int] = None):
+        """Отмечаем чат прочитанным до message_id (по умолчанию — до последнего сообщения)."""
+        async with session_scope(self.async_session_factory) as session:
+            if message_id is None:
+                result = await session.execute(select(Chat.last_message_id).filter(Chat.chat_id == chat_id))
+                message_id = result.scalar_one_or_none()
+            result = await session.execute(
+                select(func.count())
+                .select_from(Message)
+                .filter(Message.chat_id == chat_id,
+                        Message.message_id > (message_id or 0),
+                        Message.user_id != user_id)
+            )
+            await self._upsert_chat_states(session, [{
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "last_read_message_id": message_id,
+                "unread_count": result.scalar_one(),
+            }])
+
+    async def mark_chats_read(self, user_id: int, chat_ids: List[int]):
+        """Отмечаем прочитанными до последнего сообщения сразу несколько чатов."""
+        async with session_scope(self.async_session_factory) as session:
+            rows = []
+            for chunk in chunked(list(dict.fromkeys(chat_ids)), DEFAULT_CHUNK_SIZE):
+                result = await session.execute(
+                    select(Chat.chat_id, Chat.last_message_id).filter(Chat.chat_id.in_(chunk))
+                )
+                rows.extend({
+                    "user_id": user_id,
+                    "chat_id": chat_id,
+                    "last_read_message_id": last_message_id,
+                    "unread_count": 0,
+                } for chat_id, last_message_id in result.all())
+            await self._upsert_chat_states(session, rows)
+
+    async def mark_notifications_read(self, user_id: int, ids: Optional[List[int]] = None) -> int:
+        """Отмечаем прочитанными уведомления пользователя (все или только ids); возвращаем их число."""
+        async with session_scope(self.async_session_factory) as session:
+            now = datetime.utcnow()
+            unread = and_(Notification.user_id == user_id, Notification.read_at.is_(None))
+            chunks = [None] if ids is None else chunked(list(dict.fromkeys(ids)), DEFAULT_CHUNK_SIZE)
+            marked = 0
+            for chunk in chunks:
+                stmt = update(Notification).where(unread)
+                if chunk is not None:
+                    stmt = stmt.where(Notification.id.in_(chunk))
+                stmt = stmt.values(read_at=now).execution_options(synchronize_session=False)
+                marked += (await session.execute(stmt)).rowcount
+            if marked:
+                await session.execute(
+                    update(NotificationReadState)
+                    .where(NotificationReadState.user_id == user_id)
+                    .values(unread_count=select(func.count()).select_from(Notification)
+                            .where(unread).scalar_subquery())
+                    .execution_options(synchronize_session=False)
+                )
+            return marked
+
+    async def unread_counts(self, user_id: int, use_counters: bool = False) -> dict:
+        """Получаем непрочитанное пользователя одним запросом: {"chats": {chat_id: n}, "notifications": n}.
+
+        При use_counters=True читаем готовые счётчики (O(1) на чат), иначе считаем сообщения после
+        last_read_message_id по индексу ix_messages_chat_message_id и уведомления по частичному
+        индексу ix_notifications_user_unread. Чаты без непрочитанного в словарь не попадают.
+        """
+        if use_counters:
+            chats = (select(ChatReadState.chat_id, ChatReadState.unread_count)
+                     .filter(ChatReadState.user_id == user_id, ChatReadState.unread_count > 0))
+            notifications = (select(null(), NotificationReadState.unread_count)
+                             .filter(NotificationReadState.user_id == user_id))
+        else:
+            chats = _chat_unread_select(user_id)
+            notifications = _notification_unread_select(user_id, null())
+
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            result = await session.execute(union_all(chats, notifications))
+            counts = {"chats": {}, "notifications": 0}
+            for chat_id, count in result.all():
+                if chat_id is None:
+                    counts["notifications"] = count
+                else:
+                    counts["chats"][chat_id] = count
+            return counts
+
+    async def recount(self, user_id: int):
+        """Пересчитываем счётчики пользователя с нуля (например, после включения unread_counters).
+
+        Подсчёт и запись идут одной транзакцией на primary: INSERT ... SELECT считает по тем же
+        данным, в которые пишет, поэтому между чтением и записью нет окна и отставания реплики.
+        """
+        async with session_scope(self.async_session_factory) as session:
+            await session.execute(update(ChatReadState)
+                                  .where(ChatReadState.user_id == user_id)
+                                  .values(unread_count=0)
+                                  .execution_options(synchronize_session=False))
+            stmt = (dialect_insert(session, ChatReadState)
+                    .from_select(["user_id", "chat_id", "unread_count"],
+                                 _chat_unread_select(user_id, literal(user_id))))
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[ChatReadState.user_id, ChatReadState.chat_id],
+                set_={"unread_count": stmt.excluded.unread_count},
+            ))
+            stmt = (dialect_insert(session, NotificationReadState)
+                    .from_select(["user_id", "unread_count"],
+                                 _notification_unread_select(user_id, literal(user_id))))
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[NotificationReadState.user_id],
+                set_={"unread_count": stmt.excluded.unread_count},
+            ))
+
+    @staticmethod
+    async def _upsert_chat_states(session: AsyncSession, rows: List[dict],
+                                  fields=("last_read_message_id", "unread_count")):
+        for chunk in chunked(rows, DEFAULT_CHUNK_SIZE):
+            stmt = dialect_insert(session, ChatReadState).values(list(chunk))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ChatReadState.user_id, ChatReadState.chat_id],
+                set_={field: stmt.excluded[field] for field in fields},
+            )
+            await session.execute(stmt)
@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from engene import session_scope
+from models.access import AccessLevel
+from models.priorety import Priority
+from models.status import Status
+
+DEFAULT_REFERENCE_TTL = 300.0
+
+STATUSES = "statuses"
+PRIORITIES = "priorities"
+ACCESS_LEVELS = "access_levels"
+
+_MODELS = {
+    STATUSES: Status,
+    PRIORITIES: Priority,
+    ACCESS_LEVELS: AccessLevel,
+}
+
+
+@dataclass
+class _Snapshot:
+    by_id: Dict[int, object] = field(default_factory=dict)
+    by_name: Dict[Tuple[str, Optional[str]], object] = field(default_factory=dict)
+    loaded_at: float = 0.0
+
+
+class ReferenceDataCache:
+    """In-process снимок маленьких справочников: statuses, priorities, access_levels.
+
+    Таблица загружается целиком при первом обращении. После истечения ttl секунд чтения
+    продолжают получать старый снимок, пока одна фоновая задача перечитывает таблицу, так что
+    ни один вызов не ждёт базу из-за ttl. Репозитории справочников, получившие этот кэш,
+    сбрасывают его после коммита create_*/update_*/delete_*: следующее чтение загрузит
+    таблицу заново и увидит изменение.
+    """
+
+    def __init__(self, async_session_factory, ttl: float = DEFAULT_REFERENCE_TTL):
+        self.async_session_factory = async_session_factory
+        self.ttl = ttl
+        self._snapshots: Dict[str, _Snapshot] = {}
+        self._generations: Dict[str, int] = {table: 0 for table in _MODELS}
+        self._locks: Dict[str, asyncio.Lock] = {table: asyncio.Lock() for table in _MODELS}
+        # Запущенные фоновые обновления по таблицам: не больше одного на таблицу
+        self._refreshes: Dict[str, asyncio.Task] = {}
+
+    def invalidate(self, table: Optional[str] = None):
+        """Сбрасываем снимок одной таблицы или всех справочников."""
+        for name in ([table] if table else list(_MODELS)):
+            self._snapshots.pop(name, None)
+            self._generations[name] += 1
+
+    async def refresh(self, table: Optional[str] = None):
+        """Принудительно перечитываем справочники из базы."""
+        self.invalidate(table)
+        for name in ([table] if table else list(_MODELS)):
+            await self._snapshot(name)
+
+    async def _snapshot(self, table: str) -> _Snapshot:
+        snapshot = self._snapshots.get(table)
+        if snapshot is not None:
+            if time.monotonic() - snapshot.loaded_at >= self.ttl:
+                self._schedule_refresh(table)
+            return snapshot
+        async with self._locks[table]:
+            snapshot = self._snapshots.get(table)
+            if snapshot is not None:
+                return snapshot
+            return await self._reload(table)
+
+    async def _reload(self, table: str) -> _Snapshot:
+        generation = self._generations[table]
+        snapshot = await self._load(table)
+        # Если во время загрузки таблицу изменили, снимок мог устареть — не сохраняем его
+        if generation == self._generations[table]:
+            self._snapshots[table] = snapshot
+        return snapshot
+
+    def _schedule_refresh(self, table: str):
+        if table in self._refreshes:
+            return
+        task = asyncio.ensure_future(self._background_refresh(table))
+        self._refreshes[table] = task
+        task.add_done_callback(functools.partial(self._refresh_done, table))
+
+    async def _background_refresh(self, table: str):
+        async with self._locks[table]:
+            snapshot = self._snapshots.get(table)
+            # Снимок уже перечитали или сбросили (его загрузит следующее чтение)
+            if snapshot is not None and time.monotonic() - snapshot.loaded_at >= self.ttl:
+                await self._reload(table)
+
+    def _refresh_done(self, table: str, task: asyncio.Task):
+        self._refreshes.pop(table, None)
+        # Ошибку фонового обновления не пробрасываем: остаётся старый снимок, следующее чтение повторит попытку
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, table: str) -> _Snapshot:
+        model = _MODELS[table]
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            result = await session.execute(select(model))
+            rows = result.scalars().all()
+        snapshot = _Snapshot(loaded_at=time.monotonic())
+        for row in rows:
+            snapshot.by_id[row.id] = row
+            key = (row.name, row.type if table == STATUSES else None)
+            snapshot.by_name.setdefault(key, row)
+        return snapshot
+
+    async def get_status(self, status_id: int) -> Optional[Status]:
+        """Получаем Status по id из снимка."""
+        return (await self._snapshot(STATUSES)).by_id.get(status_id)
+
+    async def get_status_by_name(self, name: str, type: Optional[str] = None) -> Optional[Status]:
+        """Получаем Status по имени и, если указан, типу ("project" или "task")."""
+        snapshot = await self._snapshot(STATUSES)
+        if type is not None:
+            return snapshot.by_name.get((name, type))
+        return next((status for status in snapshot.by_id.values() if status.name == name), None)
+
+    async def get_statuses(self, type: Optional[str] = None) -> List[Status]:
+        """Получаем все статусы, при необходимости только заданного типа."""
+        statuses = (await self._snapshot(STATUSES)).by_id.values()
+        return [status for status in statuses if type is None or status.type == type]
+
+    async def get_priority(self, priority_id: int) -> Optional[Priority]:
+        """Получаем Priority по id из снимка."""
+        return (await self._snapshot(PRIORITIES)).by_id.get(priority_id)
+
+    async def get_priority_by_name(self, name: str) -> Optional[Priority]:
+        """Получаем Priority по имени."""
+        return (await self._snapshot(PRIORITIES)).by_name.get((name, None))
+
+    async def get_priorities(self) -> List[Priority]:
+        """Получаем все приоритеты."""
+        return list((await self._snapshot(PRIORITIES)).by_id.values())
+
+    async def get_access_level(self, access_level_id: int) -> Optional[AccessLevel]:
+        """Получаем AccessLevel по id из снимка."""
+        return (await self._snapshot(ACCESS_LEVELS)).by_id.get(access_level_id)
+
+    async def get_access_level_by_name(self, name: str) -> Optional[AccessLevel]:
+        """Получаем AccessLevel по имени."""
+        return (await self._snapshot(ACCESS_LEVELS)).by_name.get((name, None))
+
+    async def get_access_levels(self) -> List[AccessLevel]:
+        """Получаем все уровни доступа."""
+        return list((await self._snapshot(ACCESS_LEVELS)).by_id.values())
@@ -1,12 +1,25 @@
 from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload
-from typing import List, Optional
+from typing import Iterable, List, Optional, Union
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from engene import session_scope
+from instrumentation import instrumented
 from models.report import Report
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
 
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "project",  # Подгружаем проект отчёта
+    ),
+}
 
+
+@instrumented
 class ReportRepository:
     """Класс для работы с сущностью Report, включающий методы для получения данных с и без связей"""
 
@@ -15,51 +28,88 @@ class ReportRepository:
 
     async def create_report(self, values: dict) -> Report:
         """Создаём новый Report."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(Report).values(**values).returning(Report)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(Report).values(**values).returning(Report)
+            result = await session.execute(stmt)
+            return result.scalar_one()
+
+    async def create_many_reports(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                  return_ids: bool = False) -> List:
+        """Создаём отчёты пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, Report, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            return created
 
     async def get_report_by_id(self, report_id: int) -> Optional[Report]:
         """Получаем Report по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Report).filter(Report.report_id == report_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Report).filter(Report.report_id == report_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_reports_by_ids(self, ids: List[int], with_relations: bool = False,
+                                 chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем отчёты по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, Report, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_report(self, report_id: int, values: dict):
         """Обновляем Report по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(Report).where(Report.report_id == report_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(Report).where(Report.report_id == report_id).values(**values)
+            await session.execute(stmt)
 
     async def delete_report(self, report_id: int):
         """Удаляем Report по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(Report).where(Report.report_id == report_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(Report).where(Report.report_id == report_id)
+            await session.execute(stmt)
 
     async def get_all_reports(self) -> List[Report]:
         """Получаем список всех отчетов без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Report)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_report_with_relations(self, report_id: int) -> Optional[Report]:
-        """Получаем Report со всеми связями, включая проект."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Report).filter(Report.report_id == report_id).options(
-                    joinedload(Report.project)  # Подгружаем проект отчёта
-                )
-                result = await session.execute(query)
-                return result.scalars().first()
\ No newline at end of file
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Report)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_reports_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                               filters: Optional[dict] = None) -> Page[Report]:
+        """Получаем страницу отчетов с keyset-пагинацией по (created_at, report_id)."""
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(select(Report), Report, filters)
+            return await paginate(session, query,
+                                  (Report.created_at, Report.report_id),
+                                  after=after, limit=limit)
+
+    async def get_report_with_relations(self, report_id: int,
+                                        include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                        collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[Report]:
+        """Получаем Report со всеми связями, включая проект.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(Report)
+                     .filter(Report.report_id == report_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            report = result.scalars().first()
+            await plan.load_collections(session, [report])
+            return report
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(Report, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
@@ -0,0 +1,312 @@
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import aggregate_order_by, case, delete, func, insert, select, union, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from engene import session_scope
+from instrumentation import instrumented
+from models.assigned import TaskAssigned
+from models.priorety import Priority
+from models.project import Project
+from models.report import Report, ReportChunk
+from models.status import Status
+from models.task import Task
+from models.user import User
+from repo.pagination import MAX_PAGE_LIMIT, paginate
+
+# Сколько символов копим в памяти перед записью куска отчёта в report_chunks
+DEFAULT_FLUSH_CHARS = 64 * 1024
+DEFAULT_REPORT_BATCH_SIZE = MAX_PAGE_LIMIT
+# Запас при выборке изменённых задач: транзакции, начатые до создания прошлого отчёта,
+# могли зафиксировать изменения уже после него
+INCREMENTAL_OVERLAP = timedelta(minutes=5)
+
+TASKS_SECTION = "== Tasks =="
+
+
+@dataclass
+class ReportBuildResult:
+    """Итог построения: id отчёта, число задач в нём и сколько из них перечитано из tasks."""
+    report_id: int
+    tasks: int = 0
+    reread: int = 0
+    incremental: bool = False
+
+
+def _one_line(value) -> str:
+    return " ".join(str(value).split())
+
+
+def _task_line(row) -> str:
+    deadline = row.deadline.strftime("%Y-%m-%d %H:%M") if row.deadline else "-"
+    return (f"#{row.task_id}\t{_one_line(row.status)}\t{_one_line(row.priority)}\t"
+            f"{_one_line(row.executor)}\t{deadline}\t{_one_line(row.title)}\n")
+
+
+def _task_id_of(line: str) -> int:
+    return int(line[1:line.index("\t")])
+
+
+async def _batches(session: AsyncSession, query, key_columns: Sequence, batch_size: int) -> AsyncIterator[List]:
+    """Читаем запрос keyset-порциями: в памяти не больше одной порции, курсор между запросами не держим."""
+    cursor = None
+    while True:
+        page = await paginate(session, query, key_columns, after=cursor, limit=batch_size, scalars=False)
+        if page.items:
+            yield page.items
+        if page.next_cursor is None:
+            return
+        cursor = page.next_cursor
+
+
+class _ContentWriter:
+    """Копим текст отчёта кусками не меньше flush_chars в report_chunks и собираем Report.content один раз.
+
+    Дописывание в саму строку отчёта переписывало бы всё значение content на каждый кусок
+    (O(N²) по объёму и N мёртвых версий строки); вставка куска стоит O(размера куска).
+    """
+
+    def __init__(self, session: AsyncSession, report_id: int, flush_chars: int):
+        self.session = session
+        self.report_id = report_id
+        self.flush_chars = flush_chars
+        self._buffer: List[str] = []
+        self._size = 0
+        self._seq = 0
+
+    async def write(self, text: str):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.flush_chars:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        chunk = "".join(self._buffer)
+        self._buffer, self._size = [], 0
+        await self.session.execute(insert(ReportChunk).values(report_id=self.report_id, seq=self._seq, content=chunk))
+        self._seq += 1
+
+    async def finish(self):
+        """Склеиваем куски в Report.content одним UPDATE и удаляем их."""
+        await self.flush()
+        chunks = ReportChunk.report_id == self.report_id
+        if self.session.get_bind().dialect.name == "postgresql":
+            body = select(aggregate_order_by(func.aggregate_strings(ReportChunk.content, ""), ReportChunk.seq))
+            body = body.filter(chunks)
+        else:
+            # SQLite до 3.44 не поддерживает ORDER BY в агрегате: group_concat идёт в порядке подзапроса
+            ordered = select(ReportChunk.content).filter(chunks).order_by(ReportChunk.seq).subquery()
+            body = select(func.aggregate_strings(ordered.c.content, ""))
+        await self.session.execute(update(Report)
+                                   .where(Report.report_id == self.report_id)
+                                   .values(content=func.coalesce(body.scalar_subquery(), ""))
+                                   .execution_options(synchronize_session=False))
+        await self.session.execute(delete(ReportChunk).where(chunks))
+
+
+@instrumented
+class ProjectReportBuilder:
+    """Строим текстовый отчёт по проекту прямо из SQL в Report.content с ограниченной памятью.
+
+    Отчёт состоит из сводки по статусам, списка просроченных задач, нагрузки на участников
+    (исполнитель и task_assigned) и списка задач. Сводки считаются GROUP BY в базе, списки
+    читаются keyset-порциями, а текст пишется кусками по flush_chars символов в report_chunks
+    и в конце одним UPDATE собирается в Report.content, поэтому в памяти процесса не бывает
+    ни всех задач, ни всего отчёта.
+
+    При incremental=True список задач собирается из прошлого отчёта проекта: заново читаются
+    только задачи с updated_at позже его created_at, остальные строки копируются. Имена
+    статусов, приоритетов и пользователей в скопированных строках не обновляются — после их
+    переименования нужен полный отчёт.
+    """
+
+    def __init__(self, async_session_factory, done_status_ids: Iterable[int] = (),
+                 batch_size: int = DEFAULT_REPORT_BATCH_SIZE, flush_chars: int = DEFAULT_FLUSH_CHARS):
+        self.async_session_factory = async_session_factory
+        # Задачи в этих статусах не считаются просроченными
+        self.done_status_ids = list(done_status_ids)
+        self.batch_size = batch_size
+        self.flush_chars = flush_chars
+
+    @staticmethod
+    def _task_lines_query(project_id: int):
+        return (select(Task.task_id, Task.title, Task.deadline, Status.name.label("status"),
+                       Priority.name.label("priority"), User.name.label("executor"))
+                .select_from(Task)
+                .join(Status, Status.id == Task.status_id)
+                .join(Priority, Priority.id == Task.priority_id)
+                .join(User, User.user_id == Task.executor_id)
+                .filter(Task.project_id == project_id))
+
+    def _overdue_filter(self, now: datetime):
+        condition = Task.deadline < now
+        if self.done_status_ids:
+            condition = condition & Task.status_id.not_in(self.done_status_ids)
+        return condition
+
+    async def _write_summary(self, session: AsyncSession, writer: _ContentWriter, project: Project, now: datetime):
+        totals = (await session.execute(
+            select(func.count(), func.coalesce(func.sum(case((self._overdue_filter(now), 1), else_=0)), 0))
+            .filter(Task.project_id == project.project_id)
+        )).one()
+        await writer.write(f"Project #{project.project_id}: {_one_line(project.title)}\n"
+                           f"Generated at {now:%Y-%m-%d %H:%M}\n"
+                           f"Tasks: {totals[0]}, overdue: {totals[1]}\n\n")
+
+        await writer.write("== Status ==\n")
+        by_status = (select(Status.name, func.count())
+                     .select_from(Task)
+                     .join(Status, Status.id == Task.status_id)
+                     .filter(Task.project_id == project.project_id)
+                     .group_by(Status.id, Status.name)
+                     .order_by(Status.id))
+        for name, count in (await session.execute(by_status)).all():
+            await writer.write(f"{_one_line(name)}: {count}\n")
+
+        await writer.write("\n== Overdue ==\n")
+        overdue = (select(Task.task_id, Task.title, Task.deadline)
+                   .filter(Task.project_id == project.project_id, self._overdue_filter(now)))
+        async for rows in _batches(session, overdue, (Task.deadline, Task.task_id), self.batch_size):
+            for row in rows:
+                await writer.write(f"#{row.task_id}\t{row.deadline:%Y-%m-%d %H:%M}\t{_one_line(row.title)}\n")
+
+        await writer.write("\n== Workload ==\n")
+        # Пара (задача, пользователь) без повторов: исполнитель и назначенные через task_assigned
+        members = union(
+            select(Task.task_id, Task.executor_id.label("user_id"))
+            .filter(Task.project_id == project.project_id),
+            select(Task.task_id, TaskAssigned.user_id)
+            .join(TaskAssigned, TaskAssigned.task_id == Task.task_id)
+            .filter(Task.project_id == project.project_id),
+        ).subquery()
+        workload = (select(User.name, func.count(),
+                           func.coalesce(func.sum(case((self._overdue_filter(now), 1), else_=0)), 0))
+                    .select_from(members)
+                    .join(User, User.user_id == members.c.user_id)
+                    .join(Task, Task.task_id == members.c.task_id)
+                    .group_by(User.user_id, User.name)
+                    .order_by(func.count().desc(), User.user_id))
+        for name, count, overdue_count in (await session.execute(workload)).all():
+            await writer.write(f"{_one_line(name)}: tasks {count}, overdue {overdue_count}\n")
+
+        await writer.write(f"\n{TASKS_SECTION}\n")
+
+    async def _previous_task_lines(self, session: AsyncSession, report_id: int) -> Optional[AsyncIterator]:
+        """Читаем строки списка задач прошлого отчёта кусками через substr; None, если раздела нет."""
+        marker = f"\n{TASKS_SECTION}\n"
+        if session.get_bind().dialect.name == "postgresql":
+            position = func.strpos(Report.content, marker)
+        else:
+            position = func.instr(Report.content, marker)
+        start = (await session.execute(
+            select(position).filter(Report.report_id == report_id)
+        )).scalar()
+        if not start:
+            return None
+        return self._read_lines(session, report_id, start + len(marker))
+
+    async def _read_lines(self, session: AsyncSession, report_id: int, offset: int) -> AsyncIterator[Tuple[int, str]]:
+        tail = ""
+        while True:
+            piece = (await session.execute(
+                select(func.substr(Report.content, offset, self.flush_chars)).filter(Report.report_id == report_id)
+            )).scalar() or ""
+            offset += len(piece)
+            lines = (tail + piece).split("\n")
+            tail = lines.pop()
+            for line in lines:
+                if line.startswith("#"):
+                    yield _task_id_of(line), line + "\n"
+            if len(piece) < self.flush_chars:
+                return
+
+    async def _write_tasks(self, session: AsyncSession, writer: _ContentWriter, project_id: int,
+                           result: ReportBuildResult):
+        async for rows in _batches(session, self._task_lines_query(project_id), (Task.task_id,), self.batch_size):
+            for row in rows:
+                await writer.write(_task_line(row))
+            result.tasks += len(rows)
+            result.reread += len(rows)
+
+    async def _merge_tasks(self, session: AsyncSession, writer: _ContentWriter, project_id: int,
+                           previous_lines: AsyncIterator, since: datetime, result: ReportBuildResult):
+        """Слияние по task_id трёх упорядоченных потоков: id задач проекта, изменённые задачи, прошлый список."""
+        changed_query = self._task_lines_query(project_id).filter(Task.updated_at > since)
+        changed = _batches(session, changed_query, (Task.task_id,), self.batch_size)
+        changed_rows, changed_done = deque(), False
+        previous = await anext(previous_lines, None)
+
+        ids = select(Task.task_id).filter(Task.project_id == project_id)
+        async for rows in _batches(session, ids, (Task.task_id,), self.batch_size):
+            # Строки порции в порядке task_id; вместо строки — task_id, если задачу нужно перечитать
+            lines, missing = [], []
+            for (task_id,) in rows:
+                if not changed_rows and not changed_done:
+                    batch = await anext(changed, None)
+                    changed_done = batch is None
+                    changed_rows.extend(batch or ())
+                if changed_rows and changed_rows[0].task_id == task_id:
+                    lines.append(_task_line(changed_rows.popleft()))
+                    result.reread += 1
+                    continue
+                while previous is not None and previous[0] < task_id:
+                    previous = await anext(previous_lines, None)
+                if previous is not None and previous[0] == task_id:
+                    lines.append(previous[1])
+                else:
+                    # Строки нет в прошлом отчёте (updated_at не менялся) — перечитаем одним запросом на порцию
+                    lines.append(task_id)
+                    missing.append(task_id)
+            reread = {}
+            if missing:
+                reread = {row.task_id: _task_line(row) for row in (await session.execute(
+                    self._task_lines_query(project_id).filter(Task.task_id.in_(missing))
+                )).all()}
+                result.reread += len(missing)
+            for line in lines:
+                await writer.write(reread[line] if isinstance(line, int) else line)
+            result.tasks += len(rows)
+
+    async def build(self, project_id: int, title: Optional[str] = None, incremental: bool = False,
+                    now: Optional[datetime] = None) -> ReportBuildResult:
+        """Строим новый отчёт по проекту одной транзакцией; при incremental=True — на основе прошлого."""
+        now = now or datetime.utcnow()
+        async with session_scope(self.async_session_factory) as session:
+            project = (await session.execute(
+                select(Project).filter(Project.project_id == project_id)
+            )).scalars().first()
+            if project is None:
+                raise ValueError(f"Project {project_id} does not exist")
+            previous = None
+            if incremental:
+                previous = (await session.execute(
+                    select(Report.report_id, Report.created_at)
+                    .filter(Report.project_id == project_id)
+                    .order_by(Report.created_at.desc(), Report.report_id.desc())
+                    .limit(1)
+                )).first()
+
+            report_id = (await session.execute(
+                insert(Report)
+                .values(title=title or f"Project report {now:%Y-%m-%d %H:%M}", project_id=project_id,
+                        content="")
+                .returning(Report.report_id)
+            )).scalar_one()
+            result = ReportBuildResult(report_id)
+            writer = _ContentWriter(session, report_id, self.flush_chars)
+            await self._write_summary(session, writer, project, now)
+
+            previous_lines = await self._previous_task_lines(session, previous.report_id) if previous else None
+            if previous_lines is None:
+                await self._write_tasks(session, writer, project_id, result)
+            else:
+                result.incremental = True
+                await self._merge_tasks(session, writer, project_id, previous_lines,
+                                        previous.created_at - INCREMENTAL_OVERLAP, result)
+            await writer.finish()
+            return result
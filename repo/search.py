@@ -0,0 +1,150 @@
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import column, func, literal, literal_column, or_, select, table, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from engene import session_scope
+from instrumentation import instrumented
+from models.chat import Chat
+from models.comment import Comment
+from models.message import Message
+from models.search import SEARCH_CONFIG, SEARCH_SCOPES
+from models.task import Task
+from repo.pagination import Page, paginate
+
+DEFAULT_SEARCH_LIMIT = 20
+SNIPPET_WORDS = 12
+HIGHLIGHT_START = "<b>"
+HIGHLIGHT_STOP = "</b>"
+
+
+@dataclass
+class SearchHit:
+    """Найденный объект: область поиска, id, релевантность и фрагмент текста с подсветкой."""
+    scope: str
+    id: int
+    rank: float
+    snippet: str = ""
+
+
+def _fts_match(query: str) -> str:
+    """Превращаем ввод пользователя в безопасный запрос FTS5: каждое слово — фраза в кавычках, все через AND."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def _primary_key(model):
+    return model.__table__.primary_key.columns.values()[0]
+
+
+def _project_filter(scope: str, project_id: int):
+    """Ограничиваем область поиска проектом: задачи проекта, их комментарии и сообщения их чатов."""
+    project_tasks = select(Task.task_id).filter(Task.project_id == project_id)
+    if scope == "tasks":
+        return Task.project_id == project_id
+    if scope == "comments":
+        return or_(Comment.project_id == project_id, Comment.task_id.in_(project_tasks))
+    project_chats = select(Chat.chat_id).filter(or_(Chat.project_id == project_id, Chat.task_id.in_(project_tasks)))
+    return Message.chat_id.in_(project_chats)
+
+
+@instrumented
+class SearchRepository:
+    """Полнотекстовый поиск по задачам, комментариям и сообщениям.
+
+    На Postgres используется генерируемая колонка search_vector с GIN-индексом, на SQLite —
+    FTS5-таблицы <table>_fts (см. models/search.py), поэтому поиск не сканирует таблицы через ILIKE.
+    """
+
+    def __init__(self, async_session_factory):
+        self.async_session_factory = async_session_factory
+
+    @staticmethod
+    def _postgresql_hits(scope: str, query: str):
+        model, _ = SEARCH_SCOPES[scope]
+        vector = literal_column(f"{model.__tablename__}.search_vector")
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        return (select(literal(scope).label("scope"), _primary_key(model).label("id"),
+                       func.ts_rank_cd(vector, tsquery).label("rank"))
+                .select_from(model)
+                .filter(vector.op("@@")(tsquery)))
+
+    @staticmethod
+    def _sqlite_hits(scope: str, query: str):
+        model, columns = SEARCH_SCOPES[scope]
+        fts_name = f"{model.__tablename__}_fts"
+        fts = table(fts_name, column("rowid"))
+        # Веса колонок для bm25: первая колонка (например, title) важнее следующих
+        weights = [float(len(columns) - index) for index in range(len(columns))]
+        # bm25 тем меньше, чем релевантнее, поэтому меняем знак
+        rank = -func.bm25(literal_column(fts_name), *weights)
+        return (select(literal(scope).label("scope"), _primary_key(model).label("id"), rank.label("rank"))
+                .select_from(fts)
+                .join(model, _primary_key(model) == fts.c.rowid)
+                .filter(literal_column(fts_name).op("MATCH")(_fts_match(query))))
+
+    @staticmethod
+    async def _snippets(session: AsyncSession, dialect: str, query: str,
+                        hits: List[SearchHit]) -> Dict[Tuple[str, int], str]:
+        snippets = {}
+        ids_by_scope: Dict[str, List[int]] = {}
+        for hit in hits:
+            ids_by_scope.setdefault(hit.scope, []).append(hit.id)
+        for scope, ids in ids_by_scope.items():
+            model, columns = SEARCH_SCOPES[scope]
+            pk = _primary_key(model)
+            if dialect == "postgresql":
+                content = func.concat_ws(" ", *(getattr(model, name) for name in columns))
+                options = (f"MaxWords={SNIPPET_WORDS}, MinWords=3, MaxFragments=1, "
+                           f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}")
+                tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+                snippet = func.ts_headline(SEARCH_CONFIG, content, tsquery, options)
+                stmt = select(pk, snippet).filter(pk.in_(ids))
+            else:
+                fts_name = f"{model.__tablename__}_fts"
+                fts = table(fts_name, column("rowid"))
+                snippet = func.snippet(literal_column(fts_name), -1, HIGHLIGHT_START, HIGHLIGHT_STOP, "…",
+                                       SNIPPET_WORDS)
+                stmt = (select(fts.c.rowid, snippet)
+                        .select_from(fts)
+                        .filter(literal_column(fts_name).op("MATCH")(_fts_match(query)), fts.c.rowid.in_(ids)))
+            for object_id, fragment in (await session.execute(stmt)).all():
+                snippets[(scope, object_id)] = fragment
+        return snippets
+
+    async def search(self, query: str, scopes: Iterable[str] = tuple(SEARCH_SCOPES), project_id: Optional[int] = None,
+                     cursor: Optional[str] = None, limit: int = DEFAULT_SEARCH_LIMIT) -> Page[SearchHit]:
+        """Ищем query в областях scopes ("tasks", "comments", "messages"), по убыванию релевантности.
+
+        project_id ограничивает поиск задачами проекта, их комментариями и сообщениями их чатов.
+        Страницы листаются курсором по (rank, scope, id); фрагменты с подсветкой строятся
+        только для найденных на странице объектов.
+        """
+        scopes = list(dict.fromkeys(scopes))
+        unknown = [scope for scope in scopes if scope not in SEARCH_SCOPES]
+        if unknown:
+            raise ValueError(f"Unknown search scopes: {', '.join(unknown)}")
+        if not query.strip() or not scopes:
+            return Page()
+
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            dialect = session.get_bind().dialect.name
+            if dialect == "postgresql":
+                build = self._postgresql_hits
+            elif dialect == "sqlite":
+                build = self._sqlite_hits
+            else:
+                raise NotImplementedError(f"Full-text search is not supported for dialect {dialect!r}")
+            arms = []
+            for scope in scopes:
+                arm = build(scope, query)
+                if project_id is not None:
+                    arm = arm.filter(_project_filter(scope, project_id))
+                arms.append(arm)
+            hits = union_all(*arms).subquery("hits")
+            page = await paginate(session, select(hits), (hits.c.rank, hits.c.scope, hits.c.id), after=cursor,
+                                  limit=limit, descending=True, scalars=False)
+            items = [SearchHit(row.scope, row.id, row.rank) for row in page.items]
+            snippets = await self._snippets(session, dialect, query, items)
+            items = [replace(hit, snippet=snippets.get((hit.scope, hit.id), "")) for hit in items]
+            return Page(items=items, next_cursor=page.next_cursor)
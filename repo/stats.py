@@ -0,0 +1,130 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, func, literal, null, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from engene import session_scope
+from instrumentation import instrumented
+from models.task import Task
+from repo.bulk import chunked
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE
+
+BY_STATUS = "status"
+BY_PRIORITY = "priority"
+BY_EXECUTOR = "executor"
+OVERDUE = "overdue"
+
+# GROUPING(status_id, priority_id, executor_id) для каждого набора группировки: бит 1 — колонка не входит в набор
+_GROUPING_KINDS = {0b011: BY_STATUS, 0b101: BY_PRIORITY, 0b110: BY_EXECUTOR, 0b111: OVERDUE}
+
+
+@dataclass
+class ProjectStats:
+    """Сводка по задачам проекта: {id: число задач} по статусам, приоритетам и исполнителям."""
+    project_id: int
+    total: int = 0
+    by_status: Dict[int, int] = field(default_factory=dict)
+    by_priority: Dict[int, int] = field(default_factory=dict)
+    by_executor: Dict[int, int] = field(default_factory=dict)
+    overdue: int = 0
+
+
+@instrumented
+class ProjectStatsRepository:
+    """Агрегаты для дашборда проектов, считаемые в базе одним GROUP BY-запросом.
+
+    На Postgres все разрезы считаются за один проход по задачам (GROUP BY GROUPING SETS),
+    на остальных базах — UNION ALL из отдельных GROUP BY.
+    """
+
+    def __init__(self, async_session_factory):
+        self.async_session_factory = async_session_factory
+
+    @staticmethod
+    def _stats_query(project_ids: List[int], now: datetime, done_status_ids: List[int]):
+        in_projects = Task.project_id.in_(project_ids)
+
+        def breakdown(kind: str, column):
+            return (select(literal(kind).label("kind"), Task.project_id, column.label("key"),
+                           func.count().label("count"))
+                    .filter(in_projects)
+                    .group_by(Task.project_id, column))
+
+        overdue = (select(literal(OVERDUE).label("kind"), Task.project_id, null().label("key"),
+                          func.count().label("count"))
+                   .filter(in_projects, Task.deadline < now)
+                   .group_by(Task.project_id))
+        if done_status_ids:
+            overdue = overdue.filter(Task.status_id.not_in(done_status_ids))
+        return union_all(
+            breakdown(BY_STATUS, Task.status_id),
+            breakdown(BY_PRIORITY, Task.priority_id),
+            breakdown(BY_EXECUTOR, Task.executor_id),
+            overdue,
+        )
+
+    @staticmethod
+    def _grouping_sets_query(project_ids: List[int], now: datetime, done_status_ids: List[int]):
+        overdue = Task.deadline < now
+        if done_status_ids:
+            overdue = and_(overdue, Task.status_id.not_in(done_status_ids))
+        return (select(Task.project_id, Task.status_id, Task.priority_id, Task.executor_id,
+                       func.grouping(Task.status_id, Task.priority_id, Task.executor_id).label("grouping_set"),
+                       func.count().label("count"),
+                       func.count(case((overdue, 1))).label("overdue"))
+                .filter(Task.project_id.in_(project_ids))
+                .group_by(func.grouping_sets(tuple_(Task.project_id, Task.status_id),
+                                             tuple_(Task.project_id, Task.priority_id),
+                                             tuple_(Task.project_id, Task.executor_id),
+                                             tuple_(Task.project_id))))
+
+    async def _fetch(self, session: AsyncSession, project_ids: List[int], now: datetime,
+                     done_status_ids: List[int]) -> List[tuple]:
+        """Строки агрегатов вида (разрез, project_id, ключ, число) независимо от диалекта."""
+        if session.get_bind().dialect.name != "postgresql":
+            return (await session.execute(self._stats_query(project_ids, now, done_status_ids))).all()
+        rows = []
+        result = await session.execute(self._grouping_sets_query(project_ids, now, done_status_ids))
+        for project_id, status_id, priority_id, executor_id, grouping, count, overdue in result.all():
+            kind = _GROUPING_KINDS[grouping]
+            if kind == OVERDUE:
+                rows.append((kind, project_id, None, overdue))
+            else:
+                key = {BY_STATUS: status_id, BY_PRIORITY: priority_id, BY_EXECUTOR: executor_id}[kind]
+                rows.append((kind, project_id, key, count))
+        return rows
+
+    async def get_projects_stats(self, project_ids: Iterable[int], now: Optional[datetime] = None,
+                                 done_status_ids: Iterable[int] = ()) -> Dict[int, ProjectStats]:
+        """Получаем сводки по задачам нескольких проектов одним запросом на кусок project_id.
+
+        Просроченной считается задача с deadline < now, статус которой не входит в done_status_ids.
+        Проекты без задач возвращаются с нулевой сводкой.
+        """
+        now = now or datetime.utcnow()
+        done_status_ids = list(done_status_ids)
+        project_ids = list(dict.fromkeys(project_ids))
+        stats = {project_id: ProjectStats(project_id) for project_id in project_ids}
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            for chunk in chunked(project_ids, DEFAULT_LOOKUP_CHUNK_SIZE):
+                for kind, project_id, key, count in await self._fetch(session, list(chunk), now,
+                                                                      done_status_ids):
+                    project_stats = stats[project_id]
+                    if kind == BY_STATUS:
+                        project_stats.by_status[key] = count
+                        project_stats.total += count
+                    elif kind == BY_PRIORITY:
+                        project_stats.by_priority[key] = count
+                    elif kind == BY_EXECUTOR:
+                        project_stats.by_executor[key] = count
+                    else:
+                        project_stats.overdue = count
+        return stats
+
+    async def get_project_stats(self, project_id: int, now: Optional[datetime] = None,
+                                done_status_ids: Iterable[int] = ()) -> ProjectStats:
+        """Получаем сводку по задачам одного проекта."""
+        stats = await self.get_projects_stats([project_id], now=now, done_status_ids=done_status_ids)
+        return stats[project_id]
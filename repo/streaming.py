@@ -0,0 +1,29 @@
+from typing import AsyncIterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def stream_select(model, as_rows: bool = False):
+    """Строим select для потокового чтения: ORM-объекты или простые строки таблицы."""
+    return select(*model.__table__.c) if as_rows else select(model)
+
+
+async def stream_query(session: AsyncSession, query, batch_size: int = DEFAULT_BATCH_SIZE,
+                       as_rows: bool = False, batched: bool = False) -> AsyncIterator:
+    """Читаем результат запроса через серверный курсор порциями по batch_size строк.
+
+    В памяти одновременно находится не больше одной порции. При batched=True отдаём списки
+    (порции целиком), иначе — по одному объекту/строке.
+    """
+    result = await session.stream(query.execution_options(yield_per=batch_size))
+    if not as_rows:
+        result = result.scalars()
+    async for partition in result.partitions(batch_size):
+        if batched:
+            yield list(partition)
+        else:
+            for item in partition:
+                yield item
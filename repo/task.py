@@ -1,72 +1,170 @@
 from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload, selectinload
-from typing import List, Optional
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Union
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from engene import session_scope
+from instrumentation import instrumented
 from models.task import Task
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.counters import apply_task_changes, task_counter_key
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
+from repo.projection import project_page, projection_select
+from repo.streaming import DEFAULT_BATCH_SIZE, stream_query, stream_select
 
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "priority",  # Подгружаем приоритет задачи
+        "status",  # Подгружаем статус задачи
+        "executor",  # Подгружаем исполнителя задачи
+        "project",  # Подгружаем проект задачи
+        "chat",  # Подгружаем чат задачи
+        "assigned_users",  # Подгружаем назначенных пользователей
+    ),
+    "card": ("status", "priority", "executor"),  # Карточка задачи без коллекций
+}
 
+
+@instrumented
 class TaskRepository:
     """Класс для работы с сущностью Task, включающий методы для получения данных с и без связей"""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, project_counters: bool = False):
         self.async_session_factory = async_session_factory
+        # При project_counters=True счётчики проектов (project_counters) обновляются при записи
+        self.project_counters = project_counters
 
     async def create_task(self, values: dict) -> Task:
         """Создаём новый Task."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(Task).values(**values).returning(Task)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(Task).values(**values).returning(Task)
+            result = await session.execute(stmt)
+            task = result.scalar_one()
+            if self.project_counters:
+                await apply_task_changes(session, added=[task_counter_key(task)])
+            return task
+
+    async def create_many_tasks(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                return_ids: bool = False) -> List:
+        """Создаём задачи пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, Task, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            if self.project_counters:
+                await apply_task_changes(session, added=[
+                    (values["project_id"], values["status_id"]) for values in values_list
+                ])
+            return created
 
     async def get_task_by_id(self, task_id: int) -> Optional[Task]:
         """Получаем Task по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Task).filter(Task.task_id == task_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Task).filter(Task.task_id == task_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_tasks_by_ids(self, ids: List[int], with_relations: bool = False,
+                               chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем задачи по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, Task, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_task(self, task_id: int, values: dict):
         """Обновляем Task по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(Task).where(Task.task_id == task_id).values(**values)
+        async with session_scope(self.async_session_factory) as session:
+            before = None
+            if self.project_counters:
+                result = await session.execute(
+                    select(Task.project_id, Task.status_id)
+                    .filter(Task.task_id == task_id)
+                    .with_for_update()
+                )
+                before = result.one_or_none()
+            stmt = update(Task).where(Task.task_id == task_id).values(**values)
+            if before is None:
                 await session.execute(stmt)
-                await session.commit()
+                return
+            result = await session.execute(stmt.returning(Task.project_id, Task.status_id))
+            after = result.one()
+            if tuple(after) != tuple(before):
+                await apply_task_changes(session, removed=[task_counter_key(before)],
+                                         added=[task_counter_key(after)])
 
     async def delete_task(self, task_id: int):
         """Удаляем Task по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(Task).where(Task.task_id == task_id)
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(Task).where(Task.task_id == task_id)
+            if not self.project_counters:
                 await session.execute(stmt)
-                await session.commit()
+                return
+            result = await session.execute(stmt.returning(Task.project_id, Task.status_id))
+            deleted = result.one_or_none()
+            if deleted is not None:
+                await apply_task_changes(session, removed=[task_counter_key(deleted)])
 
     async def get_all_tasks(self) -> List[Task]:
         """Получаем список всех задач без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(Task)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_task_with_relations(self, task_id: int) -> Optional[Task]:
-        """Получаем Task со всеми связями."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(Task)
-                .filter(Task.task_id == task_id)
-                .options(
-                    joinedload(Task.priority),  # Подгружаем приоритет задачи
-                    joinedload(Task.status),  # Подгружаем статус задачи
-                    joinedload(Task.executor),  # Подгружаем исполнителя задачи
-                    joinedload(Task.project),  # Подгружаем проект задачи
-                    joinedload(Task.chat),  # Подгружаем чат задачи
-                    selectinload(Task.assigned_users)  # Подгружаем назначенных пользователей
-                ))
-                result = await session.execute(query)
-                return result.scalars().first()
\ No newline at end of file
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Task)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_tasks_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                             filters: Optional[dict] = None, fields: Optional[Sequence[str]] = None) -> Page:
+        """Получаем страницу задач с keyset-пагинацией по (task_id).
+
+        При fields выбираются только эти колонки (плюс ключ пагинации), а элементы страницы —
+        неизменяемые read-модели без состояния сессии вместо ORM-объектов.
+        """
+        key_columns = (Task.task_id,)
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(Task) if fields is None else projection_select(Task, fields, key_columns)
+            query = apply_filters(query, Task, filters)
+            page = await paginate(session, query, key_columns, after=after, limit=limit, scalars=fields is None)
+            return project_page(Task, page, fields)
+
+    async def iter_tasks(self, batch_size: int = DEFAULT_BATCH_SIZE, as_rows: bool = False,
+                         batched: bool = False, filters: Optional[dict] = None) -> AsyncIterator:
+        """Потоково проходим по всем задачам через серверный курсор с ограниченной памятью.
+
+        as_rows=True отдаёт простые строки вместо ORM-объектов, batched=True — порции по batch_size.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = apply_filters(stream_select(Task, as_rows), Task, filters).order_by(Task.task_id)
+            async for item in stream_query(session, query, batch_size, as_rows=as_rows, batched=batched):
+                yield item
+
+    async def get_task_with_relations(self, task_id: int,
+                                      include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                      collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[Task]:
+        """Получаем Task со всеми связями.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(Task)
+                     .filter(Task.task_id == task_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            task = result.scalars().first()
+            await plan.load_collections(session, [task])
+            return task
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(Task, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
@@ -0,0 +1,243 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from engene import session_scope
+from instrumentation import instrumented
+from models.assigned import ProjectAssigned, TaskAssigned
+from models.chat import Chat
+from models.comment import Comment
+from models.message import Message
+from models.project import Project
+from models.report import Report
+from models.task import Task
+from repo.counters import recount_project_counters, store_project_counters
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Таблицы графа проекта в порядке вставки (сначала те, на кого ссылаются)
+GRAPH_MODELS = (Project, Task, TaskAssigned, ProjectAssigned, Chat, Message, Comment, Report)
+
+# Ссылки на строки графа без внешнего ключа: (таблица, колонка) -> таблица
+EXTRA_REFERENCES = {
+    ("chats", "last_message_id"): "messages",
+}
+
+
+@dataclass
+class TransferResult:
+    """Итог экспорта или импорта: id проекта и число строк по таблицам."""
+    project_id: int
+    rows: Dict[str, int] = field(default_factory=dict)
+
+
+def _graph_filters(project_id: int) -> Dict[str, object]:
+    """Условия отбора строк графа проекта для каждой таблицы."""
+    tasks = select(Task.task_id).filter(Task.project_id == project_id)
+    chats = select(Chat.chat_id).filter(or_(Chat.project_id == project_id, Chat.task_id.in_(tasks)))
+    return {
+        "projects": Project.project_id == project_id,
+        "tasks": Task.project_id == project_id,
+        "task_assigned": TaskAssigned.task_id.in_(tasks),
+        "project_assigned": ProjectAssigned.project_id == project_id,
+        "chats": or_(Chat.project_id == project_id, Chat.task_id.in_(tasks)),
+        "messages": Message.chat_id.in_(chats),
+        "comments": or_(Comment.project_id == project_id, Comment.task_id.in_(tasks)),
+        "reports": Report.project_id == project_id,
+    }
+
+
+def _own_key(model) -> Optional[str]:
+    """Имя суррогатного первичного ключа, который переназначается при импорте (None для связующих таблиц)."""
+    pk = list(model.__table__.primary_key.columns)
+    return pk[0].name if len(pk) == 1 else None
+
+
+def _references(model) -> Dict[str, str]:
+    """Колонки, ссылающиеся на другие таблицы графа: {колонка: таблица}."""
+    graph = {graph_model.__tablename__ for graph_model in GRAPH_MODELS}
+    references = {fk.parent.name: fk.column.table.name for fk in model.__table__.foreign_keys
+                  if fk.column.table.name in graph}
+    references.update({column: target for (table, column), target in EXTRA_REFERENCES.items()
+                       if table == model.__tablename__})
+    return references
+
+
+def _copy_count(status: str) -> int:
+    """Число строк из статуса команды COPY ("COPY 123")."""
+    return int(status.split()[-1])
+
+
+def _require_postgresql(session: AsyncSession):
+    if session.get_bind().dialect.name != "postgresql":
+        raise NotImplementedError("Project transfer uses COPY and requires PostgreSQL")
+
+
+async def _driver_connection(session: AsyncSession):
+    """Соединение asyncpg текущей транзакции сессии (для COPY)."""
+    _require_postgresql(session)
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+    return raw.driver_connection
+
+
+@instrumented
+class ProjectTransferRepository:
+    """Перенос проекта целиком между базами через COPY в CSV-файлы и обратно.
+
+    Экспорт пишет каталог с файлом <table>.csv на каждую таблицу графа (проект, задачи,
+    назначения, чаты, сообщения, комментарии, отчёты) и manifest.json. Импорт загружает файлы
+    COPY во временные таблицы, выдаёт новые id из последовательностей и переносит строки
+    одним INSERT ... SELECT на таблицу с заменой ссылок. Данные не проходят через память
+    процесса ни при экспорте, ни при импорте.
+
+    Пользователи, статусы и приоритеты не переносятся: в целевой базе должны быть строки с
+    теми же id.
+    """
+
+    def __init__(self, async_session_factory, project_counters: bool = False):
+        self.async_session_factory = async_session_factory
+        # При project_counters=True после импорта считаем счётчики нового проекта
+        self.project_counters = project_counters
+
+    def _export_session(self) -> AsyncSession:
+        """Отдельная сессия экспорта, даже внутри UnitOfWork.
+
+        Уровень изоляции задаётся до первого оператора транзакции, а у общей сессии UnitOfWork
+        соединение и транзакция уже открыты — снимок не был бы согласованным.
+        """
+        if hasattr(self.async_session_factory, "for_read"):
+            return self.async_session_factory.for_read()
+        return self.async_session_factory()
+
+    async def export_project(self, project_id: int, directory: str) -> TransferResult:
+        """Выгружаем граф проекта в каталог directory одним согласованным снимком (REPEATABLE READ)."""
+        result = TransferResult(project_id)
+        manifest = {"version": MANIFEST_VERSION, "project_id": project_id, "format": "csv", "tables": {}}
+        async with self._export_session() as session, session.begin():
+            _require_postgresql(session)
+            await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            # Первый оператор через сессию открывает транзакцию, в которой затем работает COPY
+            exists = (await session.execute(
+                select(Project.project_id).filter(Project.project_id == project_id)
+            )).scalar()
+            if exists is None:
+                raise ValueError(f"Project {project_id} does not exist")
+            driver = await _driver_connection(session)
+            filters = _graph_filters(project_id)
+            os.makedirs(directory, exist_ok=True)
+            for model in GRAPH_MODELS:
+                table = model.__tablename__
+                columns = [column.name for column in model.__table__.c]
+                query = select(*model.__table__.c).filter(filters[table])
+                sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+                status = await driver.copy_from_query(sql, output=os.path.join(directory, f"{table}.csv"),
+                                                      format="csv", header=True)
+                result.rows[table] = _copy_count(status)
+                manifest["tables"][table] = {"columns": columns, "rows": result.rows[table]}
+        with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2)
+        return result
+
+    @staticmethod
+    def _insert_sql(model, columns: List[str], title_override: bool) -> str:
+        """INSERT ... SELECT из временной таблицы с заменой id и ссылок через таблицы соответствия."""
+        table = model.__tablename__
+        own_key = _own_key(model)
+        references = _references(model)
+        expressions, joins = [], []
+        for name in columns:
+            if name == own_key:
+                expressions.append("own.new_id")
+            elif name in references:
+                alias = f"ref_{name}"
+                expressions.append(f"{alias}.new_id")
+                joins.append(f"LEFT JOIN import_map_{references[name]} {alias} ON {alias}.old_id = src.{name}")
+            elif title_override and table == "projects" and name == "title":
+                expressions.append(":title")
+            else:
+                expressions.append(f"src.{name}")
+        if own_key is not None:
+            joins.insert(0, f"JOIN import_map_{table} own ON own.old_id = src.{own_key}")
+        return (f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"SELECT {', '.join(expressions)} FROM import_{table} src {' '.join(joins)}")
+
+    @staticmethod
+    async def _check_references(session: AsyncSession, plan: List[tuple]):
+        """Проверяем, что все ссылки внутри выгрузки ведут на строки этой же выгрузки.
+
+        Иначе INSERT ... SELECT молча записал бы NULL (например, чат проекта, привязанный к задаче
+        другого проекта); импорт прерываем с числом таких ссылок по колонкам.
+        """
+        unmapped = {}
+        for model, columns in plan:
+            table = model.__tablename__
+            for name, target in _references(model).items():
+                if name not in columns:
+                    continue
+                count = (await session.execute(text(
+                    f"SELECT count(*) FROM import_{table} src WHERE src.{name} IS NOT NULL AND NOT EXISTS "
+                    f"(SELECT 1 FROM import_map_{target} mapped WHERE mapped.old_id = src.{name})"
+                ))).scalar_one()
+                if count:
+                    unmapped[f"{table}.{name}"] = count
+        if unmapped:
+            details = ", ".join(f"{column}: {count}" for column, count in unmapped.items())
+            raise ValueError(f"Export references rows outside the project graph ({details})")
+
+    async def import_project(self, directory: str, title: Optional[str] = None) -> TransferResult:
+        """Загружаем выгруженный проект как новый; возвращаем его id. Всё выполняется одной транзакцией.
+
+        Если строки выгрузки ссылаются на строки вне её графа, импорт прерывается с ValueError.
+        """
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as file:
+            manifest = json.load(file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported export version: {manifest.get('version')!r}")
+
+        async with session_scope(self.async_session_factory) as session:
+            _require_postgresql(session)
+            plan = []
+            for model in GRAPH_MODELS:
+                table = model.__tablename__
+                columns = manifest["tables"][table]["columns"]
+                unknown = [name for name in columns if name not in model.__table__.c]
+                if unknown:
+                    raise ValueError(f"Unknown columns for {table}: {', '.join(unknown)}")
+                plan.append((model, columns))
+                # Первый оператор через сессию открывает транзакцию, в которой затем работает COPY
+                await session.execute(text(f"DROP TABLE IF EXISTS pg_temp.import_{table}"))
+                await session.execute(text(f"CREATE TEMP TABLE import_{table} ON COMMIT DROP AS "
+                                           f"SELECT {', '.join(columns)} FROM {table} WITH NO DATA"))
+
+            driver = await _driver_connection(session)
+            for model, columns in plan:
+                table = model.__tablename__
+                await driver.copy_to_table(f"import_{table}", source=os.path.join(directory, f"{table}.csv"),
+                                           columns=columns, format="csv", header=True)
+                own_key = _own_key(model)
+                if own_key is None:
+                    continue
+                await session.execute(text(f"DROP TABLE IF EXISTS pg_temp.import_map_{table}"))
+                await session.execute(text(f"CREATE TEMP TABLE import_map_{table} "
+                                           f"(old_id bigint PRIMARY KEY, new_id bigint NOT NULL) ON COMMIT DROP"))
+                await session.execute(text(f"INSERT INTO import_map_{table} (old_id, new_id) "
+                                           f"SELECT {own_key}, nextval(pg_get_serial_sequence('{table}', '{own_key}')) "
+                                           f"FROM import_{table}"))
+
+            await self._check_references(session, plan)
+            rows = {}
+            for model, columns in plan:
+                params = {"title": title} if title is not None and model is Project else {}
+                inserted = await session.execute(text(self._insert_sql(model, columns, bool(params))), params)
+                rows[model.__tablename__] = inserted.rowcount
+            project_id = (await session.execute(text("SELECT new_id FROM import_map_projects"))).scalar_one()
+            if self.project_counters:
+                await store_project_counters(session, (await recount_project_counters(session, [project_id])).values())
+            return TransferResult(project_id, rows)
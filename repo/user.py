@@ -1,71 +1,217 @@
-from sqlalchemy import select, insert, update, delete
-from sqlalchemy.orm import joinedload, selectinload
-from typing import List, Optional
+from sqlalchemy import select, insert, update, delete, func, or_, union_all
+from typing import Iterable, List, Optional, Sequence, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.user import User
+from engene import after_commit, session_scope
+from instrumentation import instrumented
+from models.assigned import ProjectAssigned
+from models.user import AUTOCOMPLETE_COLUMNS, User, with_lowered_columns
+from repo.bulk import DEFAULT_CHUNK_SIZE, insert_many
+from repo.loading import DEFAULT_COLLECTION_LIMIT, FULL_PROFILE, LoadPlan
+from repo.lookup import DEFAULT_LOOKUP_CHUNK_SIZE, LookupResult, fetch_by_ids
+from repo.pagination import DEFAULT_PAGE_LIMIT, Page, apply_filters, paginate
+from repo.prefix_cache import PrefixCache
+from repo.projection import project_page, projection_select, to_read_models
+from repo.permissions import PermissionMatrix
 
+DEFAULT_AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+# Колонки, которые возвращает автодополнение
+AUTOCOMPLETE_FIELDS = ("user_id", "name", "email", "avatar")
 
+# Профили загрузки связей для get_*_with_relations(include=...)
+LOAD_PROFILES = {
+    FULL_PROFILE: (
+        "role",  # Подгружаем роль пользователя
+        "projects_owned",  # Подгружаем проекты пользователя
+        "notifications",  # Подгружаем уведомления пользователя
+        "messages",  # Подгружаем сообщения пользователя
+        "project_assigned",  # Подгружаем проекты, на которые пользователь назначен
+        "tasks_assigned",  # Подгружаем задачи, на которые пользователь назначен
+    ),
+    "card": ("role",),  # Карточка пользователя: только роль
+}
+
+
+@instrumented
 class UserRepository:
     """Класс для работы с сущностью User, включающий методы для получения данных с и без связей"""
 
-    def __init__(self, async_session_factory):
+    def __init__(self, async_session_factory, permission_matrix: Optional[PermissionMatrix] = None,
+                 autocomplete_cache: Optional[PrefixCache] = None, fuzzy_autocomplete: bool = False):
         self.async_session_factory = async_session_factory
+        # Матрица прав, которую нужно сбрасывать при изменении роли пользователя
+        self.permission_matrix = permission_matrix
+        # Кэш автодополнения, который нужно сбрасывать при изменении пользователей
+        self.autocomplete_cache = autocomplete_cache
+        # Нечёткий добор по триграммам; требует pg_trgm (models.user.install_autocomplete_trigram)
+        self.fuzzy_autocomplete = fuzzy_autocomplete
+
+    def _invalidate_user_role(self, user_id: int):
+        """Сбрасываем закэшированную в PermissionMatrix роль пользователя."""
+        if self.permission_matrix is not None:
+            self.permission_matrix.invalidate_user(user_id)
+
+    def _invalidate_autocomplete_cache(self):
+        """Сбрасываем кэш автодополнения после изменения пользователей."""
+        if self.autocomplete_cache is not None:
+            self.autocomplete_cache.invalidate()
 
     async def create_user(self, values: dict) -> User:
         """Создаём нового User."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = insert(User).values(**values).returning(User)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar_one()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = insert(User).values(**values).returning(User)
+            result = await session.execute(stmt)
+            after_commit(session, self._invalidate_autocomplete_cache)
+            return result.scalar_one()
+
+    async def create_many_users(self, values_list: List[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                return_ids: bool = False) -> List:
+        """Создаём пользователей пачкой в одной транзакции; возвращаем объекты или только их id."""
+        async with session_scope(self.async_session_factory) as session:
+            created = await insert_many(session, User, values_list, chunk_size=chunk_size,
+                                        return_ids=return_ids)
+            after_commit(session, self._invalidate_autocomplete_cache)
+            return created
 
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         """Получаем User по id без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(User).filter(User.user_id == user_id)
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(User).filter(User.user_id == user_id)
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    async def get_users_by_ids(self, ids: List[int], with_relations: bool = False,
+                               chunk_size: int = DEFAULT_LOOKUP_CHUNK_SIZE) -> LookupResult:
+        """Получаем пользователей по списку id одним запросом на кусок (pk = ANY(:ids)).
+
+        Возвращаем словарь {id: объект}; ненайденные id — в атрибуте missing.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan() if with_relations else None
+            found = await fetch_by_ids(session, User, ids, options=plan.options if plan else (),
+                                       chunk_size=chunk_size)
+            if plan:
+                await plan.load_collections(session, found.values())
+            return found
 
     async def update_user(self, user_id: int, values: dict):
         """Обновляем User по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = update(User).where(User.user_id == user_id).values(**values)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = update(User).where(User.user_id == user_id).values(**with_lowered_columns(values))
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_user_role, user_id)
+            after_commit(session, self._invalidate_autocomplete_cache)
 
     async def delete_user(self, user_id: int):
         """Удаляем User по id."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                stmt = delete(User).where(User.user_id == user_id)
-                await session.execute(stmt)
-                await session.commit()
+        async with session_scope(self.async_session_factory) as session:
+            stmt = delete(User).where(User.user_id == user_id)
+            await session.execute(stmt)
+            after_commit(session, self._invalidate_user_role, user_id)
+            after_commit(session, self._invalidate_autocomplete_cache)
 
     async def get_all_users(self) -> List[User]:
         """Получаем список всех пользователей без связанных данных."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = select(User)
-                result = await session.execute(query)
-                return result.scalars().all()
-
-    async def get_user_with_relations(self, user_id: int) -> Optional[User]:
-        """Получаем User со всеми связями."""
-        async with self.async_session_factory() as session:
-            async with session.begin():
-                query = (select(User)
-                .filter(User.user_id == user_id)
-                .options(
-                    joinedload(User.role),  # Подгружаем роль пользователя
-                    joinedload(User.projects_owned),  # Подгружаем проекты пользователя
-                    joinedload(User.notifications),  # Подгружаем уведомления пользователя
-                    joinedload(User.messages),  # Подгружаем сообщения пользователя
-                    selectinload(User.project_assigned),  # Подгружаем проекты, на которые пользователь назначен
-                    selectinload(User.tasks_assigned)  # Подгружаем задачи, на которые пользователь назначен
-                ))
-                result = await session.execute(query)
-                return result.scalars().first()
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(User)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_users_page(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_LIMIT,
+                             filters: Optional[dict] = None, fields: Optional[Sequence[str]] = None) -> Page:
+        """Получаем страницу пользователей с keyset-пагинацией по (user_id).
+
+        При fields выбираются только эти колонки (плюс ключ пагинации), а элементы страницы —
+        неизменяемые read-модели без состояния сессии вместо ORM-объектов.
+        """
+        key_columns = (User.user_id,)
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            query = select(User) if fields is None else projection_select(User, fields, key_columns)
+            query = apply_filters(query, User, filters)
+            page = await paginate(session, query, key_columns, after=after, limit=limit, scalars=fields is None)
+            return project_page(User, page, fields)
+
+    async def autocomplete(self, prefix: str, project_id: Optional[int] = None,
+                           limit: int = DEFAULT_AUTOCOMPLETE_LIMIT) -> list:
+        """Подбираем пользователей, у которых имя или email начинается с prefix (без учёта регистра).
+
+        Регистр приводится в Python (str.lower) и сравнивается с колонками <column>_lower, так что
+        не-ASCII префиксы (кириллица) работают одинаково на SQLite и Postgres.
+        project_id оставляет только участников проекта (project_assigned). Каждая колонка читается
+        диапазоном по индексу ix_users_<column>_lower в порядке индекса и с LIMIT, поэтому
+        стоимость не зависит от размера таблицы. С fuzzy_autocomplete=True на Postgres, если совпадений
+        по префиксу меньше limit, добор идёт по триграммному сходству (опечатки). Возвращаем
+        read-модели UserRow.
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        limit = max(1, min(limit, MAX_AUTOCOMPLETE_LIMIT))
+        cache_key = (prefix, project_id, limit)
+        if self.autocomplete_cache is not None:
+            cached = self.autocomplete_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            postgresql = session.get_bind().dialect.name == "postgresql"
+            members = select(ProjectAssigned.user_id).filter(ProjectAssigned.project_id == project_id)
+            # Следующая за всеми строками с этим префиксом строка в побайтовом порядке
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            arms = []
+            for name in AUTOCOMPLETE_COLUMNS:
+                key = getattr(User, f"{name}_lower")
+                arm = (projection_select(User, AUTOCOMPLETE_FIELDS)
+                       .filter(key >= prefix, key < upper)
+                       .order_by(key)
+                       .limit(limit))
+                if project_id is not None:
+                    arm = arm.filter(User.user_id.in_(members))
+                arms.append(arm.subquery().select())
+            rows = (await session.execute(union_all(*arms))).all()
+            found = {row.user_id: row for row in rows}
+            users = sorted(found.values(), key=lambda row: (row.name.lower(), row.user_id))[:limit]
+
+            if self.fuzzy_autocomplete and postgresql and len(users) < limit:
+                similarity = func.greatest(*(func.similarity(getattr(User, f"{name}_lower"), prefix)
+                                             for name in AUTOCOMPLETE_COLUMNS))
+                fuzzy = (projection_select(User, AUTOCOMPLETE_FIELDS)
+                         .filter(or_(*(getattr(User, f"{name}_lower").op("%")(prefix)
+                                       for name in AUTOCOMPLETE_COLUMNS)))
+                         .order_by(similarity.desc(), User.user_id)
+                         .limit(limit))
+                if project_id is not None:
+                    fuzzy = fuzzy.filter(User.user_id.in_(members))
+                if found:
+                    fuzzy = fuzzy.filter(User.user_id.not_in(list(found)))
+                users += (await session.execute(fuzzy)).all()[:limit - len(users)]
+
+        items = to_read_models(User, users)
+        if self.autocomplete_cache is not None:
+            self.autocomplete_cache.put(cache_key, items)
+        return items
+
+    async def get_user_with_relations(self, user_id: int,
+                                      include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                                      collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> Optional[User]:
+        """Получаем User со всеми связями.
+
+        include — профиль из LOAD_PROFILES или список имён связей; коллекции ограничены
+        collection_limit объектами на родителя.
+        """
+        async with session_scope(self.async_session_factory, read_only=True) as session:
+            plan = self._load_plan(include, collection_limit)
+            query = (select(User)
+                     .filter(User.user_id == user_id)
+                     .options(*plan.options))
+            result = await session.execute(query)
+            user = result.scalars().first()
+            await plan.load_collections(session, [user])
+            return user
+
+    @staticmethod
+    def _load_plan(include: Union[str, Iterable[str], None] = FULL_PROFILE,
+                   collection_limit: Optional[int] = DEFAULT_COLLECTION_LIMIT) -> LoadPlan:
+        """План загрузки связей для get_*_with_relations и get_*_by_ids."""
+        return LoadPlan(User, include, profiles=LOAD_PROFILES, collection_limit=collection_limit)
@@ -0,0 +1,77 @@
+"""Счётчики проектов (project_counters), которые TaskRepository обновляет при записи."""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from config import DatabaseSettings
+from engene import DatabaseSessionManager
+from models import init
+from models.task import Task
+from repo.access import AccessLevelRepository
+from repo.counters import ProjectCounterRepository
+from repo.priorety import PriorityRepository
+from repo.project import ProjectRepository
+from repo.status import StatusRepository
+from repo.task import TaskRepository
+from repo.user import UserRepository
+
+
+def _run(tmp_path, scenario):
+    async def main():
+        manager = DatabaseSessionManager(settings=DatabaseSettings(url=f"sqlite+aiosqlite:///{tmp_path / 'app.db'}"))
+        try:
+            async with manager.engine.begin() as connection:
+                await connection.run_sync(init.ModelBase.metadata.create_all)
+            factory = manager.async_session_factory
+            level = await AccessLevelRepository(factory).create_access_level({"name": "User"})
+            user = await UserRepository(factory).create_user({"name": "Ann", "email": "ann@example.com",
+                                                              "role_id": level.id})
+            status = await StatusRepository(factory).create_status({"name": "Open", "type": "task"})
+            priority = await PriorityRepository(factory).create_priority({"name": "Normal"})
+            project = await ProjectRepository(factory).create_project({
+                "title": "Project", "start_date": datetime(2024, 1, 1), "status_id": status.id,
+                "owner_id": user.user_id, "priority_id": priority.id})
+            task_values = {"title": "Task", "priority_id": priority.id, "status_id": status.id,
+                           "executor_id": user.user_id, "project_id": project.project_id}
+            return await scenario(factory, project.project_id, task_values)
+        finally:
+            await manager.shutdown()
+    return asyncio.run(main())
+
+
+def test_deleting_task_after_its_deadline_keeps_overdue_counter(tmp_path):
+    async def scenario(factory, project_id, task_values):
+        tasks = TaskRepository(factory, project_counters=True)
+        counters = ProjectCounterRepository(factory)
+        past = datetime.utcnow() - timedelta(days=1)
+        await tasks.create_many_tasks([dict(task_values, deadline=past) for _ in range(3)])
+        assert (await counters.get_project_counters(project_id)).overdue_tasks == 3
+
+        task = await tasks.create_task(dict(task_values, deadline=datetime.utcnow() + timedelta(hours=1)))
+        # Срок наступил: задача стала просроченной без записи через репозиторий
+        async with factory() as session, session.begin():
+            await session.execute(update(Task).where(Task.task_id == task.task_id).values(deadline=past))
+        await tasks.delete_task(task.task_id)
+
+        stored = await counters.get_project_counters(project_id)
+        assert (stored.total_tasks, stored.overdue_tasks) == (3, 3)
+        assert await counters.reconcile() == 0
+
+    _run(tmp_path, scenario)
+
+
+def test_first_counted_write_includes_existing_tasks_once(tmp_path):
+    async def scenario(factory, project_id, task_values):
+        # Задачи, созданные до включения счётчиков
+        await TaskRepository(factory).create_many_tasks([dict(task_values) for _ in range(2)])
+        tasks = TaskRepository(factory, project_counters=True)
+        counters = ProjectCounterRepository(factory)
+        created = await tasks.create_task(dict(task_values))
+        assert (await counters.get_project_counters(project_id)).total_tasks == 3
+        await tasks.delete_task(created.task_id)
+        stored = await counters.get_project_counters(project_id)
+        assert (stored.total_tasks, stored.by_status) == (2, {task_values["status_id"]: 2})
+        assert await counters.reconcile() == 0
+
+    _run(tmp_path, scenario)
@@ -0,0 +1,115 @@
+"""Перенос проекта через COPY: экспорт → импорт в ту же базу Postgres.
+
+Запускается только при DB_URL=postgresql+asyncpg://...; база должна быть отдельной —
+таблицы удаляются и создаются заново, как у python -m bench --reset.
+"""
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import func, select
+
+from bench.data import DatasetSize, generate
+from config import DatabaseSettings
+from engene import DatabaseSessionManager
+from models import init
+from models.assigned import TaskAssigned
+from models.chat import Chat
+from models.comment import Comment
+from models.message import Message
+from models.project import Project
+from models.task import Task
+from repo.chat import ChatRepository
+from repo.transfer import GRAPH_MODELS, ProjectTransferRepository, _graph_filters
+
+DB_URL = os.environ.get("DB_URL", "")
+
+pytestmark = pytest.mark.skipif(not DB_URL.startswith("postgresql"),
+                                reason="DB_URL с отдельной базой PostgreSQL не задан")
+
+SIZE = DatasetSize(users=10, projects=3, tasks=60, comments=60, messages=200, notifications=10)
+
+
+def _run(scenario):
+    async def main():
+        manager = DatabaseSessionManager(settings=DatabaseSettings(url=DB_URL))
+        try:
+            async with manager.engine.begin() as connection:
+                await connection.run_sync(init.ModelBase.metadata.drop_all)
+                await connection.run_sync(init.ModelBase.metadata.create_all)
+            dataset = await generate(manager.async_session_factory, SIZE)
+            await ChatRepository(manager.async_session_factory).refresh_last_messages(
+                [chat_id for chat_id, _ in dataset.chats])
+            return await scenario(manager.async_session_factory, dataset)
+        finally:
+            await manager.shutdown()
+    return asyncio.run(main())
+
+
+async def _graph_counts(session, project_id: int) -> dict:
+    filters = _graph_filters(project_id)
+    return {model.__tablename__: (await session.execute(
+        select(func.count()).select_from(model).filter(filters[model.__tablename__])
+    )).scalar_one() for model in GRAPH_MODELS}
+
+
+def test_export_import_round_trip(tmp_path):
+    async def scenario(factory, dataset):
+        transfer = ProjectTransferRepository(factory)
+        # Первый проект самый крупный (распределение задач скошено)
+        source_id = dataset.project_ids[0]
+        exported = await transfer.export_project(source_id, str(tmp_path))
+        imported = await transfer.import_project(str(tmp_path), title="Copy")
+        assert imported.project_id != source_id
+        assert imported.rows == exported.rows
+
+        async with factory() as session:
+            assert await _graph_counts(session, imported.project_id) == exported.rows
+            assert (await session.get(Project, imported.project_id)).title == "Copy"
+
+            old_tasks = set((await session.execute(
+                select(Task.task_id).filter(Task.project_id == source_id))).scalars())
+            new_tasks = set((await session.execute(
+                select(Task.task_id).filter(Task.project_id == imported.project_id))).scalars())
+            assert len(new_tasks) == len(old_tasks) and not new_tasks & old_tasks
+
+            # Все ссылки указывают на строки нового графа, а не на исходные
+            assigned = (await session.execute(
+                select(TaskAssigned.task_id).filter(TaskAssigned.task_id.in_(new_tasks)))).scalars().all()
+            assert len(assigned) == exported.rows["task_assigned"]
+
+            chats = (await session.execute(
+                select(Chat).filter(Chat.project_id == imported.project_id))).scalars().all()
+            assert chats
+            for chat in chats:
+                assert chat.task_id is None or chat.task_id in new_tasks
+                if chat.last_message_id is not None:
+                    assert (await session.get(Message, chat.last_message_id)).chat_id == chat.chat_id
+
+            comments = (await session.execute(
+                select(Comment).filter(Comment.project_id == imported.project_id))).scalars().all()
+            assert len(comments) == exported.rows["comments"]
+            assert all(comment.task_id is None or comment.task_id in new_tasks for comment in comments)
+
+    _run(scenario)
+
+
+def test_import_rejects_references_outside_graph(tmp_path):
+    async def scenario(factory, dataset):
+        source_id, other_id = dataset.project_ids[:2]
+        async with factory() as session:
+            foreign_task = (await session.execute(
+                select(Task.task_id).filter(Task.project_id == other_id).limit(1))).scalar_one()
+        # Чат проекта, привязанный к задаче другого проекта, — задача в выгрузку не попадает
+        await ChatRepository(factory).create_chat({"project_id": source_id, "task_id": foreign_task})
+
+        transfer = ProjectTransferRepository(factory)
+        await transfer.export_project(source_id, str(tmp_path))
+        async with factory() as session:
+            projects = (await session.execute(select(func.count()).select_from(Project))).scalar_one()
+        with pytest.raises(ValueError, match=r"chats\.task_id: 1"):
+            await transfer.import_project(str(tmp_path))
+        async with factory() as session:
+            assert (await session.execute(select(func.count()).select_from(Project))).scalar_one() == projects
+
+    _run(scenario)
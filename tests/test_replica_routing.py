@@ -0,0 +1,108 @@
+"""Маршрутизация чтения на реплики: primary и реплики — отдельные файлы SQLite."""
+import asyncio
+import contextvars
+
+import pytest
+from sqlalchemy import insert
+
+from config import DatabaseSettings
+from engene import DatabaseSessionManager, uow
+from models import init
+from models.priorety import Priority
+from repo.priorety import PriorityRepository
+
+
+def _url(path) -> str:
+    return f"sqlite+aiosqlite:///{path}"
+
+
+async def _start(tmp_path, replicas: int = 1, **settings) -> DatabaseSessionManager:
+    """Менеджер с primary и replicas репликами; в каждой базе своя строка-метка с id=1."""
+    manager = DatabaseSessionManager(settings=DatabaseSettings(
+        url=_url(tmp_path / "primary.db"),
+        replica_urls=tuple(_url(tmp_path / f"replica{index}.db") for index in range(replicas)),
+        **settings,
+    ))
+    for name, engine in [("primary", manager.engine)] + [
+            (f"replica{index}", engine) for index, engine in enumerate(manager.replica_engines)]:
+        async with engine.begin() as connection:
+            await connection.run_sync(init.ModelBase.metadata.create_all, tables=[Priority.__table__])
+            await connection.execute(insert(Priority).values(id=1, name=name))
+    return manager
+
+
+def _run(tmp_path, scenario, **kwargs):
+    async def main():
+        manager = await _start(tmp_path, **kwargs)
+        try:
+            return await scenario(PriorityRepository(manager.async_session_factory), manager)
+        finally:
+            await manager.shutdown()
+    return asyncio.run(main())
+
+
+async def _read_marker(repository: PriorityRepository) -> str:
+    return (await repository.get_priority_by_id(1)).name
+
+
+def test_reads_go_to_replica_and_writes_to_primary(tmp_path):
+    async def scenario(repository, manager):
+        assert await _read_marker(repository) == "replica0"
+        created = await repository.create_priority({"name": "new"})
+        # Запись ушла на primary: на реплике (которую никто не реплицирует) строки нет
+        assert await repository.get_priority_by_id(created.id) is None
+        async with manager.async_session_factory() as session:
+            assert (await session.get(Priority, created.id)).name == "new"
+        return await _read_marker(repository)
+
+    assert _run(tmp_path, scenario) == "replica0"
+
+
+def test_read_your_writes_window_pins_reads_to_primary(tmp_path):
+    async def scenario(repository, manager):
+        before = await _read_marker(repository)
+        await repository.update_priority(1, {"name": "primary"})
+        return before, await _read_marker(repository)
+
+    assert _run(tmp_path, scenario, read_your_writes_window=60.0) == ("replica0", "primary")
+
+
+def test_read_your_writes_window_is_per_context(tmp_path):
+    async def scenario(repository, manager):
+        await repository.update_priority(1, {"name": "primary"})
+        # Другая задача asyncio (другой запрос) своих записей не делала и читает с реплики
+        return await asyncio.create_task(_read_marker(repository), context=contextvars.Context())
+
+    assert _run(tmp_path, scenario, read_your_writes_window=60.0) == "replica0"
+
+
+def test_reads_stay_on_replica_without_window(tmp_path):
+    async def scenario(repository, manager):
+        await repository.update_priority(1, {"name": "primary"})
+        return await _read_marker(repository)
+
+    assert _run(tmp_path, scenario) == "replica0"
+
+
+def test_unit_of_work_reads_from_primary(tmp_path):
+    async def scenario(repository, manager):
+        async with uow(manager):
+            return await _read_marker(repository)
+
+    assert _run(tmp_path, scenario) == "primary"
+
+
+def test_without_replicas_reads_fall_back_to_primary(tmp_path):
+    async def scenario(repository, manager):
+        assert manager.replica_engines == []
+        return await _read_marker(repository)
+
+    assert _run(tmp_path, scenario, replicas=0) == "primary"
+
+
+@pytest.mark.parametrize("strategy", ["round_robin", "least_loaded"])
+def test_reads_are_spread_over_replicas(tmp_path, strategy):
+    async def scenario(repository, manager):
+        return {await _read_marker(repository) for _ in range(4)}
+
+    assert _run(tmp_path, scenario, replicas=2, replica_strategy=strategy) == {"replica0", "replica1"}
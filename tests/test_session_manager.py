@@ -0,0 +1,40 @@
+"""Реестр DatabaseSessionManager: один пул на DSN и после перезапуска."""
+import asyncio
+
+import pytest
+
+from config import DatabaseSettings
+from engene import DatabaseSessionManager
+
+
+def _settings(tmp_path) -> DatabaseSettings:
+    return DatabaseSettings(url=f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+
+
+def test_restart_after_shutdown_reuses_registration(tmp_path):
+    async def main():
+        manager = DatabaseSessionManager(settings=_settings(tmp_path))
+        await manager.shutdown()
+        manager.startup()
+        try:
+            assert DatabaseSessionManager.get(settings=_settings(tmp_path)) is manager
+        finally:
+            await manager.shutdown()
+    asyncio.run(main())
+
+
+def test_stale_manager_cannot_start_next_to_new_one(tmp_path):
+    async def main():
+        stale = DatabaseSessionManager(settings=_settings(tmp_path))
+        await stale.shutdown()
+        current = DatabaseSessionManager.get(settings=_settings(tmp_path))
+        try:
+            with pytest.raises(RuntimeError, match="Another DatabaseSessionManager"):
+                stale.startup()
+            # Повторный shutdown старого менеджера не снимает с регистрации новый
+            await stale.shutdown()
+            assert DatabaseSessionManager.get(settings=_settings(tmp_path)) is current
+            assert current.engine is not None
+        finally:
+            await current.shutdown()
+    asyncio.run(main())